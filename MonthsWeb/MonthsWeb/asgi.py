@@ -13,4 +13,21 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'MonthsWeb.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported after the setup of Django by get_asgi_application()
+from django.conf import settings  # noqa: E402
+from taskmanager.events import EventStreamApp  # noqa: E402
+
+events_application = EventStreamApp()
+
+
+async def application(scope, receive, send):
+    """ Serves the event stream of the task changes (a long-lived
+    connection that does not hold a thread) apart from Django.
+    """
+    if scope['type'] == 'http' and \
+            scope['path'] == settings.TASKMANAGER_PUSH_PATH:
+        await events_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -28,14 +28,21 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # the Server-Timing header (see TASKMANAGER_SERVER_TIMING)
+    'taskmanager.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.middleware.locale.LocaleMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    # the requests to the JSON API with a token skip the sessions,
+    # authentication and messages
+    'taskmanager.middleware.TokenAuthenticationMiddleware',
+    'taskmanager.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
+    'taskmanager.middleware.AuthenticationMiddleware',
+    'taskmanager.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # the profiles of some of the requests (see TASKMANAGER_PROFILE_*)
+    'taskmanager.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'MonthsWeb.urls'
@@ -69,6 +76,19 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+AUTHENTICATION_BACKENDS = [
+    # loads the user of the session from the cache
+    'accounts.backends.CachedModelBackend',
+    # keeps the sessions made before the cached backend valid
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -119,6 +139,132 @@ LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/accounts/login'
 
 
+# accounts
+
+# cache (alias from CACHES) and timeout (seconds) for the users of the
+# sessions and their profiles; the changes made without the signals of
+# the models (or in processes with another cache) are seen on expiry
+ACCOUNTS_USER_CACHE = 'default'
+
+ACCOUNTS_USER_CACHE_TIMEOUT = 5 * 60
+
+# taskmanager
+
+# cache (alias from CACHES) and timeout (seconds) for the generated
+# lists of tasks of the months (month packs); the packs are cached by the
+# version of the user's tasks kept in the database, so a write makes them
+# outdated in the caches of all the processes; the cache also keeps the
+# markers of the users whose tasks are already shifted today
+TASKMANAGER_MONTH_PACK_CACHE = 'default'
+
+TASKMANAGER_MONTH_PACK_CACHE_TIMEOUT = 60 * 60 * 24
+
+# store the repetitions of the tasks with interval in the database
+# (models.Occurrence) instead of computing them on every request, and how
+# many days ahead of the requested dates they are stored (the months more
+# than that many days after today are computed)
+TASKMANAGER_MATERIALIZE_OCCURRENCES = False
+
+TASKMANAGER_OCCURRENCE_HORIZON_DAYS = 366
+
+# the most months before and after the requested one that can be asked
+# for in one request to getDatePacks/
+TASKMANAGER_MAX_ADJACENT_MONTHS = 3
+
+# run the independent queries of a month pack concurrently in the async
+# views, each in its own thread and database connection (set CONN_MAX_AGE
+# to reuse the connections of the threads)
+TASKMANAGER_CONCURRENT_QUERIES = False
+
+# lifetime (seconds) of the tokens for the JSON API (api/token/); the
+# tokens of a user can be revoked before they expire (api/token/revoke/)
+TASKMANAGER_API_TOKEN_MAX_AGE = 60 * 60 * 24
+
+# shift the uncompleted tasks with autoshift of a user on the first
+# request of the month pages on a day (besides the "autoshift" command)
+TASKMANAGER_LAZY_AUTOSHIFT = True
+
+# the most tasks that can be created, updated or checked in one request
+# to tasks/batch/ or tasks/completions/
+TASKMANAGER_MAX_BATCH_SIZE = 1000
+
+# the path of the event stream of the task changes (served by asgi.py
+# only), the seconds between the keepalive comments of an idle stream, and
+# the publish/subscribe broker of the changes (its import path); the
+# in-process broker reaches the streams of the same process only, so with
+# several worker processes a shared broker should be used
+TASKMANAGER_PUSH_PATH = '/events/'
+
+TASKMANAGER_PUSH_KEEPALIVE = 25
+
+TASKMANAGER_PUSH_BROKER = 'taskmanager.services.pushservice.InProcessBroker'
+
+# lifetime (seconds) of the tickets of the event stream (api/events/ticket/,
+# given as ?ticket=<ticket> by the browsers, which can not send the API
+# token in a header) and the cache (alias from CACHES) that marks the used
+# ones; with several worker processes the cache should be shared for a
+# ticket to be accepted once only
+TASKMANAGER_PUSH_TICKET_MAX_AGE = 30
+
+TASKMANAGER_PUSH_TICKET_CACHE = 'default'
+
+# record the stages of the requests (the database queries, the repetitions
+# of the tasks, the JSON encoding etc.) and send them in the Server-Timing
+# header and to the "taskmanager.timing" logger; the latest of them are
+# shown on debug/timings/ to the staff when DEBUG is on
+TASKMANAGER_SERVER_TIMING = False
+
+TASKMANAGER_TIMING_HISTORY = 50
+
+# profile the views of a share (0 to 1) of the requests chosen at random,
+# and of every request with this key in the X-Profile-Key header (no key
+# disables the header); a pstats dump of every profile is written to the
+# directory (the latest TASKMANAGER_PROFILE_KEEP of them are kept), and
+# the call stacks sampled every TASKMANAGER_PROFILE_INTERVAL seconds are
+# added to its "stacks.collapsed" file for the flame graphs (rotated when
+# it grows over TASKMANAGER_PROFILE_STACKS_MAX_BYTES)
+TASKMANAGER_PROFILE_SAMPLE_RATE = 0
+
+TASKMANAGER_PROFILE_KEY = os.getenv('PROFILE_KEY')
+
+TASKMANAGER_PROFILE_DIR = BASE_DIR / 'profiles'
+
+TASKMANAGER_PROFILE_KEEP = 100
+
+TASKMANAGER_PROFILE_INTERVAL = 0.005
+
+TASKMANAGER_PROFILE_STACKS_MAX_BYTES = 10 * 1024 * 1024
+
+# the most changed objects that changes/ returns; a client that is further
+# behind is told to load the tasks anew
+TASKMANAGER_MAX_CHANGES = 1000
+
+# the latest versions of the changes of every user kept by the
+# "prune_changes" command (a client further behind than that many
+# versions is more than TASKMANAGER_MAX_CHANGES objects behind anyway)
+TASKMANAGER_CHANGES_KEEP_VERSIONS = 1000
+
+
+# logging
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # a JSON line with the stages of every request
+        'taskmanager.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 #SMTP configurations
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -0,0 +1,13 @@
+from django.contrib.auth.backends import ModelBackend
+
+from .services.usercache import UserCache
+
+
+class CachedModelBackend(ModelBackend):
+    """ ModelBackend that loads the user of the session (with its
+    `UserProfile`) from the cache instead of the database.
+    """
+
+    def get_user(self, user_id):
+        user = UserCache.get(user_id)
+        return user if user and self.user_can_authenticate(user) else None
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.6 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='api_token_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
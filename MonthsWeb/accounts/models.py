@@ -8,4 +8,8 @@ class UserProfile(models.Model):
     # standard Django User model as foreign key
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=False) 
     # the language of the user interface
-    language = models.CharField(max_length=20, blank=True)
\ No newline at end of file
+    language = models.CharField(max_length=20, blank=True)
+    # the version of the user's tokens for the JSON API, incremented to
+    # revoke all the tokens issued before (see
+    # `taskmanager.services.tokenservice.ApiToken`)
+    api_token_version = models.PositiveIntegerField(default=0)
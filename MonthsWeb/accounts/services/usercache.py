@@ -0,0 +1,57 @@
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+
+
+class UserCache:
+    """ Keeps the users (with their `UserProfile` loaded along) in the
+    Django cache, keyed by the id of the user, so that the user of a
+    request is not loaded from the database every time.
+
+    The entry of a user is removed when the user or its profile is
+    saved or deleted (see `signals`). The writes that send no signals
+    (e.g. `QuerySet.update()`) and the ones made by other processes with
+    caches of their own are seen when the entry expires, in
+    ACCOUNTS_USER_CACHE_TIMEOUT seconds.
+    """
+
+    key_prefix = 'accounts:user'
+
+    #                               ***
+    #                              public
+
+    @classmethod
+    def get(cls, user_id: int) -> Optional[User]:
+        """ Returns the user with the profile, from the cache or from
+        the database (then it is cached), or `None` if there is no user
+        with that id.
+        """
+        cache = cls._cache()
+        key = cls._key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = User.objects\
+                .select_related('userprofile')\
+                .filter(id=user_id)\
+                .first()
+            if user is not None:
+                cache.set(key, user, settings.ACCOUNTS_USER_CACHE_TIMEOUT)
+        return user
+
+    @classmethod
+    def invalidate(cls, user_id: int) -> None:
+        """ Removes the user from the cache."""
+        cls._cache().delete(cls._key(user_id))
+
+    #                               ***
+    #                              other
+
+    @staticmethod
+    def _cache():
+        return caches[settings.ACCOUNTS_USER_CACHE]
+
+    @classmethod
+    def _key(cls, user_id: int) -> str:
+        return f'{cls.key_prefix}:{user_id}'
@@ -1,3 +1,85 @@
+from django.contrib.auth.forms import PasswordChangeForm
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from .backends import CachedModelBackend
+from .forms import UserDetailsChangingForm
+from .models import UserProfile
+from .services.misc import set_user_profile
+from .services.usercache import UserCache
+
+
+class TestCachedModelBackend(TestCase):
+    def setUp(self):
+        self.test_user = User.objects.create_user(
+            username='test_user',
+            email='test@user.com',
+            password='1234test',
+        )
+        UserProfile.objects.create(user=self.test_user, language='en')
+        UserCache.invalidate(self.test_user.id)
+        self.backend = CachedModelBackend()
+
+    def test_get_user(self):
+        with self.assertNumQueries(1):
+            user = self.backend.get_user(self.test_user.id)
+            self.assertEquals(user.userprofile.language, 'en')
+        with self.assertNumQueries(0):
+            user = self.backend.get_user(self.test_user.id)
+            self.assertEquals(user.userprofile.language, 'en')
+        self.assertEquals(user, self.test_user)
+
+    def test_get_user_without_profile(self):
+        UserProfile.objects.filter(user=self.test_user).delete()
+        self.backend.get_user(self.test_user.id)
+        with self.assertNumQueries(0):
+            user = self.backend.get_user(self.test_user.id)
+            with self.assertRaises(UserProfile.DoesNotExist):
+                user.userprofile
+
+    def test_get_missing_or_inactive_user(self):
+        self.assertIsNone(self.backend.get_user(self.test_user.id + 1))
+        self.test_user.is_active = False
+        self.test_user.save()
+        self.assertIsNone(self.backend.get_user(self.test_user.id))
+
+    def test_invalidate_on_delete(self):
+        self.backend.get_user(self.test_user.id)
+        self.test_user.delete()
+        self.assertIsNone(UserCache.get(self.test_user.id))
+
+    def test_invalidate_on_details_change(self):
+        self.backend.get_user(self.test_user.id)
+        form = UserDetailsChangingForm(
+            data={'username': 'new_name', 'email': 'new@user.com'},
+            instance=User.objects.get(id=self.test_user.id))
+        self.assertTrue(form.is_valid())
+        form.save()
+        user = self.backend.get_user(self.test_user.id)
+        self.assertEquals(user.username, 'new_name')
+
+    def test_invalidate_on_password_change(self):
+        self.backend.get_user(self.test_user.id)
+        form = PasswordChangeForm(
+            user=User.objects.get(id=self.test_user.id),
+            data={'old_password': '1234test',
+                  'new_password1': 'n3w-passw0rd',
+                  'new_password2': 'n3w-passw0rd'})
+        self.assertTrue(form.is_valid())
+        form.save()
+        user = self.backend.get_user(self.test_user.id)
+        self.assertTrue(user.check_password('n3w-passw0rd'))
+
+    def test_invalidate_on_set_user_profile(self):
+        self.backend.get_user(self.test_user.id)
+        set_user_profile(self.test_user, language='ru')
+        user = self.backend.get_user(self.test_user.id)
+        self.assertEquals(user.userprofile.language, 'ru')
+
+    def test_session_user_is_cached(self):
+        self.client.force_login(self.test_user)
+        self.client.get('/getDatePack/',
+                        {'date': '2021-02-01T00:00:00.000+00:00'})
+        with self.assertNumQueries(0):
+            user = self.backend.get_user(self.test_user.id)
+        self.assertEquals(user, self.test_user)
@@ -0,0 +1,87 @@
+""" Benchmark of the loading of completions for a month page when the
+tasks have multi-year histories: the whole history of every task
+against the completions within the dates of the page only.
+
+The records are created in the configured database inside a
+transaction that is rolled back at the end.
+
+Run from the project directory:
+    python manage.py shell -c "from taskmanager.benchmarks import completions; completions.main()"
+"""
+import datetime
+import timeit
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from ..models import Completion, Task
+from ..services.dateservice import DatesHandler
+from ..services.dbservice import DatabaseHandler
+
+
+class Rollback(Exception):
+    """ Raised to roll back the records made for the benchmark."""
+
+
+def make_history(user: User, tasks_count: int, years: int) -> list:
+    """ Creates `tasks_count` daily tasks of the user, each completed on
+    every day of the `years` before March 2021. Returns the ids.
+    """
+    start = datetime.datetime(2021 - years, 3, 1, tzinfo=datetime.timezone.utc)
+    days = (datetime.datetime(2021, 3, 1, tzinfo=datetime.timezone.utc)
+            - start).days
+    task_ids = []
+    for i in range(tasks_count):
+        task = Task.objects.create(init_date=start, title=f'task {i}',
+                                   interval='every_day', user=user)
+        completion_dates = [start + datetime.timedelta(days=day)
+                            for day in range(1, days)]
+        Completion.objects.bulk_create(
+            Completion(date_completed=date_completed,
+                       day=Completion.day_of(date_completed),
+                       related_task=task)
+            for date_completed in completion_dates
+        )
+        task_ids.append(task.id)
+    return task_ids
+
+
+def run(tasks_count: int = 20, years_list=(1, 2, 4), repeat: int = 3) -> list:
+    """ Times `DatabaseHandler.get_additional_fields()` with and without
+    the date range for each length of history in `years_list`. Returns
+    a list of dicts with the best times in seconds and the numbers of
+    the loaded completions.
+    """
+    grid = DatesHandler.month_grid(datetime.date(2021, 2, 1))
+    date_range = (grid.dates[0], grid.dates[-1])
+    results = []
+    for years in years_list:
+        try:
+            with transaction.atomic():
+                user = User.objects.create(username='benchmark_user')
+                task_ids = make_history(user, tasks_count, years)
+                get_fields = DatabaseHandler.get_additional_fields
+                fields = {
+                    'whole_history': lambda: get_fields(task_ids),
+                    'date_range': lambda: get_fields(task_ids, date_range),
+                }
+                result = {'years': years, 'tasks': tasks_count}
+                for name, func in fields.items():
+                    result[name] = min(timeit.repeat(func, number=1,
+                                                     repeat=repeat))
+                    result[f'{name}_rows'] = len(func()['completions'])
+                results.append(result)
+                raise Rollback
+        except Rollback:
+            pass
+    return results
+
+
+def main():
+    for result in run():
+        print(f"{result['years']} year(s) of history, "
+              f"{result['tasks']} daily tasks: "
+              f"whole history {result['whole_history'] * 1000:8.2f} ms "
+              f"({result['whole_history_rows']} rows), "
+              f"date range {result['date_range'] * 1000:7.2f} ms "
+              f"({result['date_range_rows']} rows)")
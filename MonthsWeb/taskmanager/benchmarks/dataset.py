@@ -0,0 +1,133 @@
+""" Synthetic data at a realistic scale for the benchmarks of the month
+pages (see the management commands "seed_scale_data" and
+"run_benchmarks"): users with one-off tasks, tasks of every interval,
+attached files and years of completion history.
+
+The data is random but reproducible for the same `seed`.
+"""
+import datetime
+import random
+from typing import NamedTuple
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from ..models import Completion, File, Task
+from ..services.taskservice import RepeatingTasksGenerator
+
+
+# the intervals having the dates of repetitions (no 'special')
+INTERVALS = tuple(RepeatingTasksGenerator.occurrences_map)
+
+
+class DatasetSpec(NamedTuple):
+    """ What to create for every user."""
+    # tasks without interval (some of them with autoshift)
+    one_off_tasks: int = 200
+    # tasks of each of the INTERVALS
+    interval_tasks: int = 10
+    # files attached to each task
+    files_per_task: int = 1
+    # years of the history before `until`
+    years: int = 2
+    # share of the dates of the history on which the tasks are completed
+    completion_rate: float = 0.7
+    # the last day of the history (the tasks go a year beyond it)
+    until: datetime.date = datetime.date(2021, 3, 1)
+
+
+class DatasetStats(NamedTuple):
+    users: int
+    tasks: int
+    files: int
+    completions: int
+
+
+def seed_user(user: User, spec: DatasetSpec, rnd: random.Random,
+              batch_size: int = 5000) -> DatasetStats:
+    """ Creates the tasks, files and completions of the `spec` for the
+    user. Returns the numbers of the created records.
+    """
+    until = datetime.datetime.combine(spec.until, datetime.time(),
+                                      tzinfo=datetime.timezone.utc)
+    start = until - datetime.timedelta(days=365 * spec.years)
+    span_days = (until - start).days + 365
+
+    tasks = []
+    for number in range(spec.one_off_tasks):
+        init_date = start + datetime.timedelta(
+            days=rnd.randrange(span_days), hours=rnd.randrange(24))
+        tasks.append(Task(init_date=init_date, title=f'task {number}',
+                          description='description ' * rnd.randrange(20),
+                          autoshift=rnd.random() < 0.1, user=user))
+    for interval in INTERVALS:
+        for number in range(spec.interval_tasks):
+            init_date = start + datetime.timedelta(
+                days=rnd.randrange(365 * spec.years or 1),
+                hours=rnd.randrange(24))
+            tasks.append(Task(init_date=init_date,
+                              title=f'{interval} task {number}',
+                              description='description ' * rnd.randrange(20),
+                              interval=interval, user=user))
+    Task.objects.bulk_create(tasks, batch_size=batch_size)
+    # the ids are not returned by bulk_create() on every backend
+    tasks = list(Task.objects
+                 .filter(user=user)
+                 .values('id', 'init_date', 'interval'))
+
+    files = [File(related_task_id=task['id'],
+                  link=f'https://example.com/{task["id"]}/{number}')
+             for task in tasks for number in range(spec.files_per_task)]
+    File.objects.bulk_create(files, batch_size=batch_size)
+
+    completions = 0
+    batch = []
+    for task in tasks:
+        for day in _history_days(task, start.date(), spec.until):
+            if rnd.random() >= spec.completion_rate:
+                continue
+            date_completed = datetime.datetime.combine(
+                day, datetime.time(12), tzinfo=datetime.timezone.utc)
+            batch.append(Completion(date_completed=date_completed,
+                                    day=Completion.day_of(date_completed),
+                                    related_task_id=task['id']))
+            if len(batch) >= batch_size:
+                completions += _insert_completions(batch)
+                batch = []
+    completions += _insert_completions(batch)
+
+    return DatasetStats(1, len(tasks), len(files), completions)
+
+
+def seed(usernames: list, spec: DatasetSpec, seed_value: int = 0,
+         batch_size: int = 5000) -> DatasetStats:
+    """ Creates the users (which must not exist) with the data of the
+    `spec`, each in its own transaction. Returns the totals.
+    """
+    rnd = random.Random(seed_value)
+    totals = DatasetStats(0, 0, 0, 0)
+    for username in usernames:
+        with transaction.atomic():
+            user = User.objects.create(username=username)
+            stats = seed_user(user, spec, rnd, batch_size)
+        totals = DatasetStats(*(total + count
+                                for total, count in zip(totals, stats)))
+    return totals
+
+
+def _history_days(task: dict, first_date: datetime.date,
+                  last_date: datetime.date):
+    """ Yields the days of the task (its repetitions and the init date)
+    in the history up to the `last_date`.
+    """
+    init_day = task['init_date'].date()
+    if init_day <= last_date:
+        yield init_day
+    if task['interval'] != 'no':
+        yield from RepeatingTasksGenerator.occurrence_dates(
+            task, max(first_date, init_day), last_date)
+
+
+def _insert_completions(completions: list) -> int:
+    Completion.objects.bulk_create(completions)
+    return len(completions)
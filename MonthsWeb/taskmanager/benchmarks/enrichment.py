@@ -0,0 +1,120 @@
+""" Benchmark of `TaskHandler._iter_completed_occurrences` (attaching
+files and completions to the occurrences of the tasks) with a growing
+number of completions.
+
+Run from the project directory:
+    python manage.py shell -c "from taskmanager.benchmarks import enrichment; enrichment.main()"
+"""
+import datetime
+import timeit
+
+from ..services.dateservice import DatesHandler
+from ..services.taskservice import RepeatingTasksGenerator, TaskHandler
+
+
+class InMemoryDatabaseHandler:
+    """ Serves `get_additional_fields()` from prepared lists, so only
+    the joining itself is measured.
+    """
+
+    def __init__(self, files: list, completions: list):
+        self.files = files
+        self.completions = completions
+
+    def get_intervalled_tasks(self, date_range, user):
+        return []
+
+    def get_tasks_by_timerange(self, date_range, user):
+        return []
+
+    def get_additional_fields(self, task_id_list, *args, **kwargs):
+        return {'files': self.files, 'completions': self.completions}
+
+
+def scanning_completed_occurrences(occurrences: list,
+                                   additional_fields: dict):
+    """ The former way of attaching the files and the completions
+    (every occurrence scans all of them).
+    """
+    for occurrence in occurrences:
+        task = occurrence.task
+        task['files'] = []
+        occurrence.completion = False
+        for file_ in additional_fields['files']:
+            if file_['related_task_id'] == task['id']:
+                task['files'].append(file_)
+        for completion in additional_fields['completions']:
+            if (completion['date_completed'].date() == occurrence.date.date()
+                    and completion['related_task_id'] == task['id']):
+                occurrence.completion = completion['date_completed']
+                break
+    return occurrences
+
+
+def make_dataset(tasks_count: int, completions_count: int):
+    """ Returns the occurrences of daily tasks over the month of
+    February 2021 and the files and completions (spread over the past) related to
+    them.
+    """
+    datetime_objects = DatesHandler.generate_month_dates(
+        datetime.datetime(2021, 2, 1), as_objects=True)
+    start = datetime.datetime(2019, 1, 1, tzinfo=datetime.timezone.utc)
+    tasks = [
+        {'id': i, 'init_date': start, 'title': f'task {i}',
+         'description': '', 'interval': 'every_day', 'autoshift': False}
+        for i in range(tasks_count)
+    ]
+    occurrences = RepeatingTasksGenerator.generate_occurrences(
+        datetime_objects, tasks)
+    files = [
+        {'id': i, 'link': f'file/{i}', 'related_task_id': i % tasks_count}
+        for i in range(tasks_count * 2)
+    ]
+    completions = [
+        {'id': i,
+         'date_completed': start + datetime.timedelta(
+             days=(i // tasks_count) % 800),
+         'related_task_id': i % tasks_count}
+        for i in range(completions_count)
+    ]
+    return occurrences, files, completions
+
+
+def run(tasks_count: int = 20, completions_counts=(100, 1000, 10000),
+        repeat: int = 3) -> list:
+    """ Times both implementations for each number of completions in
+    `completions_counts` and returns a list of dicts with the best times
+    in seconds.
+    """
+    results = []
+    for completions_count in completions_counts:
+        occurrences, files, completions = make_dataset(tasks_count,
+                                                       completions_count)
+        handler = TaskHandler(InMemoryDatabaseHandler(files, completions))
+        additional_fields = {'files': files, 'completions': completions}
+
+        def indexed():
+            # the files are attached to the shared task records only once
+            for occurrence in occurrences:
+                occurrence.task.pop('files', None)
+            return list(handler._iter_completed_occurrences(occurrences))
+
+        timings = {
+            'scanning': min(timeit.repeat(
+                lambda: scanning_completed_occurrences(occurrences,
+                                                       additional_fields),
+                number=1, repeat=repeat)),
+            'indexed': min(timeit.repeat(
+                indexed, number=1, repeat=repeat)),
+        }
+        results.append({'occurrences': len(occurrences),
+                        'completions': completions_count, **timings})
+    return results
+
+
+def main():
+    for result in run():
+        print(f"{result['occurrences']:>6} occurrences, "
+              f"{result['completions']:>6} completions: "
+              f"scanning {result['scanning'] * 1000:9.2f} ms, "
+              f"indexed {result['indexed'] * 1000:7.2f} ms")
@@ -0,0 +1,118 @@
+""" Load test of a running deployment: requests/sec and latencies of the
+JSON endpoints with a number of concurrent clients. Used to compare the
+ASGI deployment (async views) with the WSGI one, e.g.:
+
+    uvicorn MonthsWeb.asgi:application --workers 4 --port 8001
+    gunicorn MonthsWeb.wsgi:application --workers 4 --bind 127.0.0.1:8002
+
+and then, with the session cookie of a logged in user:
+
+    python -m taskmanager.benchmarks.loadtest --sessionid <id> \\
+        http://127.0.0.1:8001 http://127.0.0.1:8002
+
+Only the standard library is used, so it can be run without Django.
+"""
+import argparse
+import http.client
+import statistics
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+
+DEFAULT_PATHS = (
+    '/getDatePack/?date=2021-02-01T00%3A00%3A00.000%2B00%3A00',
+    '/getDatePack/?date=2021-03-01T00%3A00%3A00.000%2B00%3A00',
+)
+
+
+def client_loop(base_url: str, paths: list, headers: dict,
+                deadline: float) -> tuple:
+    """ Sends the requests of one client (over one keep-alive connection)
+    until the `deadline`. Returns a tuple of the list of latencies (in
+    seconds) and the number of failed requests.
+    """
+    url = urllib.parse.urlsplit(base_url)
+    connection_class = (http.client.HTTPSConnection if url.scheme == 'https'
+                        else http.client.HTTPConnection)
+    connection = connection_class(url.netloc, timeout=30)
+    latencies = []
+    errors = 0
+    number = 0
+    while time.perf_counter() < deadline:
+        path = paths[number % len(paths)]
+        number += 1
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            continue
+        if response.status != 200:
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - started)
+    connection.close()
+    return latencies, errors
+
+
+def run(base_url: str, sessionid: str, paths=DEFAULT_PATHS,
+        concurrency: int = 20, duration: float = 10.0) -> dict:
+    """ Runs `concurrency` clients against `base_url` for `duration`
+    seconds and returns a dict with the requests/sec, the failures and
+    the latency percentiles (in seconds).
+    """
+    headers = {'Cookie': f'sessionid={sessionid}'}
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(client_loop, base_url, list(paths),
+                                   headers, deadline)
+                   for _ in range(concurrency)]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for client, _ in results for latency in client)
+    errors = sum(client_errors for _, client_errors in results)
+    if len(latencies) >= 2:
+        percentiles = statistics.quantiles(latencies, n=100)
+    else:
+        percentiles = [latencies[0] if latencies else 0.0] * 99
+    return {
+        'url': base_url,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed,
+        'p50': percentiles[49],
+        'p95': percentiles[94],
+        'p99': percentiles[98],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('urls', nargs='+',
+                        help='base URLs of the deployments to compare')
+    parser.add_argument('--sessionid', required=True,
+                        help='session cookie of a logged in user')
+    parser.add_argument('--path', action='append', dest='paths',
+                        help='path to request (can be repeated)')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    for url in args.urls:
+        result = run(url, args.sessionid, args.paths or DEFAULT_PATHS,
+                     args.concurrency, args.duration)
+        print(f"{result['url']}: {result['rps']:8.1f} req/s "
+              f"({result['requests']} ok, {result['errors']} failed), "
+              f"p50 {result['p50'] * 1000:7.1f} ms, "
+              f"p95 {result['p95'] * 1000:7.1f} ms, "
+              f"p99 {result['p99'] * 1000:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
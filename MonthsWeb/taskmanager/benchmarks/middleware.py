@@ -0,0 +1,90 @@
+""" Benchmark of the per-request overhead of the authentication: the
+JSON endpoints requested with the session cookie (the session is loaded
+by the middleware, and the user unless it is cached, see
+`accounts.backends.CachedModelBackend`) against the same requests with an
+API token (see `middleware.TokenAuthenticationMiddleware`).
+
+The requests are sent with the test client to the views of the project,
+so the times include the whole middleware stack. The records are
+created in the configured database inside a transaction that is rolled
+back at the end.
+
+Run from the project directory:
+    python manage.py shell -c "from taskmanager.benchmarks import middleware; middleware.main()"
+"""
+import datetime
+import timeit
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ..models import Task
+from ..services.tokenservice import ApiToken
+
+
+DEFAULT_PATHS = (
+    '/getDatePacks/?date=2021-02-01T00%3A00%3A00.000%2B00%3A00',
+    '/getDatePack/?date=2021-02-01T00%3A00%3A00.000%2B00%3A00',
+)
+
+
+class Rollback(Exception):
+    """ Raised to roll back the records made for the benchmark."""
+
+
+def make_clients(user: User) -> dict:
+    """ Returns the test clients of the user by the way of the
+    authentication.
+    """
+    session_client = Client()
+    session_client.force_login(user)
+    token = ApiToken.for_user(user)
+    token_client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+    return {'session': session_client, 'token': token_client}
+
+
+def run(paths=DEFAULT_PATHS, tasks_count: int = 20, number: int = 100,
+        repeat: int = 3) -> list:
+    """ Times `number` requests of each of the `paths` with each of the
+    clients of `make_clients()`. Returns a list of dicts with the best
+    times per request in seconds and the numbers of queries per request.
+    """
+    results = []
+    try:
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=['*']):
+            user = User.objects.create(username='benchmark_user')
+            init_date = datetime.datetime(2021, 2, 1,
+                                          tzinfo=datetime.timezone.utc)
+            Task.objects.bulk_create(
+                Task(init_date=init_date, title=f'task {i}',
+                     interval='every_week', user=user)
+                for i in range(tasks_count)
+            )
+            clients = make_clients(user)
+            for path in paths:
+                result = {'path': path}
+                for name, client in clients.items():
+                    # the month packs are cached by the first request
+                    client.get(path)
+                    with CaptureQueriesContext(connection) as queries:
+                        client.get(path)
+                    result[f'{name}_queries'] = len(queries)
+                    result[name] = min(timeit.repeat(
+                        lambda: client.get(path), number=number,
+                        repeat=repeat)) / number
+                results.append(result)
+            raise Rollback
+    except Rollback:
+        pass
+    return results
+
+
+def main():
+    for result in run():
+        print(f"{result['path']}: "
+              f"session {result['session'] * 1000:7.2f} ms "
+              f"({result['session_queries']} queries), "
+              f"token {result['token'] * 1000:7.2f} ms "
+              f"({result['token_queries']} queries)")
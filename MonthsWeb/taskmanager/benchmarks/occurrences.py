@@ -0,0 +1,72 @@
+""" Benchmark of the memory taken by the month of daily tasks: a full
+dict copy for every date (`RepeatingTasksGenerator.generate`) against
+`TaskOccurrence` objects sharing the records of the tasks
+(`RepeatingTasksGenerator.generate_occurrences`).
+
+Run from the project directory:
+    python manage.py shell -c "from taskmanager.benchmarks import occurrences; occurrences.main()"
+"""
+import datetime
+import timeit
+import tracemalloc
+
+from ..services.dateservice import DatesHandler
+from ..services.taskservice import RepeatingTasksGenerator
+
+
+def make_tasks(tasks_count: int) -> list:
+    """ Returns the records of daily tasks with a few files each."""
+    start = datetime.datetime(2019, 1, 1, tzinfo=datetime.timezone.utc)
+    return [
+        {'id': i, 'init_date': start, 'title': f'task {i}',
+         'description': 'description ' * 10, 'interval': 'every_day',
+         'autoshift': False,
+         'files': [{'id': i * 2 + j, 'link': f'file/{i}/{j}',
+                    'related_task_id': i} for j in range(2)]}
+        for i in range(tasks_count)
+    ]
+
+
+def measure(func, *args) -> tuple:
+    """ Returns the peak of the memory allocated by `func(*args)` (in
+    bytes, while its result is alive) and the best time of 3 runs.
+    """
+    tracemalloc.start()
+    result = func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    seconds = min(timeit.repeat(lambda: func(*args), number=1, repeat=3))
+    return peak, seconds
+
+
+def run(tasks_counts=(50, 200, 1000)) -> list:
+    """ Measures both ways of expanding the tasks over the month page
+    for each number of tasks in `tasks_counts` and returns a list of
+    dicts with the peaks of memory and the times in seconds.
+    """
+    datetime_objects = DatesHandler.generate_month_dates(
+        datetime.datetime(2021, 2, 1), as_objects=True)
+    results = []
+    for tasks_count in tasks_counts:
+        tasks = make_tasks(tasks_count)
+        dicts_memory, dicts_time = measure(
+            RepeatingTasksGenerator.generate, datetime_objects, tasks)
+        occurrences_memory, occurrences_time = measure(
+            RepeatingTasksGenerator.generate_occurrences,
+            datetime_objects, tasks)
+        results.append({'tasks': tasks_count,
+                        'dicts_memory': dicts_memory,
+                        'dicts_time': dicts_time,
+                        'occurrences_memory': occurrences_memory,
+                        'occurrences_time': occurrences_time})
+    return results
+
+
+def main():
+    for result in run():
+        print(f"{result['tasks']:>5} daily tasks: "
+              f"dicts {result['dicts_memory'] / 1024:9.1f} KiB "
+              f"{result['dicts_time'] * 1000:7.2f} ms, "
+              f"occurrences {result['occurrences_memory'] / 1024:9.1f} KiB "
+              f"{result['occurrences_time'] * 1000:7.2f} ms")
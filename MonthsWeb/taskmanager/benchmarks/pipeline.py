@@ -0,0 +1,196 @@
+""" Benchmark of the month-pack pipeline stage by stage, on the data of
+a user in the configured database (see the management commands
+"seed_scale_data" and "run_benchmarks"): the dates of the month page,
+the queries, the repetitions of the tasks, the files and completions,
+the JSON and the whole getDatePack/ and getDatePacks/ endpoints.
+
+Each stage is timed `repeat` times; the best and the mean times and the
+number of the queries of one run are recorded.
+"""
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ..models import Completion, File, Task
+from ..services.cacheservice import MonthPackCache
+from ..services.dateservice import DatesHandler
+from ..services.dbservice import DatabaseHandler
+from ..services.jsonservice import MonthPackStreamer
+from ..services.taskservice import RepeatingTasksGenerator, TaskHandler
+
+
+def measure(func: Callable, repeat: int) -> dict:
+    """ Runs `func` `repeat` times. Returns a dict with the ['best'] and
+    the ['mean'] time in seconds and the number of the ['queries'] of
+    the first run.
+    """
+    times = []
+    queries = 0
+    for number in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - started)
+        if number == 0:
+            queries = len(captured)
+    return {'best': min(times), 'mean': statistics.mean(times),
+            'queries': queries}
+
+
+def run(user: User, date: datetime.date, repeat: int = 5) -> dict:
+    """ Times the stages of the month pack of the user's month of the
+    `date`. Returns a dict of the stage names and their measurements.
+    """
+    grid = DatesHandler.month_grid(date)
+    date_range = (grid.dates[0], grid.dates[-1])
+    month_pack = DatabaseHandler.get_month_pack(date_range, user)
+    task_service = TaskHandler(DatabaseHandler)
+
+    def repeated_task_dicts():
+        return RepeatingTasksGenerator.generate(
+            grid.dates, month_pack['intervalled_tasks'])
+
+    occurrences = list(task_service.iter_tasklist_for_dates(
+        grid.dates, user, month_pack=month_pack))
+
+    stages = {
+        'generate_month_dates': lambda: DatesHandler.generate_month_dates(
+            grid.dates[len(grid.dates) // 2]),
+        'get_month_pack': lambda: DatabaseHandler.get_month_pack(
+            date_range, user),
+        'generate': repeated_task_dicts,
+        'generate_occurrences':
+            lambda: RepeatingTasksGenerator.generate_occurrences(
+                grid.dates, month_pack['intervalled_tasks']),
+        # the repetitions, the files and the completions of the fetched
+        # month pack, without the queries
+        'tasklist_of_month_pack':
+            lambda: list(task_service.iter_tasklist_for_dates(
+                grid.dates, user, month_pack=month_pack)),
+        'tasklist': lambda: list(task_service.iter_tasklist_for_dates(
+            grid.dates, user)),
+        'serialize': lambda: b''.join(
+            piece.encode() if isinstance(piece, str) else piece
+            for piece in MonthPackStreamer.iter_json(grid.isoformats,
+                                                     occurrences)),
+    }
+    results = {name: measure(func, repeat) for name, func in stages.items()}
+    results.update(_measure_endpoints(user, grid, repeat))
+    results['_sizes'] = {
+        'dates': len(grid.dates),
+        'tasks_by_timerange': len(month_pack['tasks_by_timerange']),
+        'intervalled_tasks': len(month_pack['intervalled_tasks']),
+        'occurrences': len(occurrences),
+        'files': len(month_pack['files']),
+        'completions': len(month_pack['completions']),
+    }
+    return results
+
+
+def make_report(user: User, date: datetime.date, repeat: int = 5,
+                label: str = '') -> dict:
+    """ Returns the results of `run()` with the description of the run
+    (commit, versions, database, sizes of the user's data).
+    """
+    results = run(user, date, repeat)
+    sizes = results.pop('_sizes')
+    return {
+        'meta': {
+            'label': label,
+            'created': timezone.now().isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'materialize_occurrences':
+                settings.TASKMANAGER_MATERIALIZE_OCCURRENCES,
+            'user': user.username,
+            'date': date.isoformat(),
+            'repeat': repeat,
+            'dataset': {
+                'tasks': Task.objects.filter(user=user).count(),
+                'files': File.objects
+                .filter(related_task__user=user).count(),
+                'completions': Completion.objects
+                .filter(related_task__user=user).count(),
+            },
+            'month': sizes,
+        },
+        'stages': results,
+    }
+
+
+def compare(report: dict, previous: dict) -> dict:
+    """ Returns the ratios of the best times (and the differences of
+    the queries) of the stages of `report` to the ones of `previous`.
+    """
+    comparison = {}
+    for name, result in report['stages'].items():
+        before = previous['stages'].get(name)
+        if before is None:
+            continue
+        comparison[name] = {
+            'best_ratio': result['best'] / before['best']
+            if before['best'] else None,
+            'queries_diff': result['queries'] - before['queries'],
+        }
+    return comparison
+
+
+def write_report(report: dict, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2))
+
+
+def _measure_endpoints(user: User, grid, repeat: int) -> dict:
+    """ Times the views with the test client: with the cache of the
+    month packs emptied before every request (cold) and filled (warm).
+    """
+    client = Client()
+    client.force_login(user)
+    params = {'date': grid.dates[len(grid.dates) // 2].isoformat()}
+
+    def get(path):
+        response = client.get(path, params)
+        b''.join(response.streaming_content if response.streaming
+                 else [response.content])
+
+    def cold(path):
+        def request():
+            MonthPackCache._cache().clear()
+            get(path)
+        return request
+
+    with override_settings(ALLOWED_HOSTS=['*'],
+                           TASKMANAGER_LAZY_AUTOSHIFT=False):
+        return {
+            'endpoint_getDatePack_cold': measure(cold('/getDatePack/'),
+                                                 repeat),
+            'endpoint_getDatePack_warm': measure(
+                lambda: get('/getDatePack/'), repeat),
+            'endpoint_getDatePacks_cold': measure(cold('/getDatePacks/'),
+                                                  repeat),
+        }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=Path(__file__).resolve().parent, capture_output=True,
+            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,86 @@
+""" Benchmark of the idle event streams (`events.EventStreamApp`): the
+memory taken by the open connections (each one is an asyncio task with
+its subscription, no thread) and the time to deliver a change to all of
+them.
+
+The streams are fed with fake ASGI receive/send callables and their
+user is given by an API token, so no database is needed (the user of
+the token and the initial version are patched out).
+
+Run from the project directory:
+    python manage.py shell -c "from taskmanager.benchmarks import push; push.main()"
+"""
+import asyncio
+import threading
+import time
+import tracemalloc
+from unittest import mock
+
+from ..events import EventStreamApp
+from ..services.pushservice import get_broker
+from ..services.tokenservice import ApiToken
+
+
+class FakeUser:
+    id = 1
+
+
+async def measure(connections: int) -> dict:
+    """ Opens `connections` streams of one user, publishes a change and
+    waits until every stream has sent it. Returns a dict with the memory
+    allocated per connection (in bytes) and the delivery time (seconds).
+    """
+    scope = {'type': 'http', 'method': 'GET', 'path': '/events/',
+             'query_string': b'',
+             'headers': [(b'authorization', b'Bearer benchmark-token')]}
+    disconnect = asyncio.Event()
+    delivered = asyncio.Event()
+    delivered_count = 0
+
+    async def receive():
+        await disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal delivered_count
+        if b'"version": 1}' in message.get('body', b''):
+            delivered_count += 1
+            if delivered_count == connections:
+                delivered.set()
+
+    app = EventStreamApp()
+    tracemalloc.start()
+    streams = [asyncio.ensure_future(app(scope, receive, send))
+               for _ in range(connections)]
+    # until all the streams are subscribed
+    while len(get_broker()._subscriptions.get(FakeUser.id, ())) \
+            < connections:
+        await asyncio.sleep(0.01)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    # published from another thread, as the writes of the views do
+    threading.Thread(target=get_broker().publish,
+                     args=(FakeUser.id, {'version': 1})).start()
+    await delivered.wait()
+    seconds = time.perf_counter() - started
+
+    disconnect.set()
+    await asyncio.gather(*streams)
+    return {'connections': connections,
+            'memory_per_connection': memory / connections,
+            'delivery': seconds}
+
+
+def main(connections_list=(1000, 5000)):
+    with mock.patch.object(EventStreamApp, '_get_version',
+                           staticmethod(lambda user_id: 0)), \
+            mock.patch.object(ApiToken, 'get_user',
+                              staticmethod(lambda token: FakeUser)):
+        for connections in connections_list:
+            result = asyncio.run(measure(connections))
+            print(f"{result['connections']} idle streams: "
+                  f"{result['memory_per_connection'] / 1024:6.1f} KiB "
+                  f"per connection, a change delivered to all in "
+                  f"{result['delivery'] * 1000:7.1f} ms")
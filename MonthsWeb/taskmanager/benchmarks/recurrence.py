@@ -0,0 +1,77 @@
+""" Benchmark of `RepeatingTasksGenerator.generate` against the former
+generator which checked every interval task on every date of the month
+(the checks of a single date are gone, a one-day range of
+`occurrence_dates()` stands for them).
+
+Run from the project directory:
+    python manage.py shell -c "from taskmanager.benchmarks import recurrence; recurrence.main()"
+"""
+import datetime
+import timeit
+
+from ..services.dateservice import DatesHandler
+from ..services.taskservice import RepeatingTasksGenerator
+
+
+INTERVALS = ('every_day', 'every_workday', 'every_week',
+             'every_month', 'every_year')
+
+
+def scanning_generate(datetime_objects: list, intervalled_tasks: list) -> list:
+    """ The former way of `RepeatingTasksGenerator.generate` (every task
+    is checked against every date, the date is checked on its own).
+    """
+    list_of_matched = []
+    for date_obj in datetime_objects:
+        date = date_obj.date()
+        for task in intervalled_tasks:
+            if date in RepeatingTasksGenerator.occurrence_dates(task, date,
+                                                                date):
+                matched_dict_copy = {k: v for k, v in task.items()}
+                matched_dict_copy['date'] = date_obj
+                list_of_matched.append(matched_dict_copy)
+    return list_of_matched
+
+
+def make_tasks(count: int) -> list:
+    """ Returns `count` interval tasks (as dicts) of all kinds of
+    intervals, created during the two years before the benchmarked month.
+    """
+    start = datetime.datetime(2019, 1, 1, tzinfo=datetime.timezone.utc)
+    return [
+        {'id': i,
+         'init_date': start + datetime.timedelta(days=(i * 7) % 730),
+         'title': f'task {i}',
+         'description': '',
+         'interval': INTERVALS[i % len(INTERVALS)],
+         'autoshift': False}
+        for i in range(count)
+    ]
+
+
+def run(task_counts=(10, 100, 500), repeat: int = 5) -> list:
+    """ Times both generators for each number of tasks in `task_counts`
+    and returns a list of dicts with the best times in seconds.
+    """
+    datetime_objects = DatesHandler.generate_month_dates(
+        datetime.datetime(2021, 2, 1), as_objects=True)
+    results = []
+    for count in task_counts:
+        tasks = make_tasks(count)
+        assert (RepeatingTasksGenerator.generate(datetime_objects, tasks) ==
+                scanning_generate(datetime_objects, tasks))
+        timings = {}
+        for name, func in (('scanning', scanning_generate),
+                           ('arithmetic', RepeatingTasksGenerator.generate)):
+            timings[name] = min(timeit.repeat(
+                lambda: func(datetime_objects, tasks), number=1, repeat=repeat))
+        results.append({'tasks': count, **timings})
+    return results
+
+
+def main():
+    for result in run():
+        print(f"{result['tasks']:>6} tasks: "
+              f"scanning {result['scanning'] * 1000:8.2f} ms, "
+              f"arithmetic {result['arithmetic'] * 1000:8.2f} ms, "
+              f"x{result['scanning'] / result['arithmetic']:.1f}")
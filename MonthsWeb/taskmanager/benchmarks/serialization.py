@@ -0,0 +1,96 @@
+""" Benchmark of the serialization of a month pack: the whole document
+encoded at once by `JsonResponse` (with `MonthPackEncoder`) against the
+`StreamingHttpResponse` of `MonthPackStreamer`. Measures the peak of
+memory allocated while the response is made and sent (tracemalloc),
+the time to the first byte and the total time.
+
+Run from the project directory:
+    python manage.py shell -c "from taskmanager.benchmarks import serialization; serialization.main()"
+"""
+import datetime
+import time
+import tracemalloc
+
+from django.http import JsonResponse, StreamingHttpResponse
+
+from ..services.dateservice import DatesHandler
+from ..services.jsonservice import MonthPackEncoder, MonthPackStreamer
+from ..services.taskservice import RepeatingTasksGenerator
+
+
+def make_task_dicts(tasks_count: int) -> list:
+    """ Returns the task dicts (as `TaskHandler` completes them) of
+    `tasks_count` daily tasks repeated over the month of February 2021.
+    """
+    grid = DatesHandler.month_grid(datetime.date(2021, 2, 1))
+    init_date = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    tasks = [
+        {'id': i, 'init_date': init_date, 'title': f'task {i}',
+         'description': 'd' * 200, 'interval': 'every_day',
+         'autoshift': False}
+        for i in range(tasks_count)
+    ]
+    task_dicts = RepeatingTasksGenerator.generate(grid.dates, tasks)
+    for task in task_dicts:
+        task['files'] = [{'id': task['id'], 'link': 'link/to/file',
+                          'related_task_id': task['id']}]
+        task['completion'] = task['date']
+    return task_dicts
+
+
+def json_response(dates, task_dicts):
+    """ The former way: encodes it all at once."""
+    return JsonResponse({'dates': dates, 'tasks': task_dicts},
+                        encoder=MonthPackEncoder)
+
+
+def streaming_response(dates, task_dicts):
+    return StreamingHttpResponse(
+        MonthPackStreamer.iter_json(dates, iter(task_dicts)),
+        content_type='application/json')
+
+
+def measure(make_response, tasks_count: int) -> dict:
+    """ Makes the response and consumes its content as a server would
+    (without keeping the sent bytes).
+    """
+    dates = DatesHandler.month_grid(datetime.date(2021, 2, 1)).isoformats
+    task_dicts = make_task_dicts(tasks_count)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = make_response(dates, task_dicts)
+    first_byte = None
+    size = 0
+    for chunk in response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+    total = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'first_byte': first_byte, 'total': total,
+            'peak_memory': peak, 'size': size}
+
+
+def run(tasks_counts=(50, 200)) -> list:
+    """ Measures both ways for every number of daily tasks in
+    `tasks_counts` and returns a list of dicts with the results.
+    """
+    results = []
+    for tasks_count in tasks_counts:
+        for name, make_response in (('JsonResponse', json_response),
+                                    ('streaming', streaming_response)):
+            results.append({'tasks': tasks_count, 'response': name,
+                            **measure(make_response, tasks_count)})
+    return results
+
+
+def main():
+    for result in run():
+        print(f"{result['tasks']:>4} daily tasks, {result['response']:>12}: "
+              f"first byte {result['first_byte'] * 1000:7.2f} ms, "
+              f"total {result['total'] * 1000:7.2f} ms, "
+              f"peak memory {result['peak_memory'] / 2 ** 20:6.2f} MiB "
+              f"({result['size'] / 2 ** 20:.2f} MiB sent)")
@@ -0,0 +1,41 @@
+""" Benchmark of the overhead of the stage timings
+(`timingservice.timed_stage`) on a call of a cheap function: undecorated,
+decorated with the timings off (the default) and decorated with them
+being recorded.
+
+Run from the project directory:
+    python manage.py shell -c "from taskmanager.benchmarks import timing; timing.main()"
+"""
+import timeit
+
+from ..services import timingservice
+
+
+@timingservice.timed_stage('benchmark.noop')
+def noop(value):
+    return value
+
+
+def measure(number: int) -> dict:
+    """ Returns the time of a call (seconds) of the undecorated function
+    and of the decorated one with the timings off and on.
+    """
+    results = {
+        'undecorated': min(timeit.repeat(
+            lambda: noop.__wrapped__(1), number=number, repeat=5)),
+        'disabled': min(timeit.repeat(
+            lambda: noop(1), number=number, repeat=5)),
+    }
+    _, token = timingservice.start_recording()
+    try:
+        results['enabled'] = min(timeit.repeat(
+            lambda: noop(1), number=number, repeat=5))
+    finally:
+        timingservice.stop_recording(token)
+    return {name: seconds / number for name, seconds in results.items()}
+
+
+def main(number=200000):
+    results = measure(number)
+    for name, seconds in results.items():
+        print(f'{name:12} {seconds * 1e9:8.1f} ns per call')
@@ -0,0 +1,66 @@
+import functools
+from calendar import timegm
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def token_auth_allowed(view):
+    """ Marks the view as a part of the JSON API, which can be requested
+    with a token instead of a session (see
+    `middleware.TokenAuthenticationMiddleware`).
+    """
+    view.token_auth_allowed = True
+    return view
+
+
+def async_login_required(view):
+    """ The same as `django.contrib.auth.decorators.login_required` for
+    async views (which it does not support in Django 3.1). The user is
+    loaded from the session in the thread of the sync code.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        is_authenticated = await sync_to_async(
+            lambda: request.user.is_authenticated)()
+        if not is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def async_condition(etag_func=None, last_modified_func=None):
+    """ The same as `django.views.decorators.http.condition` for async
+    views: the (sync) `etag_func` and `last_modified_func` are run in
+    the thread of the sync code.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            etag = None
+            if etag_func is not None:
+                etag = await sync_to_async(etag_func)(request, *args,
+                                                      **kwargs)
+            etag = quote_etag(etag) if etag is not None else None
+            last_modified = None
+            if last_modified_func is not None:
+                dt = await sync_to_async(last_modified_func)(request, *args,
+                                                             **kwargs)
+                if dt:
+                    last_modified = timegm(dt.utctimetuple())
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+
+            if request.method in ('GET', 'HEAD'):
+                if last_modified and not response.has_header('Last-Modified'):
+                    response['Last-Modified'] = http_date(last_modified)
+                if etag and not response.has_header('ETag'):
+                    response['ETag'] = etag
+            return response
+        return wrapper
+    return decorator
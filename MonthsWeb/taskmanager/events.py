@@ -0,0 +1,169 @@
+""" Server-Sent Events of the changes of the users' tasks, served as a
+plain ASGI application (see MonthsWeb/asgi.py) next to Django: an open
+connection is an asyncio task waiting on its queue, without a thread.
+"""
+import asyncio
+import json
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from typing import Optional
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.db import close_old_connections
+
+from .services.changelogservice import ChangeLog
+from .services.pushservice import get_broker
+from .services.tokenservice import ApiToken, StreamTicket
+
+
+class EventStreamApp:
+    """ Streams to a user's client an event "tasks" with the version of
+    the tasks ({"version": <version>}) when they are changed, starting
+    with the current version, so that the client can get the changes
+    from changes/?since=<version>. A comment is sent every
+    TASKMANAGER_PUSH_KEEPALIVE seconds to keep the idle connection open.
+
+    The user is taken from the session cookie, from an API token given
+    in the "Authorization: Bearer" header or from a ticket given as
+    ?ticket=<ticket> (the browsers' EventSource can not set headers, see
+    `tokenservice.StreamTicket`). A HEAD request gets the headers only.
+    """
+
+    headers = [
+        (b'content-type', b'text/event-stream'),
+        (b'cache-control', b'no-cache'),
+        # not to be buffered by nginx
+        (b'x-accel-buffering', b'no'),
+    ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['method'] not in ('GET', 'HEAD'):
+            await self._send_status(send, 405)
+            return
+        user_id = await self._get_user_id(scope)
+        if user_id is None:
+            await self._send_status(send, 401)
+            return
+
+        if scope['method'] == 'HEAD':
+            await send({'type': 'http.response.start', 'status': 200,
+                        'headers': self.headers})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        broker = get_broker()
+        subscription = broker.subscribe(user_id)
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        message = None
+        try:
+            await send({'type': 'http.response.start', 'status': 200,
+                        'headers': self.headers})
+            version = await sync_to_async(self._get_version)(user_id)
+            await self._send_event(send, {'version': version})
+
+            message = asyncio.ensure_future(subscription.get())
+            while True:
+                done, _ = await asyncio.wait(
+                    {message, disconnected},
+                    timeout=settings.TASKMANAGER_PUSH_KEEPALIVE,
+                    return_when=asyncio.FIRST_COMPLETED)
+                if disconnected in done:
+                    break
+                if message in done:
+                    await self._send_event(send, message.result())
+                    message = asyncio.ensure_future(subscription.get())
+                else:
+                    await send({'type': 'http.response.body',
+                                'body': b': keepalive\n\n',
+                                'more_body': True})
+        finally:
+            broker.unsubscribe(subscription)
+            disconnected.cancel()
+            if message is not None:
+                message.cancel()
+
+    #                               ***
+    #                              other
+
+    async def _get_user_id(self, scope) -> Optional[int]:
+        headers = dict(scope['headers'])
+        authorization = headers.get(b'authorization', b'').decode('latin-1')
+        token = None
+        if authorization.startswith('Bearer '):
+            token = authorization[len('Bearer '):].strip()
+        if token:
+            return await sync_to_async(self._get_token_user_id)(token)
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        ticket = query.get('ticket', [None])[0]
+        if ticket:
+            return await sync_to_async(self._get_ticket_user_id)(ticket)
+
+        cookies = SimpleCookie(headers.get(b'cookie', b'').decode('latin-1'))
+        session_cookie = cookies.get(settings.SESSION_COOKIE_NAME)
+        if session_cookie is None:
+            return None
+        return await sync_to_async(self._get_session_user_id)(
+            session_cookie.value)
+
+    @staticmethod
+    def _get_token_user_id(token: str) -> Optional[int]:
+        close_old_connections()
+        try:
+            user = ApiToken.get_user(token)
+            return user.id if user is not None else None
+        finally:
+            close_old_connections()
+
+    @staticmethod
+    def _get_ticket_user_id(ticket: str) -> Optional[int]:
+        close_old_connections()
+        try:
+            user = StreamTicket.use(ticket)
+            return user.id if user is not None else None
+        finally:
+            close_old_connections()
+
+    @staticmethod
+    def _get_session_user_id(session_key: str) -> Optional[int]:
+        """ Returns the id of the user of the session (checked as
+        `django.contrib.auth.get_user()` does it for a request).
+        """
+        close_old_connections()
+        try:
+            engine = import_module(settings.SESSION_ENGINE)
+            session = engine.SessionStore(session_key)
+            user = auth.get_user(SimpleNamespace(session=session))
+            return user.id if user.is_authenticated else None
+        finally:
+            close_old_connections()
+
+    @staticmethod
+    def _get_version(user_id: int) -> int:
+        close_old_connections()
+        try:
+            return ChangeLog.get_version(user_id)
+        finally:
+            close_old_connections()
+
+    @staticmethod
+    async def _wait_disconnect(receive) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+
+    @staticmethod
+    async def _send_event(send, data: dict) -> None:
+        body = f'event: tasks\ndata: {json.dumps(data)}\n\n'.encode()
+        await send({'type': 'http.response.body', 'body': body,
+                    'more_body': True})
+
+    @staticmethod
+    async def _send_status(send, status: int) -> None:
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
@@ -0,0 +1,68 @@
+import datetime
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ...services.autoshiftservice import AutoshiftHandler
+from ...services.dateservice import DatesHandler
+
+
+class Command(BaseCommand):
+    help = ('Shifts the uncompleted tasks with autoshift to the given day '
+            '(today by default) in batches, for all or given users.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='ISOformat date to shift the tasks to (default: the '
+                 'beginning of today)')
+        parser.add_argument(
+            '--user', action='append', dest='usernames', default=[],
+            help='username whose tasks to shift (can be repeated)')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='how many tasks are shifted in one transaction')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='only count the tasks that would be shifted')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                today = datetime.datetime.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f'invalid date: {options["date"]}')
+            if timezone.is_naive(today):
+                today = timezone.make_aware(today)
+        else:
+            today, _ = DatesHandler.day_bounds(timezone.now())
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        user_ids = None
+        if options['usernames']:
+            users = User.objects.filter(username__in=options['usernames'])
+            missing = (set(options['usernames']) -
+                       set(users.values_list('username', flat=True)))
+            if missing:
+                raise CommandError(f'unknown users: {", ".join(missing)}')
+            user_ids = list(users.values_list('id', flat=True))
+
+        verb = 'to shift' if options['dry_run'] else 'shifted'
+        started = time.perf_counter()
+        total = 0
+        batches = AutoshiftHandler.iter_batches(
+            today, user_ids=user_ids, batch_size=options['batch_size'],
+            dry_run=options['dry_run'])
+        for number, batch in enumerate(batches, start=1):
+            total += batch.shifted
+            self.stdout.write(
+                f'[{number}] ids {batch.first_id}-{batch.last_id}: '
+                f'{batch.shifted} tasks {verb} in '
+                f'{batch.seconds * 1000:.1f} ms')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} tasks {verb} to {today.isoformat()} in '
+            f'{time.perf_counter() - started:.2f} s'))
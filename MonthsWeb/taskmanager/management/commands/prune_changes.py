@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from ...models import ChangeSequence
+from ...services.changelogservice import ChangeLog
+
+
+class Command(BaseCommand):
+    help = ('Deletes the entries of the old changes of the tasks '
+            '(models.ChangeLogEntry) for all or given users.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', action='append', dest='usernames', default=[],
+            help='username whose changes to prune (can be repeated)')
+        parser.add_argument(
+            '--keep', type=int,
+            default=settings.TASKMANAGER_CHANGES_KEEP_VERSIONS,
+            help='how many latest versions of the changes are kept')
+
+    def handle(self, *args, **options):
+        if options['keep'] < 0:
+            raise CommandError('--keep must not be negative')
+
+        sequences = ChangeSequence.objects\
+            .filter(value__gt=F('pruned') + options['keep'])
+        if options['usernames']:
+            users = User.objects.filter(username__in=options['usernames'])
+            missing = (set(options['usernames']) -
+                       set(users.values_list('username', flat=True)))
+            if missing:
+                raise CommandError(f'unknown users: {", ".join(missing)}')
+            sequences = sequences.filter(user__in=users)
+        user_ids = list(sequences
+                        .values_list('user_id', flat=True)
+                        .order_by('user_id'))
+
+        total = 0
+        for number, user_id in enumerate(user_ids, start=1):
+            deleted = ChangeLog.prune(user_id, options['keep'])
+            total += deleted
+            self.stdout.write(f'[{number}/{len(user_ids)}] user_id '
+                              f'{user_id}: {deleted} entries deleted')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} entries deleted, the latest {options["keep"]} '
+            f'versions kept'))
@@ -0,0 +1,60 @@
+import datetime
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ...models import Occurrence, Task
+from ...services.occurrenceservice import OccurrenceHandler
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds (or backfills) the stored repetitions of the tasks '
+            'with interval (models.Occurrence) for all or given users.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', action='append', dest='usernames', default=[],
+            help='username whose repetitions to rebuild (can be repeated)')
+        parser.add_argument(
+            '--horizon', type=int,
+            default=settings.TASKMANAGER_OCCURRENCE_HORIZON_DAYS,
+            help='how many days after today the repetitions are stored')
+        parser.add_argument(
+            '--extend', action='store_true',
+            help='only store the repetitions missing up to the horizon '
+                 'instead of rebuilding them (to be run daily)')
+
+    def handle(self, *args, **options):
+        until = timezone.now().date() + datetime.timedelta(
+            days=options['horizon'])
+
+        if options['usernames']:
+            users = User.objects.filter(username__in=options['usernames'])
+            missing = (set(options['usernames']) -
+                       set(users.values_list('username', flat=True)))
+            if missing:
+                raise CommandError(f'unknown users: {", ".join(missing)}')
+            user_ids = list(users.values_list('id', flat=True))
+        else:
+            # only the users that have tasks with interval
+            user_ids = list(Task.objects
+                            .exclude(interval='no')
+                            .values_list('user_id', flat=True)
+                            .distinct()
+                            .order_by('user_id'))
+
+        total = 0
+        for number, user_id in enumerate(user_ids, start=1):
+            if options['extend']:
+                OccurrenceHandler.extend(user_id, until)
+                stored = Occurrence.objects.filter(user_id=user_id).count()
+            else:
+                stored = OccurrenceHandler.rebuild(user_id, until)
+            total += stored
+            self.stdout.write(f'[{number}/{len(user_ids)}] user_id '
+                              f'{user_id}: {stored} repetitions')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} repetitions stored up to {until.isoformat()}'))
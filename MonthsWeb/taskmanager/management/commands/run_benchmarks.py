@@ -0,0 +1,80 @@
+import datetime
+import json
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ...benchmarks import pipeline
+
+
+class Command(BaseCommand):
+    help = ('Times the stages of the month-pack pipeline and the month '
+            'endpoints on the data of a user (e.g. made by '
+            '"seed_scale_data") and writes the results as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', default='scale_user0',
+            help='username whose month is measured')
+        parser.add_argument(
+            '--date', default='2021-02-01',
+            help='ISOformat date of the month to measure')
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='how many times each stage is run')
+        parser.add_argument(
+            '--label', default='',
+            help='description of the run, saved with the results')
+        parser.add_argument(
+            '--output',
+            help='path of the JSON file (default: '
+                 'benchmark-results/<time>-<commit>.json)')
+        parser.add_argument(
+            '--compare',
+            help='path of the JSON file of a previous run to compare with')
+
+    def handle(self, *args, **options):
+        try:
+            date = datetime.date.fromisoformat(options['date'])
+        except ValueError:
+            raise CommandError(f'invalid date: {options["date"]}')
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be positive')
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'unknown user: {options["user"]} (see '
+                               f'the command "seed_scale_data")')
+        previous = None
+        if options['compare']:
+            try:
+                previous = json.loads(Path(options['compare']).read_text())
+            except (OSError, ValueError) as err:
+                raise CommandError(f'can not read {options["compare"]}: '
+                                   f'{err}')
+
+        report = pipeline.make_report(user, date, options['repeat'],
+                                      options['label'])
+        comparison = {}
+        if previous is not None:
+            comparison = pipeline.compare(report, previous)
+            report['compared_with'] = previous['meta']
+
+        for name, result in report['stages'].items():
+            line = (f'{name:28} best {result["best"] * 1000:9.2f} ms, '
+                    f'mean {result["mean"] * 1000:9.2f} ms, '
+                    f'{result["queries"]:3} queries')
+            if name in comparison and \
+                    comparison[name]['best_ratio'] is not None:
+                line += f' (x{comparison[name]["best_ratio"]:.2f})'
+            self.stdout.write(line)
+
+        output = options['output']
+        if output is None:
+            created = timezone.now().strftime('%Y%m%dT%H%M%S')
+            output = (f'benchmark-results/{created}-'
+                      f'{report["meta"]["commit"] or "unknown"}.json')
+        pipeline.write_report(report, Path(output))
+        self.stdout.write(self.style.SUCCESS(f'results written to {output}'))
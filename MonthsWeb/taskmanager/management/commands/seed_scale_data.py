@@ -0,0 +1,83 @@
+import datetime
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from ...benchmarks.dataset import INTERVALS, DatasetSpec, seed
+
+
+class Command(BaseCommand):
+    help = ('Creates users with synthetic tasks, files and completion '
+            'histories for the benchmarks (see "run_benchmarks").')
+
+    def add_arguments(self, parser):
+        defaults = DatasetSpec()
+        parser.add_argument(
+            '--users', type=int, default=1,
+            help='how many users to create')
+        parser.add_argument(
+            '--prefix', default='scale_user',
+            help='prefix of the usernames (followed by the number)')
+        parser.add_argument(
+            '--one-off', type=int, default=defaults.one_off_tasks,
+            help='tasks without interval per user')
+        parser.add_argument(
+            '--interval', type=int, default=defaults.interval_tasks,
+            help=f'tasks of each interval ({", ".join(INTERVALS)}) '
+                 f'per user')
+        parser.add_argument(
+            '--files', type=int, default=defaults.files_per_task,
+            help='files attached to each task')
+        parser.add_argument(
+            '--years', type=int, default=defaults.years,
+            help='years of completion history')
+        parser.add_argument(
+            '--completion-rate', type=float,
+            default=defaults.completion_rate,
+            help='share of the dates of the history with a completion')
+        parser.add_argument(
+            '--until', default=defaults.until.isoformat(),
+            help='ISOformat date of the end of the history')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='seed of the random data')
+        parser.add_argument(
+            '--replace', action='store_true',
+            help='delete the existing users with the prefix first')
+
+    def handle(self, *args, **options):
+        try:
+            until = datetime.date.fromisoformat(options['until'])
+        except ValueError:
+            raise CommandError(f'invalid date: {options["until"]}')
+        counts = ('users', 'one_off', 'interval', 'files', 'years')
+        if any(options[name] < 0 for name in counts):
+            raise CommandError('the counts must not be negative')
+        if not 0 <= options['completion_rate'] <= 1:
+            raise CommandError('--completion-rate must be from 0 to 1')
+
+        usernames = [f'{options["prefix"]}{number}'
+                     for number in range(options['users'])]
+        existing = User.objects.filter(
+            username__startswith=options['prefix'])
+        if options['replace']:
+            existing.delete()
+        elif existing.filter(username__in=usernames).exists():
+            raise CommandError(
+                f'users with the prefix "{options["prefix"]}" exist '
+                f'(use --replace or another --prefix)')
+
+        spec = DatasetSpec(
+            one_off_tasks=options['one_off'],
+            interval_tasks=options['interval'],
+            files_per_task=options['files'],
+            years=options['years'],
+            completion_rate=options['completion_rate'],
+            until=until)
+        started = time.perf_counter()
+        stats = seed(usernames, spec, seed_value=options['seed'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{stats.users} users, {stats.tasks} tasks, {stats.files} '
+            f'files and {stats.completions} completions created in '
+            f'{time.perf_counter() - started:.2f} s'))
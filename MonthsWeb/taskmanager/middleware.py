@@ -0,0 +1,263 @@
+import asyncio
+import json
+import logging
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import middleware as auth_middleware
+from django.contrib.messages import middleware as messages_middleware
+from django.contrib.sessions import middleware as sessions_middleware
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.deprecation import MiddlewareMixin
+
+from .services import timingservice
+from .services.profilingservice import (RequestProfile, has_profile_key,
+                                        should_profile)
+from .services.tokenservice import ApiToken
+
+
+logger = logging.getLogger('taskmanager.timing')
+
+
+def _is_token_authenticated(request) -> bool:
+    return getattr(request, 'token_authenticated', False)
+
+
+class TokenAuthenticationMiddleware(MiddlewareMixin):
+    """ Authenticates the requests to the views that allow it (see
+    `decorators.token_auth_allowed`) by a signed token in the
+    "Authorization: Bearer <token>" header. The user of the token is
+    loaded through `accounts.services.usercache.UserCache`, a missing or
+    inactive user is refused. Such requests need no session, so the
+    session, authentication and messages middleware below skip them.
+    Must be placed before SessionMiddleware.
+    """
+
+    keyword = 'Bearer '
+
+    def process_request(self, request):
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if not header.startswith(self.keyword):
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        if not getattr(match.func, 'token_auth_allowed', False):
+            return None
+
+        user = ApiToken.get_user(header[len(self.keyword):].strip())
+        if user is None:
+            return HttpResponse(status=401)
+        request.user = user
+        request.token_authenticated = True
+        # the token is not sent by the browser on its own (unlike cookies)
+        request._dont_enforce_csrf_checks = True
+        return None
+
+
+class SessionMiddleware(sessions_middleware.SessionMiddleware):
+    """ SessionMiddleware skipping the token-authenticated requests."""
+
+    def process_request(self, request):
+        if not _is_token_authenticated(request):
+            super().process_request(request)
+
+    def process_response(self, request, response):
+        if _is_token_authenticated(request):
+            return response
+        return super().process_response(request, response)
+
+
+class AuthenticationMiddleware(auth_middleware.AuthenticationMiddleware):
+    """ AuthenticationMiddleware keeping the user of the token."""
+
+    def process_request(self, request):
+        if not _is_token_authenticated(request):
+            super().process_request(request)
+
+
+class MessageMiddleware(messages_middleware.MessageMiddleware):
+    """ MessageMiddleware skipping the token-authenticated requests."""
+
+    def process_request(self, request):
+        if not _is_token_authenticated(request):
+            super().process_request(request)
+
+
+class ServerTimingMiddleware:
+    """ Records the stages of the request (see `timingservice.timed_stage`)
+    if TASKMANAGER_SERVER_TIMING is on, and sends them in the
+    Server-Timing header of the response. The record of the request is
+    also logged as a JSON line (to the "taskmanager.timing" logger) and
+    kept for the debug page of the timings.
+
+    The stages of a streaming response that run while it is sent (the
+    JSON encoding) come too late for the header, they are in the log
+    line, which is written when the stream is finished. Should be the
+    first middleware, to time the others too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # marks the instance as a coroutine function for Django
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not settings.TASKMANAGER_SERVER_TIMING:
+            return self.get_response(request)
+
+        timings, token = timingservice.start_recording()
+        try:
+            response = self.get_response(request)
+        finally:
+            timingservice.stop_recording(token)
+        return self._finish(request, response, timings)
+
+    async def __acall__(self, request):
+        if not settings.TASKMANAGER_SERVER_TIMING:
+            return await self.get_response(request)
+
+        timings, token = timingservice.start_recording()
+        try:
+            response = await self.get_response(request)
+        finally:
+            timingservice.stop_recording(token)
+        return self._finish(request, response, timings)
+
+    def _finish(self, request, response, timings):
+        response['Server-Timing'] = timings.as_header()
+        if response.streaming:
+            response.streaming_content = self._log_after_stream(
+                response.streaming_content, request, response, timings)
+        else:
+            self._log(request, response, timings)
+        return response
+
+    def _log_after_stream(self, content, request, response, timings):
+        try:
+            yield from content
+        finally:
+            self._log(request, response, timings)
+
+    @staticmethod
+    def _log(request, response, timings) -> None:
+        record = {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'total': round(timings.elapsed() * 1000, 3),
+            'stages': timings.as_dict(),
+        }
+        logger.info(json.dumps(record))
+        timingservice.remember(record)
+
+
+class ProfilingMiddleware:
+    """ Profiles some of the requests to the views of taskmanager (see
+    `profilingservice.should_profile`) and writes their profiles to
+    TASKMANAGER_PROFILE_DIR (see `profilingservice.RequestProfile`). The
+    name of the written dump is sent in the X-Profile header of the
+    response to a request with the profile key (see
+    `profilingservice.has_profile_key`). A streaming response is
+    profiled while its chunks are made, until the stream is finished or
+    the response is closed. Only one request is profiled at a time in a
+    process, the others chosen meanwhile are not profiled.
+
+    The thread running the view is profiled: in the async views that is
+    the thread of the event loop, so the code run by `sync_to_async` is
+    not seen (but the other requests served by the loop meanwhile are).
+    Should be the last middleware, to profile the views only.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # marks the instance as a coroutine function for Django
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        name = self._get_view_name(request)
+        profile = name and RequestProfile.start(name, request.user.id)
+        if not profile:
+            return self.get_response(request)
+
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            profile.finish()
+            raise
+        return self._finish(request, response, profile)
+
+    async def __acall__(self, request):
+        name = self._get_view_name(request)
+        profile = name and RequestProfile.start(
+            name, await sync_to_async(lambda: request.user.id)())
+        if not profile:
+            return await self.get_response(request)
+
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            profile.finish()
+            raise
+        return self._finish(request, response, profile)
+
+    @staticmethod
+    def _get_view_name(request) -> Optional[str]:
+        """ Returns the name of the view of the request if the request is
+        to be profiled, None otherwise.
+        """
+        if not should_profile(request):
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        if match.func.__module__ != 'taskmanager.views':
+            return None
+        return match.url_name or match.func.__name__
+
+    def _finish(self, request, response, profile):
+        if has_profile_key(request):
+            response['X-Profile'] = profile.filename
+        if response.streaming:
+            profile.pause()
+            response.streaming_content = self._profile_stream(
+                response.streaming_content, profile)
+            # the stream may be never iterated (e.g. if the client is
+            # gone), the server closes the response anyway
+            response._resource_closers.append(profile.finish)
+        else:
+            profile.finish()
+        return response
+
+    @staticmethod
+    def _profile_stream(content, profile):
+        """ Yields the chunks of the `content`, profiling the making of
+        them only, not the sending.
+        """
+        iterator = iter(content)
+        try:
+            while True:
+                profile.resume()
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    profile.pause()
+                yield chunk
+        finally:
+            profile.finish()
@@ -0,0 +1,25 @@
+# Generated by Django 3.1.6 on 2026-10-18 16:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taskmanager', '0003_delete_userprofile'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='completion',
+            index=models.Index(fields=['related_task', 'date_completed'], name='completion_task_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'init_date'], name='task_user_init_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(_negated=True, interval='no'), fields=['user', 'init_date'], name='task_user_interval_idx'),
+        ),
+    ]
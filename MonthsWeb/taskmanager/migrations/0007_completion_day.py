@@ -0,0 +1,69 @@
+# Generated by Django 3.1.6 on 2026-10-18 16:40
+
+import pytz
+from django.db import migrations, models
+
+
+# the days are those of the time zone of the project when the migration
+# was written (the settings left TIME_ZONE to the default of Django), so
+# that the result does not depend on the settings it is run with
+DAY_TIME_ZONE = pytz.timezone('America/Chicago')
+
+
+def fill_completion_days(apps, schema_editor):
+    """ Sets the day of the existing completions and removes the
+    duplicates of a task on the same day (the earliest one is kept), which
+    were possible before the unique constraint.
+
+    The removal is destructive: the duplicates are deleted for good and
+    are not brought back by migrating backwards (back up the table of
+    the completions beforehand to keep them).
+    """
+    Completion = apps.get_model('taskmanager', 'Completion')
+    seen = set()
+    duplicates = []
+    batch = []
+    for completion in Completion.objects\
+            .only('id', 'related_task_id', 'date_completed')\
+            .order_by('id')\
+            .iterator():
+        completion.day = completion.date_completed\
+            .astimezone(DAY_TIME_ZONE).date()
+        key = (completion.related_task_id, completion.day)
+        if key in seen:
+            duplicates.append(completion.id)
+            continue
+        seen.add(key)
+        batch.append(completion)
+        if len(batch) >= 1000:
+            Completion.objects.bulk_update(batch, ['day'])
+            batch = []
+    if batch:
+        Completion.objects.bulk_update(batch, ['day'])
+    if duplicates:
+        Completion.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taskmanager', '0006_task_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='completion',
+            name='day',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_completion_days, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='completion',
+            name='day',
+            field=models.DateField(editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='completion',
+            constraint=models.UniqueConstraint(fields=('related_task', 'day'), name='unique_completion_per_day'),
+        ),
+    ]
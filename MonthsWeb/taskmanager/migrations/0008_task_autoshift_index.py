@@ -0,0 +1,17 @@
+# Generated by Django 3.1.6 on 2026-10-18 16:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taskmanager', '0007_completion_day'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(autoshift=True), fields=['id'], name='task_autoshift_idx'),
+        ),
+    ]
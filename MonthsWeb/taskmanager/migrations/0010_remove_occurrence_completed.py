@@ -0,0 +1,17 @@
+# Generated by Django 3.1.6 on 2026-10-18 17:16
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taskmanager', '0009_changelog'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='occurrence',
+            name='completed',
+        ),
+    ]
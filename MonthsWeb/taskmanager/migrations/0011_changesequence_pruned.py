@@ -0,0 +1,18 @@
+# Generated by Django 3.1.6 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taskmanager', '0010_remove_occurrence_completed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='changesequence',
+            name='pruned',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -1,7 +1,17 @@
+import datetime
+
 from django.contrib.auth.models import User
-from django.db import IntegrityError
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import Q
+from django.utils import timezone
+
+
+# the intervals with which the tasks repeat (besides 'no'), the same as
+# the keys of `services.taskservice.RepeatingTasksGenerator.occurrences_map`
+# (the 'special' intervals with options are not implemented yet)
+INTERVALS = ('every_day', 'every_workday', 'every_week', 'every_month',
+             'every_year')
 
 
 class Task(models.Model):
@@ -24,6 +34,9 @@ class Task(models.Model):
     autoshift = models.BooleanField(default=False)
     # owner of the task
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=False)
+    # time of the last change of the task or of its related models (set
+    # explicitly by the queryset updates of `DatabaseHandler`)
+    updated_at = models.DateTimeField(auto_now=True)
 
     
     class Meta:
@@ -44,10 +57,33 @@ class Task(models.Model):
                 name='interval_or_autoshift',
             )
         ]
+        indexes = [
+            # tasks of the user in a date range
+            models.Index(fields=['user', 'init_date'],
+                         name='task_user_init_date_idx'),
+            # tasks of the user that repeat with an interval
+            models.Index(fields=['user', 'init_date'],
+                         name='task_user_interval_idx',
+                         condition=~Q(interval='no')),
+            # the last change among the tasks of the user
+            models.Index(fields=['user', 'updated_at'],
+                         name='task_user_updated_at_idx'),
+            # the tasks to shift, walked in batches of ids
+            models.Index(fields=['id'], name='task_autoshift_idx',
+                         condition=Q(autoshift=True)),
+        ]
 
     def __str__(self) -> str:
         return f'id {self.id}'
 
+    def clean(self):
+        # the same as the check constraint, but reported before the insert
+        if self.interval not in ('no', *INTERVALS):
+            raise ValidationError({'interval': 'Unknown interval.'})
+        if self.interval != 'no' and self.autoshift:
+            raise ValidationError(
+                'A task can have either interval or autoshift, not both.')
+
 
 class File(models.Model):
     """ File, attached to the user-created task (text document,
@@ -70,18 +106,132 @@ class Completion(models.Model):
     """
     # date when the related task completed
     date_completed = models.DateTimeField(auto_now=False, auto_now_add=False)
+    # the day of date_completed (in the current time zone), kept to
+    # allow only one completion of the task per day (set by save(), must
+    # be set explicitly for bulk_create())
+    day = models.DateField(editable=False)
     # completed task
     related_task = models.ForeignKey(Task, on_delete=models.CASCADE)
-    
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['related_task', 'day'],
+                                    name='unique_completion_per_day'),
+        ]
+        indexes = [
+            # completions of the task in a date range
+            models.Index(fields=['related_task', 'date_completed'],
+                         name='completion_task_date_idx'),
+        ]
+
     def __str__(self) -> str:
         return f'for the task_id {self.related_task_id} {self.date_completed}'
-    
+
     def save(self, *args, **kwargs):
-        if Completion.objects\
-        .filter(date_completed__date=self.date_completed,
-                related_task=self.related_task)\
-        .exists():
-            raise IntegrityError(
-                        'Completion must be unique for one Task and one date')
-        
+        self.day = self.day_of(self.date_completed)
         super(Completion, self).save(*args, **kwargs)
+
+    @staticmethod
+    def day_of(date_completed: datetime.datetime) -> datetime.date:
+        """ Returns the day of the `date_completed` (in the current time
+        zone, as `DatesHandler.day_bounds()` takes it).
+        """
+        if timezone.is_aware(date_completed):
+            date_completed = timezone.localtime(date_completed)
+        return date_completed.date()
+
+
+class Occurrence(models.Model):
+    """ A date when a task with interval repeats. The repetitions are
+    stored ahead (see `services.occurrenceservice`) if the setting
+    TASKMANAGER_MATERIALIZE_OCCURRENCES is on, so that the months are
+    served without computing the repetitions on every request. The
+    completions of the repetitions are kept by `Completion` only.
+    """
+    # repeating task
+    task = models.ForeignKey(Task, on_delete=models.CASCADE)
+    # owner of the task (to select the repetitions of the user by dates)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # date of the repetition
+    date = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'date'],
+                                    name='unique_occurrence_per_date'),
+        ]
+        indexes = [
+            # repetitions of the user's tasks in a date range
+            models.Index(fields=['user', 'date'],
+                         name='occurrence_user_date_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'for the task_id {self.task_id} {self.date}'
+
+
+class OccurrenceHorizon(models.Model):
+    """ The last date up to which the repetitions of the user's tasks
+    are stored as `Occurrence` models.
+    """
+    # owner of the tasks
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    # the last date of the stored repetitions
+    date = models.DateField()
+
+    def __str__(self) -> str:
+        return f'for the user_id {self.user_id} {self.date}'
+
+
+class ChangeSequence(models.Model):
+    """ The number of the last change of the user's tasks (the version
+    of the tasks as the client knows it, see `ChangeLogEntry`).
+    """
+    # owner of the tasks
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    # number of the last change
+    value = models.PositiveBigIntegerField(default=0)
+    # the entries of the changes up to this number are deleted (see
+    # `services.changelogservice.ChangeLog.prune()`)
+    pruned = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f'for the user_id {self.user_id} {self.value}'
+
+
+class ChangeLogEntry(models.Model):
+    """ A task, file or completion of the user changed (created, updated
+    or deleted) by a change with the `version` number. Only what changed
+    is recorded: the current state (or the absence) of the object is
+    read when the changes are requested (see `services.changelogservice`).
+    """
+    TASK = 'task'
+    FILE = 'file'
+    COMPLETION = 'completion'
+    KIND_CHOICES = [
+        (TASK, 'task'),
+        (FILE, 'file'),
+        (COMPLETION, 'completion'),
+    ]
+
+    # owner of the changed object
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # number of the change (from the ChangeSequence of the user)
+    version = models.PositiveBigIntegerField()
+    # what is changed
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # id of the task or of the file, or id of the task of the completion
+    # (not a foreign key, as the object may be deleted)
+    object_id = models.IntegerField()
+    # the day of the completion
+    day = models.DateField(null=True)
+
+    class Meta:
+        indexes = [
+            # changes of the user after a version
+            models.Index(fields=['user', 'version'],
+                         name='changelog_user_version_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.kind} {self.object_id} for the user_id {self.user_id}'
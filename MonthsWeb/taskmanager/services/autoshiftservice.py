@@ -0,0 +1,127 @@
+import datetime
+import time
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Exists, OuterRef, QuerySet
+from django.utils import timezone
+
+from ..models import Completion, Task
+from .changelogservice import ChangeLog
+from .dateservice import DatesHandler
+
+
+class AutoshiftHandler:
+    """ Shifts the tasks with `autoshift=True` which were not completed
+    before the given day to that day. The tasks are processed in batches
+    of consecutive ids, so that neither a single statement nor a single
+    transaction has to cover all the tasks in the table.
+    """
+
+    # prefix of the cache keys of the per-user "last shifted" markers
+    marker_prefix = 'taskmanager:autoshift'
+
+    #                               ***
+    #                              public
+
+    @staticmethod
+    def get_shiftable(today: datetime.datetime,
+                      user_ids: Optional[Iterable[int]] = None) -> QuerySet:
+        """ Returns a queryset of the tasks with autoshift which are
+        dated before the day of `today` and have no completion before
+        that day (of all users or of the users with `user_ids`).
+        """
+        today_start, _ = DatesHandler.day_bounds(today)
+        completed = Completion.objects\
+            .filter(related_task=OuterRef('pk'),
+                    date_completed__lt=today_start)
+
+        tasks = Task.objects\
+            .filter(autoshift=True, init_date__lt=today_start)\
+            .exclude(Exists(completed))
+        if user_ids is not None:
+            tasks = tasks.filter(user_id__in=user_ids)
+
+        return tasks
+
+    @classmethod
+    def iter_batches(cls, today: datetime.datetime,
+                     user_ids: Optional[Iterable[int]] = None,
+                     batch_size: int = 1000,
+                     dry_run: bool = False) -> Iterator['AutoshiftBatch']:
+        """ Shifts the tasks returned by `get_shiftable()` to `today`
+        batch by batch (each one in its own transaction) and yields an
+        `AutoshiftBatch` for each of them. If `dry_run` is True, the
+        tasks are only counted.
+        """
+        if user_ids is not None:
+            user_ids = list(user_ids)
+        last_id = 0
+        while True:
+            started = time.perf_counter()
+            batch = list(cls.get_shiftable(today, user_ids)
+                         .filter(id__gt=last_id)
+                         .order_by('id')
+                         .values_list('id', 'user_id', 'init_date')
+                         [:batch_size])
+            if not batch:
+                return
+            task_ids = [task_id for task_id, _, _ in batch]
+            last_id = task_ids[-1]
+
+            if dry_run:
+                shifted = len(batch)
+            else:
+                with transaction.atomic():
+                    # checked again (and locked), as the tasks may have
+                    # been completed after they were selected
+                    shiftable = list(cls.get_shiftable(today, user_ids)
+                                     .select_for_update()
+                                     .filter(id__in=task_ids)
+                                     .values_list('id', 'user_id'))
+                    shifted = Task.objects\
+                        .filter(id__in=[task_id for task_id, _ in shiftable])\
+                        .update(init_date=today, updated_at=timezone.now())
+
+                    tasks_by_user = {}
+                    for task_id, user_id in shiftable:
+                        tasks_by_user.setdefault(user_id, []).append(task_id)
+                    for user_id, user_task_ids in tasks_by_user.items():
+                        ChangeLog.record(user_id, tasks=user_task_ids)
+
+            yield AutoshiftBatch(task_ids[0], last_id, shifted,
+                                 time.perf_counter() - started)
+
+    @classmethod
+    def shift_lazily(cls, user_id: int,
+                     now: Optional[datetime.datetime] = None
+                     ) -> Optional[int]:
+        """ Shifts the tasks of the user to the beginning of the current
+        day, unless it is already done today: a "last shifted" marker of
+        the user is kept in the cache until the end of the day. Returns
+        the number of the shifted tasks or `None` if it was skipped.
+        """
+        now = now or timezone.now()
+        today, tomorrow = DatesHandler.day_bounds(now)
+        cache = caches[settings.TASKMANAGER_MONTH_PACK_CACHE]
+        marker_key = f'{cls.marker_prefix}:{user_id}'
+        if cache.get(marker_key) == today.date():
+            return None
+
+        shifted = sum(batch.shifted for batch
+                      in cls.iter_batches(today, user_ids=[user_id]))
+        cache.set(marker_key, today.date(),
+                  max((tomorrow - now).total_seconds(), 1))
+        return shifted
+
+
+class AutoshiftBatch(NamedTuple):
+    """ The result of shifting a batch of tasks."""
+    first_id: int
+    last_id: int
+    # number of the shifted tasks (or of the ones to shift for a dry run)
+    shifted: int
+    # time taken by the batch
+    seconds: float
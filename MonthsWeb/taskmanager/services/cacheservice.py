@@ -0,0 +1,59 @@
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .timingservice import timed_stage
+
+
+class MonthPackCache:
+    """ Keeps the lists of tasks generated for a month of a particular
+    user (month packs) in the Django cache, keyed by (user, version,
+    year, month).
+
+    The version is the number of the last change of the user's tasks
+    (see `ChangeLog.get_version()`), which is kept in the database and
+    incremented by every write, so a write makes the packs of the older
+    versions unreachable in every process at once (they are not deleted,
+    but expire). The version must be read before the tasks of a pack are
+    retrieved: then a pack is never older than the version it is cached
+    with, even if a write is committed while the pack is made.
+    """
+
+    key_prefix = 'taskmanager:monthpack'
+
+    #                               ***
+    #                              public
+
+    @classmethod
+    @timed_stage('cache.get')
+    def get(cls, user_id: int, version: int, year: int,
+            month: int) -> Optional[list]:
+        """ Returns the month pack cached for the version of the user's
+        tasks or `None` if there is none.
+        """
+        return cls._cache().get(cls._month_key(user_id, version, year,
+                                               month))
+
+    @classmethod
+    @timed_stage('cache.set')
+    def set(cls, user_id: int, version: int, year: int, month: int,
+            task_dicts: list) -> None:
+        """ Puts the month pack made for the version of the user's tasks
+        in the cache.
+        """
+        cls._cache().set(cls._month_key(user_id, version, year, month),
+                         task_dicts,
+                         settings.TASKMANAGER_MONTH_PACK_CACHE_TIMEOUT)
+
+    #                               ***
+    #                              other
+
+    @staticmethod
+    def _cache():
+        return caches[settings.TASKMANAGER_MONTH_PACK_CACHE]
+
+    @classmethod
+    def _month_key(cls, user_id: int, version: int, year: int,
+                   month: int) -> str:
+        return f'{cls.key_prefix}:{user_id}:{version}:{year}-{month}'
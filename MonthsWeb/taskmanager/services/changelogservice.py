@@ -0,0 +1,221 @@
+import functools
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from ..models import ChangeLogEntry, ChangeSequence, Completion, File, Task
+from .occurrenceservice import TASK_FIELDS
+from .pushservice import get_broker
+
+
+class ChangeLog:
+    """ Records which tasks, files and completions of a user are changed
+    by the writes of `DatabaseHandler`, numbered by a per-user sequence
+    (version), so that a client knowing the tasks as of a version can get
+    only the changes made after it. The new versions are published to
+    the user's connected clients (see `pushservice`).
+
+    The version is incremented by an update of the `ChangeSequence` row
+    of the user, which stays locked until the transaction of the write
+    is committed, so the changes of a user are committed in the order of
+    their versions and a client never skips a change.
+
+    The entries of the old versions are deleted by `prune()`; a client
+    knowing a version older than them is told to load the tasks anew.
+    """
+
+    #                               ***
+    #                              public
+
+    @staticmethod
+    def get_version(user_id: int) -> int:
+        """ Returns the version of the user's tasks (0 if nothing has
+        been recorded yet).
+        """
+        return ChangeSequence.objects\
+            .values_list('value', flat=True)\
+            .filter(user_id=user_id)\
+            .first() or 0
+
+    @classmethod
+    def record(cls, user_id: int, tasks: Iterable[int] = (),
+               files: Iterable[int] = (),
+               completions: Iterable[tuple] = ()) -> Optional[int]:
+        """ Records a change of the user's `tasks` (ids of the created,
+        updated or deleted tasks, including the ones whose files are
+        added), deleted `files` (ids) and `completions` ((task id, day)
+        of the checked or unchecked tasks). Should be called in the
+        transaction of the write. Returns the new version or `None` if
+        there is nothing to record.
+        """
+        entries = [
+            *(ChangeLogEntry(kind=ChangeLogEntry.TASK, object_id=task_id)
+              for task_id in set(tasks)),
+            *(ChangeLogEntry(kind=ChangeLogEntry.FILE, object_id=file_id)
+              for file_id in set(files)),
+            *(ChangeLogEntry(kind=ChangeLogEntry.COMPLETION,
+                             object_id=task_id, day=day)
+              for task_id, day in set(completions)),
+        ]
+        if not entries:
+            return None
+
+        with transaction.atomic(savepoint=False):
+            version = cls._next_version(user_id)
+            for entry in entries:
+                entry.user_id = user_id
+                entry.version = version
+            ChangeLogEntry.objects.bulk_create(entries, batch_size=1000)
+            # the connected clients of the user are told about the change
+            # once it is visible to them
+            transaction.on_commit(functools.partial(
+                get_broker().publish, user_id, {'version': version}))
+        return version
+
+    @classmethod
+    def get_changes(cls, user_id: int, since: int) -> dict:
+        """ Returns the changes of the user's tasks after the version
+        `since` as a dict:
+
+        1) ['version'] the current version (to ask for the next changes);
+        2) ['reset'] True if the changes can not be given (there are more
+           than TASKMANAGER_MAX_CHANGES of them, they are pruned or
+           `since` is unknown), then the client should load the tasks
+           anew;
+        3) ['tasks'], ['files'], ['completions'] the current state of the
+           changed objects (the files of every changed task are given);
+        4) ['deleted'] a dict of the ['tasks'] and ['files'] ids and of
+           the ['completions'] ({'related_task_id', 'day'}) deleted.
+        """
+        version = cls.get_version(user_id)
+        changes = {
+            'version': version,
+            'reset': False,
+            'tasks': [],
+            'files': [],
+            'completions': [],
+            'deleted': {'tasks': [], 'files': [], 'completions': []},
+        }
+        if since == version:
+            return changes
+
+        max_changes = settings.TASKMANAGER_MAX_CHANGES
+        entries = list(ChangeLogEntry.objects
+                       .values_list('kind', 'object_id', 'day')
+                       .filter(user_id=user_id, version__gt=since,
+                               version__lte=version)
+                       [:max_changes + 1])
+        # read after the entries, so that a prune committed in between
+        # is noticed
+        pruned = ChangeSequence.objects\
+            .values_list('pruned', flat=True)\
+            .filter(user_id=user_id)\
+            .first() or 0
+        if (since > version or since < pruned
+                or len(entries) > max_changes):
+            changes['reset'] = True
+            return changes
+
+        task_ids = set()
+        file_ids = set()
+        completion_keys = set()
+        for kind, object_id, day in entries:
+            if kind == ChangeLogEntry.TASK:
+                task_ids.add(object_id)
+            elif kind == ChangeLogEntry.FILE:
+                file_ids.add(object_id)
+            else:
+                completion_keys.add((object_id, day))
+
+        cls._add_tasks(changes, user_id, task_ids)
+        cls._add_deleted_files(changes, file_ids)
+        cls._add_completions(changes, user_id, completion_keys)
+        return changes
+
+    @staticmethod
+    def prune(user_id: int, keep: int) -> int:
+        """ Deletes the entries of the user's changes except the ones of
+        the latest `keep` versions. Returns the number of the deleted
+        entries.
+        """
+        with transaction.atomic():
+            sequence = ChangeSequence.objects\
+                .select_for_update()\
+                .filter(user_id=user_id)\
+                .first()
+            if sequence is None or sequence.value - keep <= sequence.pruned:
+                return 0
+            sequence.pruned = sequence.value - keep
+            sequence.save(update_fields=['pruned'])
+            deleted, _ = ChangeLogEntry.objects\
+                .filter(user_id=user_id, version__lte=sequence.pruned)\
+                .delete()
+        return deleted
+
+    #                               ***
+    #                              other
+
+    @staticmethod
+    def _next_version(user_id: int) -> int:
+        """ Increments the sequence of the user (the row stays locked
+        until the end of the transaction) and returns its value.
+        """
+        sequence = ChangeSequence.objects.filter(user_id=user_id)
+        if not sequence.update(value=F('value') + 1):
+            ChangeSequence.objects.get_or_create(user_id=user_id)
+            sequence.update(value=F('value') + 1)
+        return sequence.values_list('value', flat=True).get()
+
+    @staticmethod
+    def _add_tasks(changes: dict, user_id: int, task_ids: set) -> None:
+        if not task_ids:
+            return
+        tasks = list(Task.objects
+                     .values(*TASK_FIELDS)
+                     .filter(user_id=user_id, id__in=task_ids)
+                     .order_by('id'))
+        existing_ids = {task['id'] for task in tasks}
+        changes['tasks'] = tasks
+        changes['files'] = list(File.objects
+                                .values('id', 'link', 'related_task_id')
+                                .filter(related_task_id__in=existing_ids)
+                                .order_by('id'))
+        changes['deleted']['tasks'] = sorted(task_ids - existing_ids)
+
+    @staticmethod
+    def _add_deleted_files(changes: dict, file_ids: set) -> None:
+        if not file_ids:
+            return
+        existing_ids = set(File.objects
+                           .values_list('id', flat=True)
+                           .filter(id__in=file_ids))
+        changes['deleted']['files'] = sorted(file_ids - existing_ids)
+
+    @staticmethod
+    def _add_completions(changes: dict, user_id: int,
+                         completion_keys: set) -> None:
+        # the completions of the deleted tasks go with the tasks
+        completion_keys = {
+            (task_id, day) for task_id, day in completion_keys
+            if task_id not in changes['deleted']['tasks']}
+        if not completion_keys:
+            return
+        completions = Completion.objects\
+            .values('id', 'date_completed', 'day', 'related_task_id')\
+            .filter(related_task__user_id=user_id,
+                    related_task_id__in={task_id for task_id, _
+                                         in completion_keys},
+                    day__in={day for _, day in completion_keys})\
+            .order_by('id')
+
+        existing_keys = set()
+        for completion in completions:
+            key = (completion['related_task_id'], completion['day'])
+            if key in completion_keys:
+                existing_keys.add(key)
+                changes['completions'].append(completion)
+        changes['deleted']['completions'] = [
+            {'related_task_id': task_id, 'day': day}
+            for task_id, day in sorted(completion_keys - existing_keys)]
@@ -1,8 +1,11 @@
-import calendar
 import datetime
+import functools
 import pytz
 from django.utils import timezone
-from typing import Union
+from typing import NamedTuple, Union
+
+
+UTC = pytz.timezone('Etc/GMT+0')
 
 
 class DatesHandler:
@@ -20,6 +23,29 @@ class DatesHandler:
         else:
             return False
 
+    @staticmethod
+    def day_bounds(date: Union[datetime.date, datetime.datetime]) -> tuple:
+        """ Returns a tuple of aware datetimes: the beginning of the day
+        of the `date` and the beginning of the next day (in the current
+        time zone, like the `__date` lookup of Django).
+
+        Unlike `__date`, a range lookup between them can use the indexes
+        of a datetime column.
+        """
+        if isinstance(date, datetime.datetime):
+            if timezone.is_aware(date):
+                date = timezone.localtime(date)
+            date = date.date()
+        next_date = date + datetime.timedelta(days=1)
+
+        return (
+            timezone.make_aware(
+                datetime.datetime(date.year, date.month, date.day)),
+            timezone.make_aware(
+                datetime.datetime(next_date.year, next_date.month,
+                                  next_date.day)),
+        )
+
     @staticmethod
     def generate_month_dates(date: Union[str, datetime.datetime], 
                              as_objects: bool = False) -> list:
@@ -50,67 +76,72 @@ class DatesHandler:
          ...                          
          "2020-03-09T00:00:00+00:00" ]
         """
-        # input types checking
-        try:
-            if isinstance(date, str):
-                date = timezone.datetime.fromisoformat(date)
-            elif (isinstance(date, datetime.datetime) or
-                  isinstance(date, datetime.date)):
-                pass
-        except TypeError as err:
-            raise err('argument should be a date string in ISOformat ',
-                      '(e.g. "2022-05-06T00:00:00+00:00") or ',
-                      'datetime.datetime/datetime.date object')
-
-        # initialize calendar and make list of dates of the given month
-        # and extra-days to make 6 full weeks of this month.
-        c = calendar.Calendar()
-        datetimes_gen = c.itermonthdates(date.year, date.month)
-        monthdates = [i for i in datetimes_gen]
-        last_date = monthdates[-1]
-        # adds more one (two) week from next month in order to
-        # prevent empty space on calendar widget bottom
-        if len(monthdates) < 42:
-            if date.month == 12:
-                month = 1
-                year = date.year + 1
-            else:
-                month = date.month + 1
-                year = date.year
-
-            next_datetimes_gen = c.itermonthdates(year, month)
-            next_monthdates = [i for i in next_datetimes_gen]
-
-            # the last date doesn't come up on the middle of the week,
-            # therefore need to add second week from the next week
-            if date.month != last_date.month:
-                extra_days = next_monthdates[7:14]
-            # the last date come up on the last day of the week
-            elif date.month == last_date.month:
-                # if it's February, that begins on Monday and ends on Sunday
-                # it'll contain only 28 dates and demands two additional weeks
-                if len(monthdates) == 28:
-                    extra_days = next_monthdates[0:14]
-                # last date come up on the middle of the week
-                # and it already completed by Calendar module.
-                # Needs 2d week from the next month.
-                else:
-                    extra_days = next_monthdates[0:7]
-            else:
-                raise ValueError('unexpected situation while adding extra days ',
-                                 'from next month to pageDaysArr')
-            monthdates += extra_days
-
-        # list of datetime.date to django.utils.timezone() with timezone +00:00
-        aware_datetimes_list = [
-            timezone.make_aware(
-                value=datetime.datetime(date.year, date.month, date.day),
-                timezone=pytz.timezone('Etc/GMT+0')
-            )
-            for date in monthdates
-        ]
-        
+        grid = DatesHandler.month_grid(date)
         if as_objects:
-            return aware_datetimes_list
+            return list(grid.dates)
         else:
-            return [dt.isoformat() for dt in aware_datetimes_list]
\ No newline at end of file
+            return list(grid.isoformats)
+
+    @staticmethod
+    def month_grid(date: Union[str, datetime.date]) -> 'MonthGrid':
+        """ Takes a date-string in ISOformat or `datetime` object and
+        returns the `MonthGrid` of its month: the 42 dates of the
+        calendar page (see `generate_month_dates()`) as tuples of aware
+        datetimes and of their ISOstrings.
+
+        The grids are computed once per (year, month) and shared, so
+        they must not be mutated (tuples and datetimes are immutable).
+        """
+        # input types checking
+        if isinstance(date, str):
+            date = timezone.datetime.fromisoformat(date)
+        elif not isinstance(date, datetime.date):
+            raise TypeError('argument should be a date string in ISOformat '
+                            '(e.g. "2022-05-06T00:00:00+00:00") or '
+                            'datetime.datetime/datetime.date object')
+
+        return DatesHandler._month_grid(date.year, date.month)
+
+    @staticmethod
+    def month_grids(date: Union[str, datetime.date], before: int = 0,
+                    after: int = 0) -> list:
+        """ Returns the `MonthGrid`s of the consecutive months: `before`
+        months preceding the month of the `date`, the month itself and
+        `after` months following it.
+        """
+        grid = DatesHandler.month_grid(date)
+        month_index = grid.year * 12 + grid.month - 1
+
+        return [
+            DatesHandler._month_grid(index // 12, index % 12 + 1)
+            for index in range(month_index - before, month_index + after + 1)
+        ]
+
+    @staticmethod
+    @functools.lru_cache(maxsize=240)
+    def _month_grid(year: int, month: int) -> 'MonthGrid':
+        """ Makes the `MonthGrid` of the month: 6 full weeks beginning
+        with the Monday of the week that contains the 1st day.
+        """
+        first_day = datetime.date(year, month, 1)
+        first_monday = first_day - datetime.timedelta(days=first_day.weekday())
+
+        dates = tuple(
+            datetime.datetime(first_monday.year, first_monday.month,
+                              first_monday.day, tzinfo=UTC)
+            + datetime.timedelta(days=i)
+            for i in range(42)
+        )
+        isoformats = tuple(dt.isoformat() for dt in dates)
+
+        return MonthGrid(year, month, dates, isoformats)
+
+
+class MonthGrid(NamedTuple):
+    """ The dates of a calendar page of the month."""
+    year: int
+    month: int
+    # aware datetimes (00:00:00+00:00) of the 42 days of the page
+    dates: tuple
+    # the same dates as ISOstrings
+    isoformats: tuple
@@ -1,7 +1,19 @@
-from ..models import Task, File, Completion
-from datetime import datetime
+from ..models import Task, File, Completion, Occurrence
+from .autoshiftservice import AutoshiftHandler
+from .changelogservice import ChangeLog
+from .dateservice import DatesHandler
+from .occurrenceservice import TASK_FIELDS, OccurrenceHandler
+from .timingservice import timed_stage
+import asyncio
+from asgiref.sync import sync_to_async
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Prefetch, Q, QuerySet
 from django.utils import timezone
 from django.contrib.auth.models import User
+from typing import Optional
 
 
 class DatabaseHandler:
@@ -10,6 +22,7 @@ class DatabaseHandler:
     """
     
     @staticmethod
+    @timed_stage('db.get_tasks_by_timerange')
     def get_tasks_by_timerange(date_range: tuple, user: User) -> list:
         """Retrieve from database all `models.Task` in given time range
         (related models `Completion` and `File` are not touched). 
@@ -21,11 +34,13 @@ class DatabaseHandler:
                     'description',
                     'interval',
                     'autoshift')\
-            .filter(init_date__range=date_range, user=user)
+            .filter(init_date__range=date_range, user=user)\
+            .order_by('id')
 
         return list(retrieved_values)
 
     @staticmethod
+    @timed_stage('db.get_intervalled_tasks')
     def get_intervalled_tasks(date_range: tuple, user: User) -> list:
         """ 1. Takes a tuple of two `datetime` objects, where the first
         is the beginning- and the second is the end- of the time period
@@ -42,18 +57,25 @@ class DatabaseHandler:
                     'interval',
                     'autoshift')\
             .filter(init_date__lt=date_until, user=user)\
-            .exclude(interval='no')
+            .exclude(interval='no')\
+            .order_by('id')
 
         return list(retrieved_values)
 
     @staticmethod
-    def get_additional_fields(task_id_list: list) -> dict:
+    @timed_stage('db.get_additional_fields')
+    def get_additional_fields(task_id_list: list,
+                              date_range: tuple = None) -> dict:
         """ Takes a list of models.Task id-s - returns the dict of
         two keys:
 
         1) ['files'] (list of attached files);
         2) ['completions'] (`datetime.datetime`s when the task was
            marked as completed). 
+
+        If `date_range` (a tuple of the first and the last `datetime`
+        of a period) is given, only the completions within the days of
+        the period are retrieved instead of the whole history.
         """
         files = File.objects\
             .values('id', 'link', 'related_task_id')\
@@ -61,7 +83,13 @@ class DatabaseHandler:
         completions = Completion.objects\
             .values('id', 'date_completed', 'related_task_id')\
             .filter(related_task_id__in=task_id_list)
-            
+        if date_range is not None:
+            completed_from, completed_until = \
+                DatabaseHandler._completions_window(date_range)
+            completions = completions.filter(
+                date_completed__gte=completed_from,
+                date_completed__lt=completed_until)
+
         additional_fields = {
             'files': list(files),
             'completions': list(completions)
@@ -69,6 +97,200 @@ class DatabaseHandler:
         return additional_fields
 
     @staticmethod
+    @timed_stage('db.get_month_pack')
+    def get_month_pack(date_range: tuple, user: User) -> dict:
+        """ Retrieves at once everything required to make the list of
+        tasks for the dates in `date_range` (a tuple of the first and the
+        last `datetime` of the period). Returns a dict of four keys:
+
+        1) ['tasks_by_timerange'] (as `get_tasks_by_timerange()`);
+        2) ['intervalled_tasks'] (as `get_intervalled_tasks()`);
+        3) ['files'] attached to those tasks;
+        4) ['completions'] of those tasks, but only the ones that fall
+           within the dates of `date_range`.
+
+        If the repetitions are stored (see `OccurrenceHandler.cover()`),
+        there is a fifth key ['repetitions'] (as `get_occurrences()`)
+        instead of the tasks with interval: only the ones that repeat on
+        the dates are retrieved then, and ['intervalled_tasks'] is empty.
+
+        Tasks are fetched with one query (tasks of both kinds), the
+        files, the completions (and the stored repetitions) with one
+        query each.
+        """
+        date_from, date_until = date_range
+        completed_from, completed_until = \
+            DatabaseHandler._completions_window(date_range)
+        stored = (OccurrenceHandler.is_enabled() and
+                  OccurrenceHandler.cover(user.id, date_until.date()))
+
+        tasks = DatabaseHandler._month_tasks(date_range, user, stored)\
+            .only('id', 'init_date', 'title', 'description', 'interval',
+                  'autoshift')\
+            .prefetch_related(
+                Prefetch('file_set',
+                         queryset=File.objects
+                         .only('id', 'link', 'related_task_id')
+                         .order_by('id')),
+                Prefetch('completion_set',
+                         queryset=Completion.objects
+                         .only('id', 'date_completed', 'related_task_id')
+                         .filter(date_completed__gte=completed_from,
+                                 date_completed__lt=completed_until)
+                         .order_by('id')))\
+            .order_by('id')
+
+        month_pack = {
+            'tasks_by_timerange': [],
+            'intervalled_tasks': [],
+            'files': [],
+            'completions': []
+        }
+        task_dicts = []
+        for task in tasks:
+            task_dict = {
+                'id': task.id,
+                'init_date': task.init_date,
+                'title': task.title,
+                'description': task.description,
+                'interval': task.interval,
+                'autoshift': task.autoshift
+            }
+            task_dicts.append(task_dict)
+            if date_from <= task.init_date <= date_until:
+                month_pack['tasks_by_timerange'].append(task_dict)
+            if (not stored and task.interval != 'no' and
+                    task.init_date < date_until):
+                month_pack['intervalled_tasks'].append(dict(task_dict))
+
+            month_pack['files'] += [
+                {'id': file_.id,
+                 'link': file_.link,
+                 'related_task_id': file_.related_task_id}
+                for file_ in task.file_set.all()
+            ]
+            month_pack['completions'] += [
+                {'id': completion.id,
+                 'date_completed': completion.date_completed,
+                 'related_task_id': completion.related_task_id}
+                for completion in task.completion_set.all()
+            ]
+
+        if stored:
+            month_pack['repetitions'] = DatabaseHandler._repetitions(
+                date_range,
+                DatabaseHandler._month_occurrences(date_range, user),
+                task_dicts)
+
+        return month_pack
+
+    @staticmethod
+    @timed_stage('db.aget_month_pack')
+    async def aget_month_pack(date_range: tuple, user: User) -> dict:
+        """ The same as `get_month_pack()` for the async views. The
+        tasks, their files, their completions (and the stored
+        repetitions) are retrieved by independent queries, which run
+        concurrently, each in its own thread and database connection,
+        if the setting TASKMANAGER_CONCURRENT_QUERIES is on (otherwise
+        one by one in the thread of the sync code).
+        """
+        date_from, date_until = date_range
+        completed_from, completed_until = \
+            DatabaseHandler._completions_window(date_range)
+        # stored before the queries, which select the repeated tasks by
+        # their stored repetitions
+        stored = (OccurrenceHandler.is_enabled() and
+                  await DatabaseHandler._run_query(
+                      lambda: OccurrenceHandler.cover(user.id,
+                                                      date_until.date())))
+        tasks = DatabaseHandler._month_tasks(date_range, user, stored)
+
+        queries = [
+            lambda: list(tasks
+                         .values('id', 'init_date', 'title', 'description',
+                                 'interval', 'autoshift')
+                         .order_by('id')),
+            lambda: list(File.objects
+                         .values('id', 'link', 'related_task_id')
+                         .filter(related_task__in=tasks.values('id'))
+                         .order_by('related_task_id', 'id')),
+            lambda: list(Completion.objects
+                         .values('id', 'date_completed', 'related_task_id')
+                         .filter(related_task__in=tasks.values('id'),
+                                 date_completed__gte=completed_from,
+                                 date_completed__lt=completed_until)
+                         .order_by('related_task_id', 'id')),
+        ]
+        if stored:
+            queries.append(
+                lambda: list(DatabaseHandler._month_occurrences(date_range,
+                                                                user)))
+        if settings.TASKMANAGER_CONCURRENT_QUERIES:
+            results = await asyncio.gather(
+                *(DatabaseHandler._run_query(query) for query in queries))
+        else:
+            # the thread of the sync code is not found from the tasks of
+            # gather(), so they are awaited one by one
+            results = [await DatabaseHandler._run_query(query)
+                       for query in queries]
+        task_dicts, files, completions, *repetitions = results
+
+        month_pack = {
+            'tasks_by_timerange': [],
+            'intervalled_tasks': [],
+            'files': files,
+            'completions': completions
+        }
+        for task_dict in task_dicts:
+            if date_from <= task_dict['init_date'] <= date_until:
+                month_pack['tasks_by_timerange'].append(task_dict)
+            if (not stored and task_dict['interval'] != 'no' and
+                    task_dict['init_date'] < date_until):
+                month_pack['intervalled_tasks'].append(dict(task_dict))
+        if stored:
+            month_pack['repetitions'] = DatabaseHandler._repetitions(
+                date_range, repetitions[0], task_dicts)
+
+        return month_pack
+
+    @staticmethod
+    @timed_stage('db.get_occurrences')
+    def get_occurrences(date_range: tuple, user: User) -> Optional[list]:
+        """ Returns the repetitions of the user's tasks with interval on
+        the dates of `date_range` as a list of dicts (like
+        `RepeatingTasksGenerator.generate()`) from the stored
+        `models.Occurrence` (stored first if they are not yet, see
+        `OccurrenceHandler.cover()`), or `None` if the range is too far
+        ahead to store them (then they are to be computed).
+        """
+        date_from, date_until = date_range
+        if not OccurrenceHandler.cover(user.id, date_until.date()):
+            return None
+
+        occurrences = Occurrence.objects\
+            .select_related('task')\
+            .only(*(f'task__{field}' for field in (
+                      'id', 'init_date', 'title', 'description', 'interval',
+                      'autoshift')),
+                  'date')\
+            .filter(user=user, date__range=(date_from.date(),
+                                            date_until.date()))\
+            .order_by('date', 'task_id')
+
+        return [
+            {'id': occurrence.task.id,
+             'init_date': occurrence.task.init_date,
+             'title': occurrence.task.title,
+             'description': occurrence.task.description,
+             'interval': occurrence.task.interval,
+             'autoshift': occurrence.task.autoshift,
+             'date': datetime.combine(occurrence.date, time(),
+                                      tzinfo=date_from.tzinfo)}
+            for occurrence in occurrences
+        ]
+
+    @staticmethod
+    @timed_stage('db.create_task_and_related')
     def create_task_and_related(task_and_related: dict, user: User) -> None:
         """Takes a dict where the keys are the fields of
         `models.Task` and related models `File`, `Completion`,
@@ -77,24 +299,32 @@ class DatabaseHandler:
         # ISOstring to datetime object
         task_creation_date = timezone.datetime.fromisoformat(
                 task_and_related['init_date'])
-        # insert Task
-        created_task = Task.objects.create(
-                init_date=task_creation_date,
-                title=task_and_related['title'],
-                description=task_and_related['description'],
-                interval=task_and_related['interval'],
-                autoshift=task_and_related['autoshift'],
-                user=user
-        )
-        # create attached File models
-        try:
-            for file_ in task_and_related['files']:
-                File.objects.create(related_task=created_task,
-                                    link=file_['link'])
-        except KeyError:
-            pass
+        with transaction.atomic():
+            # insert Task
+            created_task = Task.objects.create(
+                    init_date=task_creation_date,
+                    title=task_and_related['title'],
+                    description=task_and_related['description'],
+                    interval=task_and_related['interval'],
+                    autoshift=task_and_related['autoshift'],
+                    user=user
+            )
+            # create attached File models
+            try:
+                for file_ in task_and_related['files']:
+                    File.objects.create(related_task=created_task,
+                                        link=file_['link'])
+            except KeyError:
+                pass
+
+            if OccurrenceHandler.is_enabled() and \
+                    created_task.interval != 'no':
+                OccurrenceHandler.store_task(created_task.id, user.id)
+
+            ChangeLog.record(user.id, tasks=[created_task.id])
 
     @staticmethod
+    @timed_stage('db.update_task_and_related')
     def update_task_and_related(task_and_related: dict, user: User) -> None:
         """ Takes a dict of all fields of the Task and updates this
         model by id (with related models File and Comletion).
@@ -117,14 +347,142 @@ class DatabaseHandler:
             updated_dict['init_date'] = timezone.datetime\
                 .fromisoformat(task_and_related['init_date'])
 
-        # Update fields
-        Task.objects\
-            .filter(id=task_and_related['id'], user=user)\
-            .update(**updated_dict)
+        with transaction.atomic():
+            # Update fields
+            updated = Task.objects\
+                .filter(id=task_and_related['id'], user=user)\
+                .update(**updated_dict, updated_at=timezone.now())
+
+            if updated:
+                if OccurrenceHandler.is_enabled():
+                    OccurrenceHandler.store_task(task_and_related['id'],
+                                                 user.id)
+                ChangeLog.record(user.id, tasks=[task_and_related['id']])
 
         # TODO: attached files
 
     @staticmethod
+    @timed_stage('db.create_tasks_and_related')
+    def create_tasks_and_related(task_dicts: list, user: User) -> list:
+        """ Takes a list of dicts of the tasks with related files (as
+        `create_task_and_related()` does) and inserts the valid ones into
+        database in one transaction, with `bulk_create()` for the tasks
+        and for the files.
+        Returns a list of results in the order of `task_dicts`: either
+        {'id': <id of the created task>} or {'errors': {<field>: [...]}}
+        for a dict which was not valid (and was skipped).
+        """
+        results = []
+        created_tasks = []
+        links_by_task = []
+        for task_dict in task_dicts:
+            task = Task(user=user)
+            errors = DatabaseHandler._clean_task(task, task_dict)
+            links, files_errors = DatabaseHandler._clean_links(task_dict)
+            if files_errors:
+                errors['files'] = files_errors
+            if errors:
+                results.append({'errors': errors})
+                continue
+            results.append(task)
+            created_tasks.append(task)
+            links_by_task.append(links)
+
+        with transaction.atomic():
+            DatabaseHandler._insert_tasks(created_tasks)
+            # the ids of the tasks are known after the insert
+            File.objects.bulk_create(
+                [File(related_task_id=task.id, link=link)
+                 for task, links in zip(created_tasks, links_by_task)
+                 for link in links],
+                batch_size=1000)
+
+            if OccurrenceHandler.is_enabled():
+                OccurrenceHandler.store_tasks(
+                    [task.id for task in created_tasks
+                     if task.interval != 'no'],
+                    user.id)
+
+            ChangeLog.record(user.id,
+                             tasks=[task.id for task in created_tasks])
+
+        return [{'id': result.id} if isinstance(result, Task) else result
+                for result in results]
+
+    @staticmethod
+    @timed_stage('db.update_tasks_and_related')
+    def update_tasks_and_related(task_dicts: list, user: User) -> list:
+        """ Takes a list of dicts with ['id'] of the user's tasks and the
+        fields to change (all of them are optional) and updates the
+        valid ones in one transaction, with `bulk_update()`. If a dict
+        has ['files'], the files of the task are replaced with them.
+        Returns a list of results in the order of `task_dicts` (see
+        `create_tasks_and_related()`).
+        """
+        task_ids = [task_dict.get('id') for task_dict in task_dicts
+                    if isinstance(task_dict, dict)]
+        tasks_by_id = Task.objects\
+            .filter(user=user)\
+            .in_bulk([task_id for task_id in task_ids
+                      if isinstance(task_id, int)])
+
+        results = []
+        updated_tasks = {}
+        files_by_task = {}
+        now = timezone.now()
+        for task_dict in task_dicts:
+            task_id = task_dict.get('id') if isinstance(task_dict, dict) \
+                else None
+            task = tasks_by_id.get(task_id)
+            if task is None:
+                results.append({'errors': {'id': ['Task does not exist.']}})
+                continue
+            original_fields = {field: getattr(task, field)
+                               for field in TASK_FIELDS[1:]}
+
+            errors = DatabaseHandler._clean_task(task, task_dict)
+            if 'files' in task_dict:
+                links, files_errors = DatabaseHandler._clean_links(task_dict)
+                if files_errors:
+                    errors['files'] = files_errors
+            if errors:
+                # the changes of the instance are dropped
+                for field, value in original_fields.items():
+                    setattr(task, field, value)
+                results.append({'errors': errors})
+                continue
+
+            task.updated_at = now
+            updated_tasks[task_id] = task
+            if 'files' in task_dict:
+                files_by_task[task_id] = links
+            results.append({'id': task_id})
+
+        with transaction.atomic():
+            Task.objects.bulk_update(
+                updated_tasks.values(),
+                fields=[*TASK_FIELDS[1:], 'updated_at'],
+                batch_size=1000)
+            replaced_files = list(File.objects
+                                  .values_list('id', flat=True)
+                                  .filter(related_task_id__in=files_by_task))
+            File.objects.filter(id__in=replaced_files).delete()
+            File.objects.bulk_create(
+                [File(related_task_id=task_id, link=link)
+                 for task_id, links in files_by_task.items()
+                 for link in links],
+                batch_size=1000)
+
+            if OccurrenceHandler.is_enabled():
+                OccurrenceHandler.store_tasks(updated_tasks, user.id)
+
+            ChangeLog.record(user.id, tasks=updated_tasks,
+                             files=replaced_files)
+
+        return results
+
+    @staticmethod
+    @timed_stage('db.delete_task')
     def delete_task(task: dict, user: User) -> None:
         """ Delete a task from database (including all related
         to it via foreign key).
@@ -140,9 +498,14 @@ class DatabaseHandler:
         else:
             raise TypeError('the task argument must be type of dict or int')
 
-        Task.objects.filter(id=task_id, user=user).delete()
+        with transaction.atomic():
+            deleted, _ = Task.objects.filter(id=task_id, user=user).delete()
+
+            if deleted:
+                ChangeLog.record(user.id, tasks=[task_id])
 
     @staticmethod
+    @timed_stage('db.check_uncheck_task')
     def check_uncheck_task(task_dict: dict) -> None:
         """ Creates an entry in the "Completion" table if
         task_dict['completion'] have a value (it must be a datetime str
@@ -156,28 +519,255 @@ class DatabaseHandler:
         task_date = timezone.datetime.fromisoformat(task_dict['date'])
         if completion:
             completion = timezone.datetime.fromisoformat(completion) 
-            Completion.objects.create(
-                date_completed=completion,
-                related_task_id=task_id)
-        else:
+        with transaction.atomic():
+            if completion:
+                # nothing is inserted if the task is already completed on
+                # that day (the unique constraint on (related_task, day))
+                Completion.objects.bulk_create(
+                    [Completion(date_completed=completion,
+                                day=Completion.day_of(completion),
+                                related_task_id=task_id)],
+                    ignore_conflicts=True)
+            else:
+                day_start, day_end = DatesHandler.day_bounds(task_date)
+                try:
+                    Completion.objects.filter(
+                        date_completed__gte=day_start,
+                        date_completed__lt=day_end,
+                        related_task_id=task_id).delete()
+                except Completion.DoesNotExist:
+                    pass
+
+            # the completions are a part of the task (for the validators)
+            Task.objects.filter(id=task_id).update(updated_at=timezone.now())
+
+            user_id = Task.objects\
+                .values_list('user_id', flat=True)\
+                .filter(id=task_id)\
+                .first()
+            if user_id is not None:
+                ChangeLog.record(user_id, completions=[
+                    (task_id, Completion.day_of(completion or task_date))])
+
+    @staticmethod
+    @timed_stage('db.check_uncheck_tasks')
+    def check_uncheck_tasks(task_dicts: list, user: User) -> list:
+        """ The same as `check_uncheck_task()` for many dicts of the
+        user's tasks at once: the completions are inserted with one
+        `bulk_create()` and removed with one delete in a transaction.
+        If there are several dicts for a task and a day, the last one
+        wins.
+        Returns a list of results in the order of `task_dicts`:
+        {'id': <task id>} or {'errors': {<field>: [...]}}.
+        """
+        results = []
+        # (task id, beginning of the day) -> completion datetime or False
+        states = {}
+        for task_dict in task_dicts:
             try:
-                Completion.objects.filter(
-                    date_completed__date=task_date,
-                    related_task_id=task_id).delete()
-            except Completion.DoesNotExist:
-                pass
+                task_id = task_dict['id']
+                if not isinstance(task_id, int):
+                    raise TypeError('id must be an integer')
+                task_date = timezone.datetime.fromisoformat(task_dict['date'])
+                completion = task_dict['completion']
+                if completion:
+                    completion = timezone.datetime.fromisoformat(completion)
+            except (KeyError, TypeError, ValueError) as err:
+                results.append({'errors': {NON_FIELD_ERRORS: [str(err)]}})
+                continue
+            day_start, _ = DatesHandler.day_bounds(completion or task_date)
+            states[(task_id, day_start)] = completion
+            results.append({'id': task_id})
+
+        owned_ids = set(Task.objects
+                        .values_list('id', flat=True)
+                        .filter(user=user,
+                                id__in={task_id for task_id, _ in states}))
+        for result in results:
+            if 'id' in result and result['id'] not in owned_ids:
+                result['errors'] = {'id': ['Task does not exist.']}
+                del result['id']
+        states = {key: completion for key, completion in states.items()
+                  if key[0] in owned_ids}
+        if not states:
+            return results
+
+        checked = {key: completion for key, completion in states.items()
+                   if completion}
+        unchecked = [key for key, completion in states.items()
+                     if not completion]
+        with transaction.atomic():
+            # the days on which the tasks are already completed are
+            # skipped by the unique constraint on (related_task, day)
+            Completion.objects.bulk_create(
+                [Completion(related_task_id=task_id,
+                            date_completed=completion,
+                            day=day.date())
+                 for (task_id, day), completion in checked.items()],
+                batch_size=1000,
+                ignore_conflicts=True)
+            if unchecked:
+                days = Q()
+                for task_id, day in unchecked:
+                    days |= Q(related_task_id=task_id,
+                              date_completed__gte=day,
+                              date_completed__lt=DatesHandler.day_bounds(
+                                  day)[1])
+                Completion.objects.filter(days).delete()
+
+            Task.objects\
+                .filter(id__in={task_id for task_id, _ in states})\
+                .update(updated_at=timezone.now())
+
+            ChangeLog.record(user.id, completions=[
+                (task_id, day.date()) for task_id, day in states])
+
+        return results
 
     @staticmethod
-    def shift_tasks(today: datetime) -> None:
+    @timed_stage('db.shift_tasks', rows=lambda shifted: shifted)
+    def shift_tasks(today: datetime, user: User = None,
+                    batch_size: int = 1000) -> int:
         """Changes the date of the uncompleted tasks with
         `Autoshift=True` to the given date (shifts them to
-        today if they doesn't completed yet)
-        """
-        nested_query = Completion.objects.values_list('id', flat=True)\
-            .filter(date_completed__date__lt=today.date())
-        Task.objects\
-            .prefetch_related('completion')\
-            .filter(init_date__date__lt=today.date())\
-            .exclude(autoshift=False)\
-            .exclude(id__in=nested_query)\
-            .update(init_date=today)
+        today if they doesn't completed yet). Only the tasks of the
+        `user` are shifted if it is given. Returns the number of the
+        shifted tasks (see `AutoshiftHandler`).
+        """
+        batches = AutoshiftHandler.iter_batches(
+            today,
+            user_ids=[user.id] if user is not None else None,
+            batch_size=batch_size)
+
+        return sum(batch.shifted for batch in batches)
+
+    @staticmethod
+    def _clean_task(task: Task, task_dict) -> dict:
+        """ Sets the fields of `task` that are given in `task_dict` and
+        validates the task. Returns the validation errors by the fields
+        (an empty dict if the task is valid).
+        """
+        if not isinstance(task_dict, dict):
+            return {NON_FIELD_ERRORS: ['Task must be an object.']}
+        for field in TASK_FIELDS[1:]:
+            if field in task_dict:
+                setattr(task, field, task_dict[field])
+        try:
+            task.full_clean(exclude=['user'], validate_unique=False)
+        except ValidationError as err:
+            return err.message_dict
+        return {}
+
+    @staticmethod
+    def _clean_links(task_dict) -> tuple:
+        """ Returns a tuple of the links of the files in
+        task_dict['files'] and the list of validation errors of them.
+        """
+        if not isinstance(task_dict, dict):
+            return [], []
+        if not isinstance(task_dict.get('files') or [], list):
+            return [], ['Files must be a list.']
+        links = []
+        errors = []
+        for file_ in task_dict.get('files') or []:
+            link = file_.get('link') if isinstance(file_, dict) else None
+            try:
+                File(link=link).clean_fields(exclude=['related_task'])
+            except ValidationError as err:
+                errors += [f'{field}: {message}'
+                           for field, messages in err.message_dict.items()
+                           for message in messages]
+            else:
+                links.append(link)
+        return links, errors
+
+    @staticmethod
+    def _insert_tasks(tasks: list) -> None:
+        """ Inserts the `tasks` with `bulk_create()` if the database
+        returns the ids of the inserted rows (e.g. PostgreSQL), otherwise
+        one by one (the ids are needed for the related rows).
+        """
+        if connection.features.can_return_rows_from_bulk_insert:
+            Task.objects.bulk_create(tasks, batch_size=1000)
+        else:
+            for task in tasks:
+                task.save()
+
+    @staticmethod
+    def _month_tasks(date_range: tuple, user: User,
+                     stored: bool = False) -> QuerySet:
+        """ Returns the queryset of the user's tasks that appear on the
+        dates of `date_range`: the ones dated within it and the ones
+        with interval which begin before its end, or, if the repetitions
+        are `stored`, only the ones which repeat on the dates.
+        """
+        _, date_until = date_range
+        if stored:
+            repeated = Q(id__in=DatabaseHandler
+                         ._month_occurrences(date_range, user)
+                         .values('task_id'))
+        else:
+            repeated = Q(init_date__lt=date_until) & ~Q(interval='no')
+        return Task.objects.filter(Q(init_date__range=date_range) | repeated,
+                                   user=user)
+
+    @staticmethod
+    def _month_occurrences(date_range: tuple, user: User) -> QuerySet:
+        """ Returns the queryset of the (task id, date) tuples of the
+        stored repetitions of the user's tasks on the dates of
+        `date_range`.
+        """
+        date_from, date_until = date_range
+        return Occurrence.objects\
+            .values_list('task_id', 'date')\
+            .filter(user=user, date__range=(date_from.date(),
+                                            date_until.date()))\
+            .order_by('date', 'task_id')
+
+    @staticmethod
+    def _repetitions(date_range: tuple, occurrences: list,
+                     task_dicts: list) -> list:
+        """ Returns the repetitions as `get_occurrences()` does, made of
+        the (task id, date) tuples of `_month_occurrences()` and the
+        dicts of the tasks.
+        """
+        date_from, _ = date_range
+        tasks_by_id = {task_dict['id']: task_dict for task_dict in task_dicts}
+        return [
+            {**tasks_by_id[task_id],
+             'date': datetime.combine(date, time(), tzinfo=date_from.tzinfo)}
+            for task_id, date in occurrences
+            # stored after the tasks were retrieved
+            if task_id in tasks_by_id
+        ]
+
+    @staticmethod
+    async def _run_query(query):
+        """ Runs the callable `query` from async code: in a separate
+        thread (with its own connection) if the setting
+        TASKMANAGER_CONCURRENT_QUERIES is on, or in the thread of the
+        sync code otherwise.
+        """
+        if not settings.TASKMANAGER_CONCURRENT_QUERIES:
+            return await sync_to_async(query)()
+
+        def run_in_own_thread():
+            # the connections of the threads are not closed at the end
+            # of the request, so they are reused up to CONN_MAX_AGE
+            close_old_connections()
+            return query()
+        return await sync_to_async(run_in_own_thread,
+                                   thread_sensitive=False)()
+
+    @staticmethod
+    def _completions_window(date_range: tuple) -> tuple:
+        """ Returns the beginning of the first day of `date_range` and
+        the beginning of the day after the last one (the days are taken
+        in the time zone of the dates, as the pages of months are).
+        """
+        date_from, date_until = date_range
+        window_start = datetime.combine(date_from.date(), time(),
+                                        tzinfo=date_from.tzinfo)
+        window_end = datetime.combine(date_until.date(), time(),
+                                      tzinfo=date_until.tzinfo)
+        return window_start, window_end + timedelta(days=1)
@@ -0,0 +1,127 @@
+import datetime
+import json
+from typing import Iterable, Iterator, Union
+
+from .taskservice import TaskOccurrence
+from .timingservice import timed_stage
+
+
+class MonthPackEncoder(json.JSONEncoder):
+    """ JSON encoder that writes `datetime` objects as ISOformat strings
+    (the format of the dates in the month packs).
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class MonthPackStreamer:
+    """ Serializes a month pack (`{"dates": [...], "tasks": [...]}`) to
+    JSON piece by piece, while the task dicts are taken from an iterable,
+    so that neither a converted copy of the tasks nor the whole JSON
+    document are kept in memory.
+    """
+
+    encoder = MonthPackEncoder()
+    # approximate size (in characters) of the pieces to yield
+    chunk_size = 8192
+
+    #                               ***
+    #                              public
+
+    @classmethod
+    def iter_json(cls, dates: Iterable,
+                  tasks: Iterable[Union[dict, TaskOccurrence]]
+                  ) -> Iterator[str]:
+        """ Yields the JSON document of the month pack in pieces. The
+        output is the same as `json.dumps()` of the whole month pack
+        would give (with datetimes as ISOstrings). The tasks may be
+        dicts or `TaskOccurrence` objects (written as their `as_dict()`).
+        """
+        return cls._chunked(cls._iter_pack_pieces(dates, tasks, {}))
+
+    @classmethod
+    def iter_json_packs(cls, packs: Iterable[tuple]) -> Iterator[str]:
+        """ The same as `iter_json()`, but for several month packs, given
+        as (dates, tasks) tuples, written as
+        `{"packs": [{"dates": [...], "tasks": [...]}, ...]}`.
+        """
+        return cls._chunked(cls._iter_packs_pieces(packs))
+
+    #                               ***
+    #                              other
+
+    @classmethod
+    def _iter_packs_pieces(cls, packs: Iterable[tuple]) -> Iterator[str]:
+        # the records shared by the packs are encoded once for all of them
+        encoded_records = {}
+        yield '{"packs": ['
+        separator = ''
+        for dates, tasks in packs:
+            yield separator
+            yield from cls._iter_pack_pieces(dates, tasks, encoded_records)
+            separator = ', '
+        yield ']}'
+
+    @classmethod
+    def _iter_pack_pieces(cls, dates: Iterable,
+                          tasks: Iterable[Union[dict, TaskOccurrence]],
+                          encoded_records: dict) -> Iterator[str]:
+        """ Yields the JSON of a month pack, a task at a time.
+        `encoded_records` maps the ids of the task records (of the
+        occurrences) to their encoded fields.
+        """
+        encode = cls.encoder.encode
+        yield '{"dates": ' + encode(list(dates)) + ', "tasks": ['
+        separator = ''
+        for task in tasks:
+            if isinstance(task, dict):
+                yield separator + encode(task)
+            else:
+                yield separator + cls._encode_occurrence(task,
+                                                         encoded_records)
+            separator = ', '
+        yield ']}'
+
+    @classmethod
+    @timed_stage('json.encode')
+    def _chunked(cls, pieces: Iterable[str]) -> Iterator[str]:
+        """ Joins the pieces into the chunks of about `chunk_size`."""
+        buffer = []
+        buffered = 0
+        for piece in pieces:
+            buffer.append(piece)
+            buffered += len(piece)
+            if buffered >= cls.chunk_size:
+                yield ''.join(buffer)
+                buffer = []
+                buffered = 0
+        if buffer:
+            yield ''.join(buffer)
+
+    @classmethod
+    def _encode_occurrence(cls, occurrence: TaskOccurrence,
+                           encoded_records: dict) -> str:
+        """ Encodes a `TaskOccurrence` the same way as its `as_dict()`.
+        The fields of the task record are encoded once for all the
+        occurrences sharing it and only the date and the completion
+        are encoded for each of them.
+        """
+        encode = cls.encoder.encode
+        record = occurrence.task
+        try:
+            head, files = encoded_records[id(record)]
+        except KeyError:
+            fields = {k: v for k, v in record.items() if k != 'files'}
+            # the encoded fields without the closing brace
+            head = encode(fields)[:-1]
+            if fields:
+                head += ', '
+            files = encode(record.get('files', []))
+            encoded_records[id(record)] = head, files
+
+        return (f'{head}"date": {encode(occurrence.date)}, '
+                f'"files": {files}, '
+                f'"completion": {encode(occurrence.completion)}}}')
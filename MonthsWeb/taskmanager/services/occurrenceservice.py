@@ -0,0 +1,157 @@
+import datetime
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import Occurrence, OccurrenceHorizon, Task
+from .taskservice import RepeatingTasksGenerator
+
+
+TASK_FIELDS = ('id', 'init_date', 'title', 'description', 'interval',
+               'autoshift')
+
+
+class OccurrenceHandler:
+    """ Stores the repetitions of the tasks with interval as `Occurrence`
+    models ahead of time (up to the `OccurrenceHorizon` of the user), so
+    that the months are served with a range query instead of computing
+    the repetitions on every request.
+
+    The horizon is moved forward lazily, by the requests of the months
+    beyond it (see `cover()`), and by the "rebuild_occurrences" command.
+    The repetitions of the months too far ahead of today are computed as
+    without storing.
+    """
+
+    #                               ***
+    #                              public
+
+    @staticmethod
+    def is_enabled() -> bool:
+        """ Whether the repetitions are stored (the setting
+        TASKMANAGER_MATERIALIZE_OCCURRENCES).
+        """
+        return settings.TASKMANAGER_MATERIALIZE_OCCURRENCES
+
+    @staticmethod
+    def get_horizon(user_id: int) -> Optional[datetime.date]:
+        """ Returns the last date up to which the repetitions of the
+        user's tasks are stored (`None` if they are not stored yet).
+        """
+        return OccurrenceHorizon.objects\
+            .values_list('date', flat=True)\
+            .filter(user_id=user_id)\
+            .first()
+
+    @classmethod
+    def cover(cls, user_id: int, last_date: datetime.date) -> bool:
+        """ Makes sure that the repetitions of the user's tasks are
+        stored up to the `last_date`: if they are not, stores them ahead
+        for TASKMANAGER_OCCURRENCE_HORIZON_DAYS after the `last_date`.
+        Returns whether they are stored, which they are not (and nothing
+        is stored) if the `last_date` is more than
+        TASKMANAGER_OCCURRENCE_HORIZON_DAYS after today.
+        """
+        horizon = cls.get_horizon(user_id)
+        if horizon is not None and horizon >= last_date:
+            return True
+        days_ahead = datetime.timedelta(
+            days=settings.TASKMANAGER_OCCURRENCE_HORIZON_DAYS)
+        # a request of some far month must not store years of repetitions
+        if last_date > timezone.now().date() + days_ahead:
+            return False
+        cls.extend(user_id, last_date + days_ahead)
+        return True
+
+    @classmethod
+    def extend(cls, user_id: int, until: datetime.date) -> None:
+        """ Stores the repetitions of all the user's tasks from the
+        current horizon (or from the beginning if there is none) up to
+        the `until` date and moves the horizon there.
+        """
+        with transaction.atomic():
+            # the concurrent extensions of the horizon wait for each
+            # other (the repetitions stored twice by the first ones of a
+            # user are skipped by the unique constraint)
+            horizon = OccurrenceHorizon.objects\
+                .select_for_update()\
+                .values_list('date', flat=True)\
+                .filter(user_id=user_id)\
+                .first()
+            if horizon is not None and horizon >= until:
+                return
+            first_date = (horizon + datetime.timedelta(days=1)
+                          if horizon is not None else None)
+
+            tasks = Task.objects\
+                .values(*TASK_FIELDS)\
+                .filter(user_id=user_id,
+                        init_date__lt=datetime.datetime.combine(
+                            until, datetime.time(),
+                            tzinfo=datetime.timezone.utc))\
+                .exclude(interval='no')
+            cls._store(user_id, tasks, first_date, until)
+            OccurrenceHorizon.objects.update_or_create(
+                user_id=user_id, defaults={'date': until})
+
+    @classmethod
+    def store_task(cls, task_id: int, user_id: int) -> None:
+        """ (Re)stores the repetitions of the task up to the horizon of
+        its owner (e.g. after the task is created or changed).
+        """
+        cls.store_tasks([task_id], user_id)
+
+    @classmethod
+    def store_tasks(cls, task_ids: Iterable[int], user_id: int) -> None:
+        """ The same as `store_task()` for several tasks of the user at
+        once.
+        """
+        task_ids = list(task_ids)
+        with transaction.atomic():
+            Occurrence.objects.filter(task_id__in=task_ids).delete()
+
+            horizon = cls.get_horizon(user_id)
+            if horizon is None:
+                # will be stored with all the user's tasks by `extend()`
+                return
+            tasks = Task.objects\
+                .values(*TASK_FIELDS)\
+                .filter(id__in=task_ids, user_id=user_id)\
+                .exclude(interval='no')
+            cls._store(user_id, tasks, None, horizon)
+
+    @classmethod
+    def rebuild(cls, user_id: int, until: datetime.date) -> int:
+        """ Removes the stored repetitions of the user's tasks and
+        stores them again up to the `until` date. Returns the number
+        of stored repetitions.
+        """
+        with transaction.atomic():
+            Occurrence.objects.filter(user_id=user_id).delete()
+            OccurrenceHorizon.objects.filter(user_id=user_id).delete()
+            cls.extend(user_id, until)
+            return Occurrence.objects.filter(user_id=user_id).count()
+
+    #                               ***
+    #                              other
+
+    @staticmethod
+    def _store(user_id: int, tasks: Iterable[dict],
+               first_date: Optional[datetime.date],
+               last_date: datetime.date) -> None:
+        """ Creates `Occurrence` models for the repetitions of the
+        `tasks` from the `first_date` (or from the creation of a task if
+        `None`) to the `last_date`.
+        """
+        occurrences = []
+        for task in tasks:
+            start = first_date or task['init_date'].date()
+            occurrences += [
+                Occurrence(task_id=task['id'], user_id=user_id, date=date)
+                for date in RepeatingTasksGenerator.occurrence_dates(
+                    task, start, last_date)
+            ]
+        Occurrence.objects.bulk_create(occurrences, batch_size=1000,
+                                       ignore_conflicts=True)
@@ -0,0 +1,213 @@
+import collections
+import cProfile
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+
+
+# the requests are profiled one at a time in a process: the profiler of
+# Python can not run twice at once (and the samples of one request should
+# not get mixed with another)
+_profiling_lock = threading.Lock()
+
+
+def has_profile_key(request) -> bool:
+    """ Whether the request has the TASKMANAGER_PROFILE_KEY in the
+    X-Profile-Key header.
+    """
+    key = settings.TASKMANAGER_PROFILE_KEY
+    header = request.META.get('HTTP_X_PROFILE_KEY')
+    return bool(key and header and constant_time_compare(header, key))
+
+
+def should_profile(request) -> bool:
+    """ Whether to profile the request: a TASKMANAGER_PROFILE_SAMPLE_RATE
+    share of the requests is chosen at random, and the requests with the
+    profile key (see `has_profile_key()`) are always chosen.
+    """
+    if has_profile_key(request):
+        return True
+    rate = settings.TASKMANAGER_PROFILE_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+class StackSampler:
+    """ Samples the call stack of one thread every
+    TASKMANAGER_PROFILE_INTERVAL seconds (from a thread of its own) and
+    counts the samples by the stacks, in the "collapsed" format of the
+    flame graphs: the frames from the outermost one, joined by ";".
+    The samples are only taken while the sampler is resumed.
+    """
+
+    def __init__(self, thread_id: int, root: str):
+        self.thread_id = thread_id
+        self.root = root
+        # stack -> the number of samples
+        self.stacks = collections.Counter()
+        self._resumed = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='taskmanager-stack-sampler')
+
+    #                               ***
+    #                              public
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def resume(self) -> None:
+        self._resumed.set()
+
+    def pause(self) -> None:
+        self._resumed.clear()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._resumed.set()
+        self._thread.join()
+
+    #                               ***
+    #                              other
+
+    def _run(self) -> None:
+        interval = settings.TASKMANAGER_PROFILE_INTERVAL
+        while True:
+            self._resumed.wait()
+            if self._stopped.is_set():
+                return
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self._collapse(frame)] += 1
+            time.sleep(interval)
+
+    def _collapse(self, frame) -> str:
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f'{code.co_name} '
+                          f'({Path(code.co_filename).name}:'
+                          f'{code.co_firstlineno})')
+            frame = frame.f_back
+        frames.append(self.root)
+        return ';'.join(reversed(frames))
+
+
+class RequestProfile:
+    """ The profile of one request: the function calls recorded by
+    cProfile and the stacks sampled by `StackSampler`, both of the thread
+    that runs the request. The profile may be paused (e.g. between the
+    chunks of a streaming response, while they are sent).
+
+    `finish()` writes the calls as a pstats dump to
+    TASKMANAGER_PROFILE_DIR, keeping the latest TASKMANAGER_PROFILE_KEEP
+    dumps only, and adds the stacks to the "stacks.collapsed" file there
+    (rotated to "stacks.collapsed.1" when it grows over
+    TASKMANAGER_PROFILE_STACKS_MAX_BYTES).
+    """
+
+    stacks_file = 'stacks.collapsed'
+
+    def __init__(self, name: str, user_id: Optional[int]):
+        self.name = name
+        self.user_id = user_id
+        self.started = time.time()
+        self._profiler = cProfile.Profile()
+        self._sampler = StackSampler(threading.get_ident(), name)
+        self._finished = False
+
+    #                               ***
+    #                              public
+
+    @classmethod
+    def start(cls, name: str, user_id: Optional[int]
+              ) -> Optional['RequestProfile']:
+        """ Starts profiling the current thread as the request `name` of
+        the user. Returns None if another request is being profiled in
+        the process.
+        """
+        if not _profiling_lock.acquire(blocking=False):
+            return None
+        try:
+            profile = cls(name, user_id)
+            profile._sampler.start()
+            profile.resume()
+        except BaseException:
+            _profiling_lock.release()
+            raise
+        return profile
+
+    @property
+    def filename(self) -> str:
+        """ The name of the pstats dump of the profile."""
+        started = time.strftime('%Y%m%d-%H%M%S', time.gmtime(self.started))
+        milliseconds = int(self.started * 1000) % 1000
+        return (f'{started}.{milliseconds:03d}-{self.name}'
+                f'-user{self.user_id or 0}.prof')
+
+    def resume(self) -> None:
+        # the chunks of a stream may be made in another thread than the
+        # view was run in
+        self._sampler.thread_id = threading.get_ident()
+        self._sampler.resume()
+        self._profiler.enable()
+
+    def pause(self) -> None:
+        self._profiler.disable()
+        self._sampler.pause()
+
+    def finish(self) -> None:
+        """ Stops the profile and writes it. Does nothing if the profile
+        is already finished.
+        """
+        if self._finished:
+            return
+        self._finished = True
+        try:
+            self.pause()
+            self._sampler.stop()
+            directory = Path(settings.TASKMANAGER_PROFILE_DIR)
+            directory.mkdir(parents=True, exist_ok=True)
+            self._write_stats(directory)
+            self._write_stacks(directory)
+            self._remove_old_dumps(directory)
+        finally:
+            _profiling_lock.release()
+
+    #                               ***
+    #                              other
+
+    def _write_stats(self, directory: Path) -> None:
+        self._profiler.create_stats()
+        pstats.Stats(self._profiler).dump_stats(directory / self.filename)
+
+    def _write_stacks(self, directory: Path) -> None:
+        if not self._sampler.stacks:
+            return
+        path = directory / self.stacks_file
+        max_bytes = settings.TASKMANAGER_PROFILE_STACKS_MAX_BYTES
+        if path.exists() and path.stat().st_size > max_bytes:
+            os.replace(path, directory / f'{self.stacks_file}.1')
+        # the same stack may be on several lines (one for each profile),
+        # the flame graph tools add them up
+        lines = ''.join(f'{stack} {count}\n'
+                        for stack, count in self._sampler.stacks.items())
+        with open(path, 'a') as file:
+            file.write(lines)
+
+    @staticmethod
+    def _remove_old_dumps(directory: Path) -> None:
+        dumps = sorted(directory.glob('*.prof'), reverse=True)
+        for path in dumps[settings.TASKMANAGER_PROFILE_KEEP:]:
+            # may be removed by another process meanwhile
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
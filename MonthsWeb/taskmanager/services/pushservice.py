@@ -0,0 +1,90 @@
+import asyncio
+import functools
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    """ The messages for one connected client of a user, delivered to
+    the event loop of the connection.
+    """
+
+    def __init__(self, user_id: int, maxsize: int = 100):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    async def get(self) -> dict:
+        """ Waits for the next message."""
+        return await self.queue.get()
+
+    def put(self, message: dict) -> None:
+        """ Puts the message into the queue from any thread. If the
+        client does not keep up, the message is dropped (every message
+        has the version of the tasks, so the next one catches it up).
+        """
+        try:
+            self.loop.call_soon_threadsafe(self._put_nowait, message)
+        except RuntimeError:
+            # the loop of the connection is closed
+            pass
+
+    def _put_nowait(self, message: dict) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            pass
+
+
+class InProcessBroker:
+    """ Publish/subscribe of the messages for the users' clients within
+    the current process: the messages published by the writes of a
+    process reach the clients connected to the same process only. Other
+    brokers (e.g. for several worker processes) can be used instead, see
+    the setting TASKMANAGER_PUSH_BROKER and `get_broker()`; they should
+    have the same three methods.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    #                               ***
+    #                              public
+
+    def subscribe(self, user_id: int) -> Subscription:
+        """ Returns a new subscription to the messages for the user (must
+        be called in the event loop of the connection).
+        """
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id: int, message: dict) -> None:
+        """ Sends the message to all the subscriptions of the user (can
+        be called from any thread).
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+
+@functools.lru_cache(maxsize=None)
+def get_broker():
+    """ Returns the broker of the process (an instance of the class
+    TASKMANAGER_PUSH_BROKER).
+    """
+    return import_string(settings.TASKMANAGER_PUSH_BROKER)()
@@ -1,15 +1,59 @@
+import calendar
 import datetime
-from .dateservice import DatesHandler
+from .timingservice import timed_stage
 from django.contrib.auth.models import User
 
 
+ONE_DAY = datetime.timedelta(days=1)
+ONE_WEEK = datetime.timedelta(weeks=1)
+
+
+class TaskOccurrence:
+    """ A task on a particular date. Refers to the task record (a dict of
+    the fields of the task and its ['files']) shared by all the dates of
+    the task, and stores only the date and the completion of its own.
+    """
+    __slots__ = ('task', 'date', 'completion')
+
+    def __init__(self, task: dict, date: datetime.datetime,
+                 completion=False):
+        self.task = task
+        self.date = date
+        # `datetime` when the task was completed on the date, or False
+        self.completion = completion
+
+    def __repr__(self) -> str:
+        return f'<TaskOccurrence id {self.task["id"]} {self.date}>'
+
+    def as_dict(self) -> dict:
+        """ Returns the task dict of the date as the client expects it
+        (the fields of the task, ['date'], ['files'], ['completion']).
+        """
+        dct = {k: v for k, v in self.task.items() if k != 'files'}
+        dct['date'] = self.date
+        dct['files'] = self.task.get('files', [])
+        dct['completion'] = self.completion
+        return dct
+
+
 class RepeatingTasksGenerator:
     """ If task should repeat according to user-defined time interval,
     this class generates the copies of such task for each date when
     it should be repeated (in range of the given dates list).
     """
 
+    # names of the methods that compute the dates of repetitions
+    # directly (without checking each date of the range one by one)
+    occurrences_map = {
+        'every_day': '_every_day_dates',
+        'every_workday': '_every_workday_dates',
+        'every_week': '_every_week_dates',
+        'every_month': '_every_month_dates',
+        'every_year': '_every_year_dates',
+    }
+
     @classmethod
+    @timed_stage('recurrence.generate')
     def generate(cls, datetime_objects: list,
                  intervalled_tasks: list) -> list:
         """ 1 Takes:
@@ -20,132 +64,146 @@ class RepeatingTasksGenerator:
 
         2 Returns a list of tasks (as dicts) with new key ['date'],
         that denote when task should be repeated (task creation date -
-        `['init_date']` is not included).
+        `['init_date']` is not included). The list is ordered by
+        ['date'], tasks of the same date keep the order of
+        `intervalled_tasks`.
         """
-        list_of_matched = []
-        for date_obj in datetime_objects:
-            for task in intervalled_tasks:
-                if cls._is_match(task=task, checkdate=date_obj):
-                    matched_dict_copy = {k: v for k, v in task.items()}
-                    matched_dict_copy['date'] = date_obj
-                    list_of_matched.append(matched_dict_copy)
+        return [
+            dict(task, date=date_obj)
+            for task, date_obj in cls._iter_matched(datetime_objects,
+                                                    intervalled_tasks)
+        ]
 
-        return list_of_matched
+    @classmethod
+    @timed_stage('recurrence.generate_occurrences')
+    def generate_occurrences(cls, datetime_objects: list,
+                             intervalled_tasks: list) -> list:
+        """ The same as `generate()`, but returns `TaskOccurrence`
+        objects referring to the dicts of `intervalled_tasks` instead of
+        copies of them.
+        """
+        return [
+            TaskOccurrence(task, date_obj)
+            for task, date_obj in cls._iter_matched(datetime_objects,
+                                                    intervalled_tasks)
+        ]
 
     @classmethod
-    def _is_match(cls, task: dict, checkdate: datetime.datetime) -> bool:
-        """ Checks whether the task with interval settings should
-        appear on particular date(checkdate arg) or not.
+    def _iter_matched(cls, datetime_objects: list, intervalled_tasks: list):
+        """ Yields tuples of (task, date object) for every repetition,
+        ordered by the dates (tasks of the same date keep the order of
+        `intervalled_tasks`).
         """
-        intervals_map = {
-            'every_day': cls._every_day,
-            'every_workday': cls._every_workday,
-            'every_week': cls._every_week,
-            'every_month': cls._every_month,
-            'every_year': cls._every_year,
-            'special': cls._special
-        }
-        interval = task['interval']
-        init_date = task['init_date']
-        options = None  # TODO: fix when complex intervals will be implemented
-        check_func = intervals_map[interval]
-
-        if not interval.startswith('special'):
-            return check_func(init_date, checkdate)
-        elif not options:
-            raise TypeError('special time interval needs the options dict '
-                            'as arguments of function')
-        else:
-            return check_func(init_date, checkdate, options)
+        if not datetime_objects:
+            return
+
+        # datetime.date -> position of the date in `datetime_objects`
+        positions = {dt.date(): i for i, dt in enumerate(datetime_objects)}
+        first_date = min(positions)
+        last_date = max(positions)
+
+        matched_by_position = [[] for _ in datetime_objects]
+        for task in intervalled_tasks:
+            for date in cls.occurrence_dates(task, first_date, last_date):
+                position = positions.get(date)
+                if position is not None:
+                    matched_by_position[position].append(task)
+
+        for position, matched in enumerate(matched_by_position):
+            for task in matched:
+                yield task, datetime_objects[position]
 
     @classmethod
-    def _every_day(cls, init_date: datetime.datetime,
-                   checkdate: datetime.datetime) -> None:
-        """ Returns `True` if `checkdate` matches 'every_day', interval.
-        Otherwise returns False. Date when the Task was created
-        (`init_date`) always returns as `False`.
+    def occurrence_dates(cls, task: dict, first_date: datetime.date,
+                         last_date: datetime.date):
+        """ Yields `datetime.date` objects when the task repeats in the
+        range from `first_date` to `last_date` (inclusive).
         """
-        if init_date.date() >= checkdate.date():
-            return False
-        else:
-            return True
+        dates_func = getattr(cls, cls.occurrences_map[task['interval']])
+        yield from dates_func(task['init_date'].date(), first_date, last_date)
+
+    #                               ***
+    #      dates of repetitions (for self.occurrence_dates())
 
     @classmethod
-    def _every_workday(cls, init_date: datetime.datetime,
-                       checkdate: datetime.datetime) -> None:
-        """ Returns `True` if `checkdate` matches 'every_workday'
-        interval (every MONDAY-FRIDAY). Otherwise returns `False`.
-        Date when the Task was created (`init_date`) always returns
-        as `False`.
+    def _every_day_dates(cls, init_date: datetime.date,
+                         first_date: datetime.date,
+                         last_date: datetime.date):
+        """ Yields the dates of 'every_day' interval from `first_date` to
+        `last_date`. The `init_date` itself is not included.
         """
-        if init_date.date() >= checkdate.date():
-            return False
-        elif checkdate.weekday() in (0, 1, 2, 3, 4):
-            return True
-        else:
-            return False
+        date = max(init_date + ONE_DAY, first_date)
+        while date <= last_date:
+            yield date
+            date += ONE_DAY
 
     @classmethod
-    def _every_week(cls, init_date: datetime.datetime,
-                    checkdate: datetime.datetime) -> None:
-        """ Returns `True` if `checkdate` match interval 'every_week',
-        otherwise returns False. Date when the Task was created
-        (`init_date`) always returns as `False`.
+    def _every_workday_dates(cls, init_date: datetime.date,
+                             first_date: datetime.date,
+                             last_date: datetime.date):
+        """ Yields the dates of 'every_workday' interval (MONDAY-FRIDAY)
+        from `first_date` to `last_date`. The `init_date` itself is not
+        included.
         """
-        if init_date.date() >= checkdate.date():
-            return False
-        elif init_date.weekday() == checkdate.weekday():
-            return True
-        else:
-            return False
+        for date in cls._every_day_dates(init_date, first_date, last_date):
+            if date.weekday() < 5:
+                yield date
 
     @classmethod
-    def _every_month(cls, init_date: datetime.datetime,
-                     checkdate: datetime.datetime) -> None:
-        """ Returns `True` if `checkdate` match interval 'every_month',
-        otherwise returns False. Date when the Task was created
-        (`init_date`) always returns as `False`.
-
-        If the month of the `init_date` is 31 and a checking month have
-        only 30 or less days returns `True` on the latest date of the
-        month.
+    def _every_week_dates(cls, init_date: datetime.date,
+                          first_date: datetime.date,
+                          last_date: datetime.date):
+        """ Yields the dates of 'every_week' interval from `first_date` to
+        `last_date`. The `init_date` itself is not included.
         """
-        is_end_of_month = DatesHandler.is_end_of_month
-
-        if init_date.date() >= checkdate.date():
-            return False
-        elif init_date.day == checkdate.day:
-            return True
-        elif checkdate.day in (28, 29, 30) and is_end_of_month(checkdate):
-            if init_date.day > checkdate.day:
-                return True
-            else:
-                return False
-        else:
-            return False
+        # number of whole weeks from `init_date` to the first repetition
+        weeks = max(1, -(-(first_date - init_date).days // 7))
+        date = init_date + datetime.timedelta(weeks=weeks)
+        while date <= last_date:
+            yield date
+            date += ONE_WEEK
 
     @classmethod
-    def _every_year(cls, init_date: datetime.datetime,
-                    checkdate: datetime.datetime) -> None:
-        """ Returns `True` if `checkdate` matches 'every_year',
-        interval. Otherwise returns `False`. Date when the Task was created
-        (`init_date`) always returns as `False`.
+    def _every_month_dates(cls, init_date: datetime.date,
+                           first_date: datetime.date,
+                           last_date: datetime.date):
+        """ Yields the dates of 'every_month' interval from `first_date`
+        to `last_date`. The `init_date` itself is not included.
+
+        If the day of the `init_date` is missing in a month (e.g. 31),
+        the task repeats on the latest date of that month.
         """
-        if init_date.date() >= checkdate.date():
-            return
-        if (init_date.month, init_date.day) == (checkdate.month, checkdate.day):
-            return True
-        elif (init_date.month, checkdate.month) == (2, 2):
-            if checkdate.day == 28 and DatesHandler.is_end_of_month(checkdate):
-                if init_date.day > checkdate.day:
-                    return True
-            return False
-        else:
-            return False
+        # months are counted as `year * 12 + (month - 1)`
+        month_index = max(init_date.year * 12 + init_date.month,
+                          first_date.year * 12 + first_date.month - 1)
+        last_index = last_date.year * 12 + last_date.month - 1
+        while month_index <= last_index:
+            year, month = divmod(month_index, 12)
+            month += 1
+            last_day = calendar.monthrange(year, month)[1]
+            date = datetime.date(year, month, min(init_date.day, last_day))
+            if first_date <= date <= last_date:
+                yield date
+            month_index += 1
 
     @classmethod
-    def _special(cls, init_date, checkdate, options):
-        pass  # TODO
+    def _every_year_dates(cls, init_date: datetime.date,
+                          first_date: datetime.date,
+                          last_date: datetime.date):
+        """ Yields the dates of 'every_year' interval from `first_date`
+        to `last_date`. The `init_date` itself is not included.
+
+        The task created on February 29 repeats on February 28 in
+        non-leap years.
+        """
+        for year in range(max(init_date.year + 1, first_date.year),
+                          last_date.year + 1):
+            day = init_date.day
+            if (init_date.month, day) == (2, 29) and not calendar.isleap(year):
+                day = 28
+            date = datetime.date(year, init_date.month, day)
+            if first_date <= date <= last_date:
+                yield date
 
 
 class TaskHandler:
@@ -164,98 +222,137 @@ class TaskHandler:
     #                               ***
     #                              public
 
-    def generate_tasklist_for_dates(self, monthdates_objects: list,
-                                    user: User) -> list:
-        """Takes a list of `datetime.datetime` objects and returns a
-        list of all tasks (as dicts) that appears on those dates,
-        including repeating.
+    @timed_stage('tasks.iter_tasklist_for_dates')
+    def iter_tasklist_for_dates(self, monthdates_objects: list,
+                                user: User, month_pack: dict = None):
+        """Takes a list of `datetime.datetime` objects and yields all
+        tasks that appear on those dates, including repeating, as
+        `TaskOccurrence` objects one by one as they are completed (the
+        tasks of all dates of a task share one record).
+
+        A `month_pack` of the dates retrieved beforehand (e.g. by
+        `db_service.aget_month_pack()` in async code) can be given
+        instead of retrieving the records here.
         """
         date_range = (monthdates_objects[0], monthdates_objects[-1])
 
-        tasks_by_interval = self._get_tasks_by_intervall(
-            monthdates_objects, user)
-        tasks_by_month = self._get_tasks_by_month(date_range, user)
-
-        tasks_total = tasks_by_month + tasks_by_interval
-
-        if tasks_total:
-            tasks_total = self._add_remain_fields(tasks_total)
-            tasks_total = self._convert_dates_to_strings(tasks_total)
-
-        return tasks_total
+        if month_pack is None and hasattr(self.db_service, 'get_month_pack'):
+            month_pack = self.db_service.get_month_pack(date_range, user)
+        if month_pack is not None:
+            # all the records at once
+            tasks_by_month = month_pack['tasks_by_timerange']
+            intervalled_tasks = month_pack['intervalled_tasks']
+            # stored ahead by the db_service (if it does)
+            repetitions = month_pack.get('repetitions')
+        else:
+            intervalled_tasks = self.db_service.get_intervalled_tasks(
+                date_range, user)
+            tasks_by_month = self.db_service.get_tasks_by_timerange(
+                date_range, user)
+            repetitions = None
+
+        # task id -> the record shared by all the dates of the task
+        records = {}
+        # the task's date is the same as task's creation date (init_date)
+        # if the task is not repeated
+        occurrences = [
+            TaskOccurrence(records.setdefault(task['id'], task),
+                           task['init_date'])
+            for task in tasks_by_month
+        ]
+        if repetitions is None:
+            occurrences += RepeatingTasksGenerator.generate_occurrences(
+                datetime_objects=monthdates_objects,
+                intervalled_tasks=[records.setdefault(task['id'], task)
+                                   for task in intervalled_tasks]
+            )
+        else:
+            for task in repetitions:
+                record = records.setdefault(
+                    task['id'],
+                    {k: v for k, v in task.items() if k != 'date'})
+                occurrences.append(TaskOccurrence(record, task['date']))
+
+        if occurrences:
+            yield from self._iter_completed_occurrences(occurrences,
+                                                        month_pack)
+
+    @timed_stage('tasks.generate_tasklists_for_months')
+    def generate_tasklists_for_months(self, grids: list,
+                                      user: User) -> list:
+        """Takes a list of `MonthGrid`s of consecutive months and
+        returns a list of their lists of `TaskOccurrence`s (in the same
+        order as the grids).
+
+        The tasks are retrieved and repeated once for all the dates of
+        the grids (the days shared by the pages of adjacent months are
+        handled only once) and then split between the months, so every
+        list is the same as `iter_tasklist_for_dates()` gives for the
+        dates of its grid.
+        """
+        if not grids:
+            return []
+        union_dates = sorted(set(
+            date for grid in grids for date in grid.dates))
+        occurrences = list(self.iter_tasklist_for_dates(union_dates, user))
+
+        return [
+            [occurrence for occurrence in occurrences
+             if grid.dates[0] <= occurrence.date <= grid.dates[-1]]
+            for grid in grids
+        ]
 
     #                           ***
-    # ancillary methods for self.generate_tasklist_for_dates()
-
-    def _get_tasks_by_intervall(self, datetime_objects: list,
-                                user: User) -> list:
-        """Takes a list of datetime.datetime objects and returns a list
-        of tasks (as dicts) that repeated on those dates according to
-        their interval settings.
-        """
-        date_range = datetime_objects[0], datetime_objects[-1]
-
-        intervalled_tasks = self.db_service.get_intervalled_tasks(
-            date_range, user)
-        matched = RepeatingTasksGenerator.generate(
-            datetime_objects=datetime_objects,
-            intervalled_tasks=intervalled_tasks
-        )
-        return matched
-
-    def _get_tasks_by_month(self, date_range: tuple, user: User) -> list:
-        """Takes a list of datetime objects and returns for those dates
-        a list of tasks (as_dicts). 
-        (excluding repeated).
+    # ancillary methods for self.iter_tasklist_for_dates()
+
+    @timed_stage('tasks._iter_completed_occurrences')
+    def _iter_completed_occurrences(self, occurrences: list,
+                                    additional_fields: dict = None):
+        """Takes a list of `TaskOccurrence` objects, adds ['files'] to
+        their shared task records and the completion to each of them.
+        Yields every occurrence as soon as it is completed.
         """
-        monthly_tasks = self.db_service.get_tasks_by_timerange(
-            date_range, user)
-        # need to add actual task's date, which is the same as task's creation
-        # date (init_date) if the task is not intervalled (like these).
-        for dct in monthly_tasks:
-            dct['date'] = dct['init_date']
-        return monthly_tasks
-
-    def _add_remain_fields(self, task_dicts: list) -> list:
-        """Takes list of Tasks and adds to each of fields that requires
-        additional request to related tables in the database: "files",
-        "completion".
+        if additional_fields is None:
+            additional_fields = self._get_additional_fields(
+                task_ids=set(occ.task['id'] for occ in occurrences),
+                dates=[occ.date for occ in occurrences])
+        files_by_task, completions_by_task_and_date = \
+            self._index_additional_fields(additional_fields)
+
+        for occurrence in occurrences:
+            record = occurrence.task
+            if 'files' not in record:
+                record['files'] = files_by_task.get(record['id'], [])
+            occurrence.completion = completions_by_task_and_date.get(
+                (record['id'], occurrence.date.date()), False)
+            yield occurrence
+
+    def _get_additional_fields(self, task_ids: set, dates: list) -> dict:
+        """Retrieves the files of the tasks and their completions on
+        the given dates (via `db_service.get_additional_fields()`).
         """
-        task_id_list = set(task_dict['id'] for task_dict in task_dicts)
-        additional_fields = self.db_service.get_additional_fields(task_id_list)
-
-        for task in task_dicts:
-            # adding fielsd with default values
-            task['files'] = []
-            task['completion'] = False
-            # append files in list of task['files']
-            for file_ in additional_fields['files']:
-                if file_['related_task_id'] == task['id']:
-                    task['files'].append(file_)
-            # if date is marked as completed on it's ['date'],
-            # set ['completion'] = ['date']
-            for completion in additional_fields['completions']:
-                if (completion['date_completed'].date() == task['date'].date()
-                        and completion['related_task_id'] == task['id']):
-                    task['completion'] = completion['date_completed']
-                    break
-
-        return task_dicts
-
-    def _convert_dates_to_strings(self, task_dicts: list) -> list:
-        """Takes a list of task (as dicts) and convert all `datetime`
-        objects in it ISOformat date-strings (recursively, including
-        nested arrays).
+        # only completions on the dates of the tasks are needed
+        return self.db_service.get_additional_fields(
+            task_ids, date_range=(min(dates), max(dates)))
+
+    def _index_additional_fields(self, additional_fields: dict) -> tuple:
+        """Indexes the related records once instead of scanning them for
+        every task. Returns a tuple of two dicts:
+        1) task id -> list of the files of the task;
+        2) (task id, date) -> `datetime` when the task was completed on
+           that date.
         """
-        for dct in task_dicts:
-            for key, value in dct.items():
-                # recursive convertion of nested containers
-                if type(value) in [list, tuple, set]:
-                    self._convert_dates_to_strings(value)
-                elif (isinstance(value, datetime.datetime)):
-                    dct[key] = value.isoformat()
-        # now task dicts finally complete and can be sent to the client
-        return task_dicts
+        files_by_task = {}
+        for file_ in additional_fields['files']:
+            files_by_task.setdefault(file_['related_task_id'], []).append(file_)
+        completions_by_task_and_date = {}
+        for completion in additional_fields['completions']:
+            key = (completion['related_task_id'],
+                   completion['date_completed'].date())
+            completions_by_task_and_date.setdefault(
+                key, completion['date_completed'])
+
+        return files_by_task, completions_by_task_and_date
 
     #                       ***
     #                      other
@@ -0,0 +1,220 @@
+import asyncio
+import collections
+import contextvars
+import functools
+import inspect
+import time
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.db import connection
+
+
+class StageTimings:
+    """ The durations, query counts and row counts of the stages (the
+    functions decorated with `timed_stage`) run while handling a request,
+    summed up by the names of the stages. The stages may be nested, then
+    the time and the queries of the inner ones are included in the outer.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # name -> {'duration', 'queries', 'rows', 'calls'}
+        self.stages = {}
+
+    #                               ***
+    #                              public
+
+    def add(self, name: str, duration: float, queries: Optional[int],
+            rows: Optional[int]) -> None:
+        stage = self.stages.setdefault(
+            name, {'duration': 0.0, 'queries': None, 'rows': None,
+                   'calls': 0})
+        stage['duration'] += duration
+        stage['calls'] += 1
+        if queries is not None:
+            stage['queries'] = (stage['queries'] or 0) + queries
+        if rows is not None:
+            stage['rows'] = (stage['rows'] or 0) + rows
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def as_header(self) -> str:
+        """ Returns the value of the Server-Timing header: the stages in
+        the order they were finished and the total, with the durations in
+        milliseconds and the queries and rows in the descriptions.
+        """
+        metrics = []
+        for name, stage in self.stages.items():
+            metric = f'{name};dur={stage["duration"] * 1000:.2f}'
+            description = self._describe(stage)
+            if description:
+                metric += f';desc="{description}"'
+            metrics.append(metric)
+        metrics.append(f'total;dur={self.elapsed() * 1000:.2f}')
+        return ', '.join(metrics)
+
+    def as_dict(self) -> dict:
+        """ Returns the stages with the durations in milliseconds (for
+        the log and the debug page).
+        """
+        return {
+            name: {**stage, 'duration': round(stage['duration'] * 1000, 3)}
+            for name, stage in self.stages.items()
+        }
+
+    #                               ***
+    #                              other
+
+    @staticmethod
+    def _describe(stage: dict) -> str:
+        parts = []
+        if stage['calls'] > 1:
+            parts.append(f'{stage["calls"]} calls')
+        if stage['queries'] is not None:
+            parts.append(f'{stage["queries"]} queries')
+        if stage['rows'] is not None:
+            parts.append(f'{stage["rows"]} rows')
+        return ', '.join(parts)
+
+
+# the timings of the current request, None if they are not recorded (the
+# decorated functions then cost one lookup of the variable)
+_current_timings = contextvars.ContextVar('stage_timings', default=None)
+
+
+def start_recording() -> tuple:
+    """ Starts recording the stages in the current context. Returns the
+    `StageTimings` and a token for `stop_recording()`.
+    """
+    timings = StageTimings()
+    return timings, _current_timings.set(timings)
+
+
+def stop_recording(token) -> None:
+    _current_timings.reset(token)
+
+
+def get_timings() -> Optional[StageTimings]:
+    """ Returns the `StageTimings` being recorded, if any."""
+    return _current_timings.get()
+
+
+# the records of the latest requests (for the debug page of the timings)
+_recent_timings = None
+
+
+def remember(record: dict) -> None:
+    """ Keeps the record of a request among the latest
+    TASKMANAGER_TIMING_HISTORY ones.
+    """
+    global _recent_timings
+    if _recent_timings is None:
+        _recent_timings = collections.deque(
+            maxlen=settings.TASKMANAGER_TIMING_HISTORY)
+    _recent_timings.appendleft(record)
+
+
+def get_recent() -> list:
+    """ Returns the records of the latest requests, the last one first."""
+    return list(_recent_timings or ())
+
+
+def count_rows(result) -> Optional[int]:
+    """ The default row count of a stage: the length of a list, a tuple
+    or a set returned by it, or the total length of the lists in a dict
+    (e.g. a month pack).
+    """
+    if isinstance(result, (list, tuple, set)):
+        return len(result)
+    if isinstance(result, dict):
+        lists = [value for value in result.values()
+                 if isinstance(value, list)]
+        return sum(map(len, lists)) if lists else None
+    return None
+
+
+def timed_stage(name: str, rows: Callable = count_rows):
+    """ Decorates a function (sync, async or a generator function) to be
+    recorded as the stage `name` when the stages are recorded (see
+    `middleware.ServerTimingMiddleware`). `rows` takes the result of the
+    function and returns the number of its rows (or None). The rows of
+    a generator are the items it yields.
+
+    The queries are counted for the sync functions and the generators
+    only: the queries of an async function run in other threads.
+    """
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                timings = _current_timings.get()
+                if timings is None:
+                    return await func(*args, **kwargs)
+                started = time.perf_counter()
+                result = await func(*args, **kwargs)
+                timings.add(name, time.perf_counter() - started, None,
+                            rows(result))
+                return result
+            return async_wrapper
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                timings = _current_timings.get()
+                if timings is None:
+                    return func(*args, **kwargs)
+                return _iter_timed(func(*args, **kwargs), timings, name)
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timings = _current_timings.get()
+            if timings is None:
+                return func(*args, **kwargs)
+            counter = _QueryCounter()
+            started = time.perf_counter()
+            with connection.execute_wrapper(counter):
+                result = func(*args, **kwargs)
+            timings.add(name, time.perf_counter() - started, counter.count,
+                        rows(result))
+            return result
+        return wrapper
+    return decorator
+
+
+class _QueryCounter:
+    """ Execute wrapper of the connection counting the queries."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _iter_timed(iterator, timings: StageTimings, name: str):
+    """ Yields the items of the `iterator`, timing (and counting the
+    queries of) its own work only, not the work of the consumer between
+    the items. The stage is added when the iterator is exhausted or
+    closed.
+    """
+    counter = _QueryCounter()
+    duration = 0.0
+    items = 0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                with connection.execute_wrapper(counter):
+                    item = next(iterator)
+            except StopIteration:
+                duration += time.perf_counter() - started
+                return
+            duration += time.perf_counter() - started
+            items += 1
+            yield item
+    finally:
+        timings.add(name, duration, counter.count, items)
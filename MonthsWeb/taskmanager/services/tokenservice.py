@@ -0,0 +1,130 @@
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import caches
+from django.db.models import F
+from django.utils.crypto import get_random_string
+
+from accounts.models import UserProfile
+from accounts.services.usercache import UserCache
+
+
+class ApiToken:
+    """ Signed tokens for the JSON API: the id of the user and the version
+    of the user's tokens (`UserProfile.api_token_version`) signed (HMAC
+    with the SECRET_KEY) together with the time of issue. A token is
+    valid until it expires (TASKMANAGER_API_TOKEN_MAX_AGE) while its user
+    is active and the version of the tokens is the same: `revoke()`
+    increments it.
+    """
+
+    salt = 'taskmanager.api-token'
+
+    #                               ***
+    #                              public
+
+    @classmethod
+    def for_user(cls, user: User) -> str:
+        """ Issues a token of the user."""
+        return cls._signer().sign(f'{user.id}:{cls._get_version(user)}')
+
+    @classmethod
+    def get_user(cls, token: str) -> Optional[User]:
+        """ Returns the user of the token, or `None` if the token is
+        forged, expired or revoked, or the user is missing or inactive.
+        The user (and the version of the tokens, in its profile) comes
+        from `UserCache`, so a token costs no queries while the user is
+        cached.
+        """
+        try:
+            value = cls._signer().unsign(
+                token, max_age=settings.TASKMANAGER_API_TOKEN_MAX_AGE)
+            user_id, version = map(int, value.split(':'))
+        except (signing.BadSignature, ValueError):
+            return None
+        user = UserCache.get(user_id)
+        if user is None or not user.is_active:
+            return None
+        if version != cls._get_version(user):
+            return None
+        return user
+
+    @staticmethod
+    def revoke(user: User) -> None:
+        """ Revokes all the tokens of the user issued so far."""
+        profile, _ = UserProfile.objects.get_or_create(user=user)
+        UserProfile.objects\
+            .filter(id=profile.id)\
+            .update(api_token_version=F('api_token_version') + 1)
+        # the version of the tokens is checked against the cached user
+        UserCache.invalidate(user.id)
+
+    #                               ***
+    #                              other
+
+    @classmethod
+    def _signer(cls) -> signing.TimestampSigner:
+        return signing.TimestampSigner(salt=cls.salt)
+
+    @staticmethod
+    def _get_version(user: User) -> int:
+        try:
+            return user.userprofile.api_token_version
+        except UserProfile.DoesNotExist:
+            return 0
+
+
+class StreamTicket:
+    """ Tickets for the event stream (see `events.EventStreamApp`), which
+    the browsers' EventSource opens with an URL only (no headers): a
+    ticket in the URL may end up in the logs of the servers and proxies,
+    so unlike `ApiToken` it expires in TASKMANAGER_PUSH_TICKET_MAX_AGE
+    seconds and is accepted once only (the used tickets are marked in
+    the TASKMANAGER_PUSH_TICKET_CACHE).
+    """
+
+    salt = 'taskmanager.stream-ticket'
+    key_prefix = 'taskmanager:stream-ticket'
+
+    #                               ***
+    #                              public
+
+    @classmethod
+    def for_user(cls, user: User) -> str:
+        """ Issues a ticket of the user."""
+        return cls._signer().sign(f'{user.id}:{get_random_string(16)}')
+
+    @classmethod
+    def use(cls, ticket: str) -> Optional[User]:
+        """ Returns the user of the ticket (as `ApiToken.get_user()`
+        does) and marks the ticket as used, or returns `None` if the
+        ticket is forged, expired or already used.
+        """
+        max_age = settings.TASKMANAGER_PUSH_TICKET_MAX_AGE
+        try:
+            value = cls._signer().unsign(ticket, max_age=max_age)
+            user_id, nonce = value.split(':')
+            user_id = int(user_id)
+        except (signing.BadSignature, ValueError):
+            return None
+        # the mark outlives the ticket
+        if not cls._cache().add(f'{cls.key_prefix}:{nonce}', True,
+                                max_age + 1):
+            return None
+        user = UserCache.get(user_id)
+        if user is None or not user.is_active:
+            return None
+        return user
+
+    #                               ***
+    #                              other
+
+    @classmethod
+    def _signer(cls) -> signing.TimestampSigner:
+        return signing.TimestampSigner(salt=cls.salt)
+
+    @staticmethod
+    def _cache():
+        return caches[settings.TASKMANAGER_PUSH_TICKET_CACHE]
@@ -1,13 +1,37 @@
+import asyncio
 import datetime
+import json
+import pstats
+import tempfile
+import time
+from asgiref.sync import async_to_sync, sync_to_async
 from copy import deepcopy
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.db import connection, transaction
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.db import IntegrityError
-from .models import Task, Completion, File
+from . import events, views
+from .models import (INTERVALS, ChangeLogEntry, ChangeSequence, Completion,
+                     File, Occurrence, OccurrenceHorizon, Task)
+from .services.autoshiftservice import AutoshiftHandler
+from .services.cacheservice import MonthPackCache
+from .services.changelogservice import ChangeLog
 from .services.dbservice import DatabaseHandler
 from .services.dateservice import DatesHandler
-from .services.taskservice import TaskHandler, RepeatingTasksGenerator
+from .services.jsonservice import MonthPackEncoder, MonthPackStreamer
+from .services.occurrenceservice import OccurrenceHandler
+from .services.profilingservice import RequestProfile
+from .services.pushservice import InProcessBroker, get_broker
+from .services.taskservice import (TaskHandler, TaskOccurrence,
+                                   RepeatingTasksGenerator)
+from .services.tokenservice import ApiToken, StreamTicket
 
 
 class TestModels(TestCase):
@@ -59,13 +83,13 @@ class TestModels(TestCase):
         existing_model = Completion.objects\
             .select_related('related_task')\
             .get(related_task__title='test task 2')
-        with self.assertRaises(IntegrityError):
+        with self.assertRaises(IntegrityError), transaction.atomic():
             # only one for the same date
             Completion.objects.create(
                 date_completed=existing_model.date_completed,
                 related_task=existing_model.related_task
             )
-        with self.assertRaises(IntegrityError):
+        with self.assertRaises(IntegrityError), transaction.atomic():
             slightly_different_time = datetime.datetime.fromisoformat(
                 "2021-02-20T17:30:30.000+00:00"
             )
@@ -73,7 +97,7 @@ class TestModels(TestCase):
                 date_completed=slightly_different_time,
                 related_task=existing_model.related_task
             )
-        with self.assertRaises(IntegrityError):
+        with self.assertRaises(IntegrityError), transaction.atomic():
             slightly_different_time = datetime.datetime.fromisoformat(
                 "2021-02-20T15:30:30.000+00:00"
             )
@@ -329,6 +353,74 @@ class TestDatabaseHandler(TestCase):
         self.assertEquals(first=additional_fields,
                             second=expected_output)
 
+    def test_get_additional_fields_in_date_range(self):
+        date_range = (
+            datetime.datetime.fromisoformat(
+                "2021-02-21T00:00:00.000+00:00"),
+            datetime.datetime.fromisoformat(
+                "2021-03-06T00:00:00.000+00:00"),
+        )
+        id_set = set(Task.objects.values_list('id', flat=True))
+
+        additional_fields = DatabaseHandler.get_additional_fields(
+            id_set, date_range=date_range)
+
+        self.assertEquals(len(additional_fields['files']), 2)
+        # the completion of 2021-02-20 is out of the range
+        self.assertEquals(
+            [completion['date_completed'].isoformat()
+             for completion in additional_fields['completions']],
+            ['2021-02-21T16:41:30.981000+00:00',
+             '2021-03-06T10:10:59.981000+00:00'])
+
+    def test_get_month_pack(self):
+        date_range = (
+            datetime.datetime.fromisoformat(
+                "2021-02-01T00:00:00.000+00:00"),
+            datetime.datetime.fromisoformat(
+                "2021-03-14T00:00:00.000+00:00")
+        )
+        # completed before the range
+        Completion.objects.create(
+            date_completed=datetime.datetime.fromisoformat(
+                "2021-01-31T23:59:59.000+00:00"),
+            related_task=Task.objects.get(title='test task 2'))
+
+        with self.assertNumQueries(3):
+            month_pack = DatabaseHandler.get_month_pack(date_range,
+                                                        user=self.test_user)
+
+        self.assertEquals(
+            month_pack['tasks_by_timerange'],
+            DatabaseHandler.get_tasks_by_timerange(date_range,
+                                                   user=self.test_user))
+        self.assertEquals(
+            month_pack['intervalled_tasks'],
+            DatabaseHandler.get_intervalled_tasks(date_range,
+                                                  user=self.test_user))
+        self.assertEquals(
+            [file_['link'] for file_ in month_pack['files']],
+            ['file1/for/task/3', 'file2/for/task/3'])
+        # only the completions within the dates of the range
+        self.assertEquals(
+            sorted(completion['date_completed'].isoformat()
+                   for completion in month_pack['completions']),
+            ['2021-02-20T18:13:45.436000+00:00',
+             '2021-02-21T16:41:30.981000+00:00',
+             '2021-03-06T10:10:59.981000+00:00'])
+
+    def test_aget_month_pack(self):
+        date_range = (
+            datetime.datetime.fromisoformat(
+                "2021-02-01T00:00:00.000+00:00"),
+            datetime.datetime.fromisoformat(
+                "2021-03-14T00:00:00.000+00:00")
+        )
+        self.assertEquals(
+            async_to_sync(DatabaseHandler.aget_month_pack)(
+                date_range, user=self.test_user),
+            DatabaseHandler.get_month_pack(date_range, user=self.test_user))
+
     def test_create_task_and_related(self):
         """Task_dict_with_related simulates a dict with the fields of
         model Task and models related to it, which came from client.
@@ -394,10 +486,97 @@ class TestDatabaseHandler(TestCase):
         DatabaseHandler.update_task_and_related(expected_output_1, user=self.test_user)
         updated_dict = Task.objects.values().filter(id=task_1.id)[0]
         del updated_dict['user_id']
+        self.assertGreater(updated_dict.pop('updated_at'), task_1.updated_at)
         updated_dict['init_date'] = updated_dict['init_date'].isoformat()
 
         self.assertEquals(expected_output_1, updated_dict)
 
+    def test_create_tasks_and_related(self):
+        task_dicts = [
+            {'init_date': '2021-05-01T00:00:00+00:00',
+             'title': 'imported 1',
+             'description': '',
+             'interval': 'every_day',
+             'autoshift': False,
+             'files': [{'link': 'file/1'}, {'link': 'file/2'}]},
+            {'init_date': 'yesterday', 'title': 'imported 2'},
+            {'init_date': '2021-05-02T00:00:00+00:00',
+             'title': 'imported 3',
+             'interval': 'every_day',
+             'autoshift': True},
+            {'init_date': '2021-05-03T00:00:00+00:00',
+             'title': 'imported 4',
+             'files': [{'link': 'x' * 401}]},
+            {'init_date': '2021-05-04T00:00:00+00:00',
+             'title': 'imported 5'},
+        ]
+        results = DatabaseHandler.create_tasks_and_related(task_dicts,
+                                                           self.test_user)
+
+        self.assertEquals([list(result) for result in results],
+                          [['id'], ['errors'], ['errors'], ['errors'], ['id']])
+        self.assertIn('init_date', results[1]['errors'])
+        self.assertIn('files', results[3]['errors'])
+        self.assertEquals(
+            list(Task.objects
+                 .values_list('id', 'title', 'interval')
+                 .filter(title__startswith='imported')
+                 .order_by('id')),
+            [(results[0]['id'], 'imported 1', 'every_day'),
+             (results[4]['id'], 'imported 5', 'no')])
+        self.assertEquals(
+            sorted(File.objects
+                   .values_list('link', flat=True)
+                   .filter(related_task_id=results[0]['id'])),
+            ['file/1', 'file/2'])
+
+    def test_create_tasks_with_unknown_interval(self):
+        # only the intervals that can be repeated are accepted
+        self.assertEquals(set(INTERVALS),
+                          set(RepeatingTasksGenerator.occurrences_map))
+        results = DatabaseHandler.create_tasks_and_related(
+            [{'init_date': '2021-05-01T00:00:00+00:00',
+              'title': 'special task',
+              'interval': 'special'}],
+            self.test_user)
+
+        self.assertIn('interval', results[0]['errors'])
+        self.assertFalse(Task.objects.filter(title='special task').exists())
+
+    def test_update_tasks_and_related(self):
+        task_1 = Task.objects.get(title='test task 1')
+        task_3 = Task.objects.get(title='test task 3')
+        other_user = User.objects.create(username="other_user")
+        others_task = Task.objects.create(
+            init_date=datetime.datetime.fromisoformat(
+                "2021-02-21T00:00:00+00:00"),
+            title='not a task of the test user',
+            user=other_user)
+
+        results = DatabaseHandler.update_tasks_and_related([
+            {'id': task_1.id, 'title': 'updated task 1',
+             'interval': 'every_week'},
+            {'id': task_3.id, 'interval': 'every_day'},
+            {'id': others_task.id, 'title': 'updated'},
+            {'id': task_3.id, 'files': [{'link': 'new/file'}]},
+        ], self.test_user)
+
+        self.assertEquals([list(result) for result in results],
+                          [['id'], ['errors'], ['errors'], ['id']])
+        task_1.refresh_from_db()
+        self.assertEquals((task_1.title, task_1.interval),
+                          ('updated task 1', 'every_week'))
+        task_3.refresh_from_db()
+        # the invalid change is not saved with the valid one
+        self.assertEquals((task_3.interval, task_3.autoshift), ('no', True))
+        self.assertEquals(
+            list(File.objects
+                 .values_list('link', flat=True)
+                 .filter(related_task=task_3)),
+            ['new/file'])
+        others_task.refresh_from_db()
+        self.assertEquals(others_task.title, 'not a task of the test user')
+
     def test_delete_task(self):
         # delete by overall dict
         task_dict = Task.objects.values().filter(title='test task 6')[0]
@@ -453,6 +632,77 @@ class TestDatabaseHandler(TestCase):
 
         self.assertEquals(created.related_task_id, task.id)
 
+    def test_check_task_twice(self):
+        task = Task.objects.get(title='test task 4')
+        for completion in ('2021-03-01T19:53:22.900+00:00',
+                           '2021-03-01T20:00:00+00:00'):
+            DatabaseHandler.check_uncheck_task({
+                'id': task.id,
+                'completion': completion,
+                'date': '2021-03-01T17:59:22.900+00:00'})
+        # the first one is kept
+        self.assertEquals(
+            list(Completion.objects
+                 .values_list('date_completed', flat=True)
+                 .filter(related_task=task)),
+            [datetime.datetime.fromisoformat(
+                '2021-03-01T19:53:22.900+00:00')])
+
+    def test_check_uncheck_task_atomic(self):
+        task = Task.objects.get(title='test task 4')
+        updated_at = task.updated_at
+        with mock.patch.object(ChangeLog, 'record',
+                               side_effect=RuntimeError('failed')):
+            with self.assertRaises(RuntimeError):
+                DatabaseHandler.check_uncheck_task({
+                    'id': task.id,
+                    'completion': '2021-03-01T19:53:22.900+00:00',
+                    'date': '2021-03-01T17:59:22.900+00:00'})
+        # no completion without a new version of the tasks
+        self.assertFalse(Completion.objects.filter(related_task=task))
+        task.refresh_from_db()
+        self.assertEquals(task.updated_at, updated_at)
+
+    def test_check_uncheck_tasks(self):
+        task_1 = Task.objects.get(title='test task 1')
+        task_2 = Task.objects.get(title='test task 2')
+        others_task = Task.objects.create(
+            init_date=datetime.datetime.fromisoformat(
+                "2021-02-21T00:00:00+00:00"),
+            title='not a task of the test user',
+            user=User.objects.create(username="other_user"))
+        task_dicts = [
+            # already completed on that day
+            {'id': task_2.id, 'date': '2021-02-21T00:00:00+00:00',
+             'completion': '2021-02-21T18:00:00+00:00'},
+            {'id': task_2.id, 'date': '2021-02-27T00:00:00+00:00',
+             'completion': '2021-02-27T10:00:00+00:00'},
+            # the days are taken in the current time zone
+            {'id': task_2.id, 'date': '2021-03-06T12:00:00+00:00',
+             'completion': False},
+            {'id': task_1.id, 'date': '2021-02-20T12:00:00+00:00',
+             'completion': False},
+            {'id': task_1.id, 'date': 'not a date', 'completion': False},
+            {'id': others_task.id, 'date': '2021-02-21T00:00:00+00:00',
+             'completion': '2021-02-21T10:00:00+00:00'},
+        ]
+
+        ChangeSequence.objects.create(user=self.test_user)
+        # the same queries for any number of tasks
+        with self.assertNumQueries(9):
+            results = DatabaseHandler.check_uncheck_tasks(task_dicts,
+                                                          self.test_user)
+
+        self.assertEquals([list(result) for result in results],
+                          [['id'], ['id'], ['id'], ['id'],
+                           ['errors'], ['errors']])
+        self.assertEquals(
+            sorted((completion.related_task_id,
+                    completion.date_completed.isoformat())
+                   for completion in Completion.objects.all()),
+            [(task_2.id, '2021-02-21T16:41:30.981000+00:00'),
+             (task_2.id, '2021-02-27T10:00:00+00:00')])
+
     def test_shift_tasks(self):
         today = timezone.datetime.fromisoformat(
             "2021-02-26T00:00:00+00:00")
@@ -464,6 +714,74 @@ class TestDatabaseHandler(TestCase):
     
         self.assertEquals(shifted_task.init_date.date(), today.date())
 
+    def test_shift_tasks_in_batches(self):
+        today = timezone.datetime.fromisoformat("2021-02-26T00:00:00+00:00")
+        other_user = User.objects.create(username="other_user")
+        tasks = [
+            Task.objects.create(
+                init_date=datetime.datetime.fromisoformat(
+                    f"2021-02-{day:02}T10:00:00+00:00"),
+                title=f'autoshift {day}',
+                autoshift=True,
+                user=self.test_user if day % 2 else other_user)
+            for day in range(10, 20)
+        ]
+        # completed ones are not shifted
+        for task in tasks[:2]:
+            Completion.objects.create(
+                date_completed=task.init_date, related_task=task)
+
+        batches = list(AutoshiftHandler.iter_batches(
+            today, user_ids=[self.test_user.id], batch_size=2, dry_run=True))
+        # 4 of the user's tasks above and 'test task 3'
+        self.assertEquals([batch.shifted for batch in batches], [2, 2, 1])
+        self.assertFalse(Task.objects.filter(init_date=today).exists())
+
+        self.assertEquals(
+            DatabaseHandler.shift_tasks(today, user=other_user, batch_size=3),
+            4)
+        self.assertEquals(
+            sorted(Task.objects
+                   .values_list('title', flat=True)
+                   .filter(init_date=today)),
+            ['autoshift 12', 'autoshift 14', 'autoshift 16', 'autoshift 18'])
+
+    def test_shift_tasks_completed_meanwhile(self):
+        today = timezone.datetime.fromisoformat("2021-02-26T00:00:00+00:00")
+        task = Task.objects.get(title='test task 3')
+        get_shiftable = AutoshiftHandler.get_shiftable
+
+        def complete_before_recheck(*args):
+            # the second call checks the selected tasks again
+            if complete_before_recheck.calls == 1:
+                Completion.objects.create(
+                    date_completed=task.init_date, related_task=task)
+            complete_before_recheck.calls += 1
+            return get_shiftable(*args)
+        complete_before_recheck.calls = 0
+
+        with mock.patch.object(AutoshiftHandler, 'get_shiftable',
+                               side_effect=complete_before_recheck):
+            batches = list(AutoshiftHandler.iter_batches(
+                today, user_ids=[self.test_user.id]))
+        self.assertEquals([batch.shifted for batch in batches], [0])
+        self.assertFalse(ChangeLogEntry.objects
+                         .filter(kind=ChangeLogEntry.TASK).exists())
+
+    def test_autoshift_command(self):
+        stdout = StringIO()
+        call_command('autoshift', date='2021-02-26T00:00:00+00:00',
+                     user=['test_user'], dry_run=True, stdout=stdout)
+        self.assertIn('1 tasks to shift', stdout.getvalue())
+        self.assertFalse(Task.objects
+                         .filter(init_date__date='2021-02-26').exists())
+
+        call_command('autoshift', date='2021-02-26T00:00:00+00:00',
+                     stdout=StringIO())
+        self.assertEquals(
+            Task.objects.get(title='test task 3').init_date.isoformat(),
+            '2021-02-26T00:00:00+00:00')
+
 
 class TestDatesHandler(TestCase):
     def test_is_end_of_month(self):
@@ -579,6 +897,37 @@ class TestDatesHandler(TestCase):
         gen_monthsdays_05_2021 = DatesHandler.generate_month_dates(date_05_2021)
         self.assertEquals(monthsdays_05_2021, gen_monthsdays_05_2021)
 
+    def test_month_grids(self):
+        grids = DatesHandler.month_grids('2021-01-15T00:00:00+00:00',
+                                         before=2, after=1)
+        self.assertEquals([(grid.year, grid.month) for grid in grids],
+                          [(2020, 11), (2020, 12), (2021, 1), (2021, 2)])
+        self.assertEquals(grids[2], DatesHandler.month_grid('2021-01-01'))
+
+    def test_month_grid(self):
+        grid = DatesHandler.month_grid('2021-02-15T10:00:00+00:00')
+        # computed once for the month
+        self.assertIs(grid, DatesHandler.month_grid(datetime.date(2021, 2, 1)))
+        self.assertEquals((grid.year, grid.month), (2021, 2))
+        self.assertIsInstance(grid.dates, tuple)
+        self.assertIsInstance(grid.isoformats, tuple)
+        self.assertEquals(list(grid.isoformats),
+                          [dt.isoformat() for dt in grid.dates])
+        self.assertEquals(
+            DatesHandler.generate_month_dates(grid.dates[10], as_objects=True),
+            list(grid.dates))
+
+        for year in range(2019, 2031):
+            for month in range(1, 13):
+                dates = DatesHandler.month_grid(
+                    datetime.date(year, month, 1)).dates
+                self.assertEquals(len(dates), 42)
+                self.assertEquals(dates[0].weekday(), 0)
+                self.assertIn(datetime.date(year, month, 1),
+                              [dt.date() for dt in dates[:7]])
+                self.assertEquals(dates[-1] - dates[0],
+                                  datetime.timedelta(days=41))
+
 
 class TestRepeatingTasksGenerator(TestCase):
     def setUp(self):
@@ -627,28 +976,35 @@ class TestRepeatingTasksGenerator(TestCase):
             user=self.test_user
         )
 
+    def repeats_on(self, interval, init_date, checkdate) -> bool:
+        # whether the task repeats on the date of `checkdate`
+        task = {'interval': interval, 'init_date': init_date}
+        date = checkdate.date()
+        return date in RepeatingTasksGenerator.occurrence_dates(task, date,
+                                                                date)
+
     def test_every_day(self):
         # date when task was initialized
         init_date = timezone.datetime(2020, 10, 4)
 
-        self.assertTrue(RepeatingTasksGenerator._every_day(
-            init_date=init_date,
+        self.assertTrue(self.repeats_on(
+            'every_day', init_date=init_date,
             checkdate=timezone.datetime(2020, 10, 5))
         )
-        self.assertTrue(RepeatingTasksGenerator._every_day(
-            init_date=init_date,
+        self.assertTrue(self.repeats_on(
+            'every_day', init_date=init_date,
             checkdate=timezone.datetime(2048, 5, 27))
         )
-        self.assertFalse(RepeatingTasksGenerator._every_day(
-            init_date=init_date,
+        self.assertFalse(self.repeats_on(
+            'every_day', init_date=init_date,
             checkdate=timezone.datetime(2020, 10, 4))
         )
-        self.assertFalse(RepeatingTasksGenerator._every_day(
-            init_date=init_date,
+        self.assertFalse(self.repeats_on(
+            'every_day', init_date=init_date,
             checkdate=timezone.datetime(2020, 10, 3))
         )
-        self.assertFalse(RepeatingTasksGenerator._every_day(
-            init_date=init_date,
+        self.assertFalse(self.repeats_on(
+            'every_day', init_date=init_date,
             checkdate=timezone.datetime(2007, 10, 3))
         )
 
@@ -656,32 +1012,32 @@ class TestRepeatingTasksGenerator(TestCase):
         # date when task was initialized (Monday)
         init_date = timezone.datetime(2020, 10, 5)
 
-        self.assertTrue(RepeatingTasksGenerator._every_workday(
-            init_date=init_date,
+        self.assertTrue(self.repeats_on(
+            'every_workday', init_date=init_date,
             checkdate=timezone.datetime(2020, 10, 6))
         )
-        self.assertTrue(RepeatingTasksGenerator._every_workday(
-            init_date=init_date,
+        self.assertTrue(self.repeats_on(
+            'every_workday', init_date=init_date,
             checkdate=timezone.datetime(2050, 4, 4))
         )
-        self.assertTrue(RepeatingTasksGenerator._every_workday(
-            init_date=timezone.datetime(2020, 6, 28),
+        self.assertTrue(self.repeats_on(
+            'every_workday', init_date=timezone.datetime(2020, 6, 28),
             checkdate=timezone.datetime(2021, 1, 13))
         )
-        self.assertFalse(RepeatingTasksGenerator._every_workday(
-            init_date=init_date,
+        self.assertFalse(self.repeats_on(
+            'every_workday', init_date=init_date,
             checkdate=timezone.datetime(2020, 10, 5))
         )
-        self.assertFalse(RepeatingTasksGenerator._every_workday(
-            init_date=init_date,
+        self.assertFalse(self.repeats_on(
+            'every_workday', init_date=init_date,
             checkdate=timezone.datetime(2020, 10, 4))
         )
-        self.assertFalse(RepeatingTasksGenerator._every_workday(
-            init_date=init_date,
+        self.assertFalse(self.repeats_on(
+            'every_workday', init_date=init_date,
             checkdate=timezone.datetime(2020, 10, 2))
         )
-        self.assertFalse(RepeatingTasksGenerator._every_workday(
-            init_date=init_date,
+        self.assertFalse(self.repeats_on(
+            'every_workday', init_date=init_date,
             checkdate=timezone.datetime(2020, 10, 10))
         )
 
@@ -689,24 +1045,24 @@ class TestRepeatingTasksGenerator(TestCase):
         # date when task was initialized (Monday)
         init_date = timezone.datetime(2020, 10, 5)
 
-        self.assertTrue(RepeatingTasksGenerator._every_week(
-            init_date=init_date,
+        self.assertTrue(self.repeats_on(
+            'every_week', init_date=init_date,
             checkdate=timezone.datetime(2020, 12, 14))
         )
-        self.assertTrue(RepeatingTasksGenerator._every_week(
-            init_date=init_date,
+        self.assertTrue(self.repeats_on(
+            'every_week', init_date=init_date,
             checkdate=timezone.datetime(2050, 4, 4))
         )
-        self.assertFalse(RepeatingTasksGenerator._every_week(
-            init_date=init_date,
+        self.assertFalse(self.repeats_on(
+            'every_week', init_date=init_date,
             checkdate=timezone.datetime(2020, 10, 5))
         )
-        self.assertFalse(RepeatingTasksGenerator._every_week(
-            init_date=init_date,
+        self.assertFalse(self.repeats_on(
+            'every_week', init_date=init_date,
             checkdate=timezone.datetime(2020, 10, 21))
         )
-        self.assertFalse(RepeatingTasksGenerator._every_week(
-            init_date=init_date,
+        self.assertFalse(self.repeats_on(
+            'every_week', init_date=init_date,
             checkdate=timezone.datetime(2020, 11, 22))
         )
 
@@ -714,64 +1070,64 @@ class TestRepeatingTasksGenerator(TestCase):
         # date when task was initialized (Monday)
         init_date = timezone.datetime(2020, 10, 5)
 
-        self.assertTrue(RepeatingTasksGenerator._every_month(
-            init_date=init_date,
+        self.assertTrue(self.repeats_on(
+            'every_month', init_date=init_date,
             checkdate=timezone.datetime(2020, 11, 5))
         )
-        self.assertTrue(RepeatingTasksGenerator._every_month(
-            init_date=init_date,
+        self.assertTrue(self.repeats_on(
+            'every_month', init_date=init_date,
             checkdate=timezone.datetime(2023, 2, 5))
         )
-        self.assertTrue(RepeatingTasksGenerator._every_month(
-            init_date=timezone.datetime(2020, 10, 31),
+        self.assertTrue(self.repeats_on(
+            'every_month', init_date=timezone.datetime(2020, 10, 31),
             checkdate=timezone.datetime(2020, 11, 30))
         )
-        self.assertTrue(RepeatingTasksGenerator._every_month(
-            init_date=timezone.datetime(2020, 10, 31),
+        self.assertTrue(self.repeats_on(
+            'every_month', init_date=timezone.datetime(2020, 10, 31),
             checkdate=timezone.datetime(2021, 2, 28))
         )
-        self.assertTrue(RepeatingTasksGenerator._every_month(
-            init_date=timezone.datetime(2020, 1, 30),
+        self.assertTrue(self.repeats_on(
+            'every_month', init_date=timezone.datetime(2020, 1, 30),
             checkdate=timezone.datetime(2020, 2, 29))
         )
-        self.assertTrue(RepeatingTasksGenerator._every_month(
-            init_date=timezone.datetime(2020, 2, 29),
+        self.assertTrue(self.repeats_on(
+            'every_month', init_date=timezone.datetime(2020, 2, 29),
             checkdate=timezone.datetime(2021, 1, 29))
         )
-        self.assertTrue(RepeatingTasksGenerator._every_month(
-            init_date=timezone.datetime(2020, 2, 29),
+        self.assertTrue(self.repeats_on(
+            'every_month', init_date=timezone.datetime(2020, 2, 29),
             checkdate=timezone.datetime(2021, 2, 28))
         )
-        self.assertTrue(RepeatingTasksGenerator._every_month(
-            init_date=timezone.datetime(2020, 10, 30),
+        self.assertTrue(self.repeats_on(
+            'every_month', init_date=timezone.datetime(2020, 10, 30),
             checkdate=timezone.datetime(2021, 2, 28))
         )
-        self.assertFalse(RepeatingTasksGenerator._every_month(
-            init_date=init_date,
+        self.assertFalse(self.repeats_on(
+            'every_month', init_date=init_date,
             checkdate=init_date)
         )
-        self.assertFalse(RepeatingTasksGenerator._every_month(
-            init_date=init_date,
+        self.assertFalse(self.repeats_on(
+            'every_month', init_date=init_date,
             checkdate=timezone.datetime(2020, 10, 6))
         )
-        self.assertFalse(RepeatingTasksGenerator._every_month(
-            init_date=init_date,
+        self.assertFalse(self.repeats_on(
+            'every_month', init_date=init_date,
             checkdate=timezone.datetime(2019, 9, 5))
         )
-        self.assertFalse(RepeatingTasksGenerator._every_month(
-            init_date=timezone.datetime(2020, 10, 30),
+        self.assertFalse(self.repeats_on(
+            'every_month', init_date=timezone.datetime(2020, 10, 30),
             checkdate=timezone.datetime(2021, 2, 27))
         )
-        self.assertFalse(RepeatingTasksGenerator._every_month(
-            init_date=timezone.datetime(2020, 1, 29),
+        self.assertFalse(self.repeats_on(
+            'every_month', init_date=timezone.datetime(2020, 1, 29),
             checkdate=timezone.datetime(2021, 4, 28))
         )
-        self.assertTrue(RepeatingTasksGenerator._every_month(
-            init_date=timezone.datetime(2020, 1, 29),
+        self.assertTrue(self.repeats_on(
+            'every_month', init_date=timezone.datetime(2020, 1, 29),
             checkdate=timezone.datetime(2021, 4, 29))
         )
-        self.assertFalse(RepeatingTasksGenerator._every_month(
-            init_date=timezone.datetime(2020, 1, 29),
+        self.assertFalse(self.repeats_on(
+            'every_month', init_date=timezone.datetime(2020, 1, 29),
             checkdate=timezone.datetime(2021, 4, 30))
         )
 
@@ -779,40 +1135,40 @@ class TestRepeatingTasksGenerator(TestCase):
         # date when task was initialized (Monday)
         init_date = timezone.datetime(2020, 10, 5)
 
-        self.assertTrue(RepeatingTasksGenerator._every_year(
-            init_date=init_date,
+        self.assertTrue(self.repeats_on(
+            'every_year', init_date=init_date,
             checkdate=timezone.datetime(2021, 10, 5))
         )
-        self.assertTrue(RepeatingTasksGenerator._every_year(
-            init_date=init_date,
+        self.assertTrue(self.repeats_on(
+            'every_year', init_date=init_date,
             checkdate=timezone.datetime(2050, 10, 5))
         )
-        self.assertTrue(RepeatingTasksGenerator._every_year(
-            init_date=timezone.datetime(2020, 2, 29),
+        self.assertTrue(self.repeats_on(
+            'every_year', init_date=timezone.datetime(2020, 2, 29),
             checkdate=timezone.datetime(2021, 2, 28))
         )
-        self.assertTrue(RepeatingTasksGenerator._every_year(
-            init_date=timezone.datetime(2020, 2, 29),
+        self.assertTrue(self.repeats_on(
+            'every_year', init_date=timezone.datetime(2020, 2, 29),
             checkdate=timezone.datetime(2024, 2, 29))
         )
-        self.assertFalse(RepeatingTasksGenerator._every_year(
-            init_date=timezone.datetime(2020, 2, 27),
+        self.assertFalse(self.repeats_on(
+            'every_year', init_date=timezone.datetime(2020, 2, 27),
             checkdate=timezone.datetime(2021, 2, 28))
         )
-        self.assertFalse(RepeatingTasksGenerator._every_year(
-            init_date=init_date,
+        self.assertFalse(self.repeats_on(
+            'every_year', init_date=init_date,
             checkdate=init_date)
         )
-        self.assertFalse(RepeatingTasksGenerator._every_year(
-            init_date=timezone.datetime(2020, 2, 27),
+        self.assertFalse(self.repeats_on(
+            'every_year', init_date=timezone.datetime(2020, 2, 27),
             checkdate=timezone.datetime(2021, 2, 28))
         )
-        self.assertFalse(RepeatingTasksGenerator._every_year(
-            init_date=timezone.datetime(2020, 2, 27),
+        self.assertFalse(self.repeats_on(
+            'every_year', init_date=timezone.datetime(2020, 2, 27),
             checkdate=timezone.datetime(2019, 2, 27))
         )
-        self.assertFalse(RepeatingTasksGenerator._every_year(
-            init_date=timezone.datetime(2020, 2, 29),
+        self.assertFalse(self.repeats_on(
+            'every_year', init_date=timezone.datetime(2020, 2, 29),
             checkdate=timezone.datetime(2024, 2, 28))
         )
 
@@ -1007,6 +1363,37 @@ class TestRepeatingTasksGenerator(TestCase):
     
         self.assertEquals(first=repeated, second=expected_output)
 
+    def test_generate_occurrences(self):
+        datetime_objects = DatesHandler.generate_month_dates(
+            '2021-02-01T00:00:00+00:00', as_objects=True)
+        intervalled_tasks = list(Task.objects
+                                 .values()
+                                 .exclude(interval='no')
+                                 .order_by('id'))
+
+        occurrences = RepeatingTasksGenerator.generate_occurrences(
+            datetime_objects, intervalled_tasks)
+        self.assertEquals(
+            [occ.as_dict() for occ in occurrences],
+            [dict(task_dict, files=[], completion=False) for task_dict
+             in RepeatingTasksGenerator.generate(datetime_objects,
+                                                 intervalled_tasks)])
+        # the occurrences of a task share its record
+        for occurrence in occurrences:
+            self.assertTrue(any(occurrence.task is task
+                                for task in intervalled_tasks))
+            self.assertFalse(hasattr(occurrence, '__dict__'))
+
+    def test_occurrence_as_dict(self):
+        date = datetime.datetime(2021, 2, 1, tzinfo=datetime.timezone.utc)
+        record = {'id': 1, 'title': 'task', 'files': [{'id': 2}]}
+        occurrence = TaskOccurrence(record, date, completion=date)
+        self.assertEquals(
+            list(occurrence.as_dict().items()),
+            [('id', 1), ('title', 'task'), ('date', date),
+             ('files', [{'id': 2}]), ('completion', date)])
+        self.assertNotIn('date', record)
+
 
 class TestTaskHandler(TestCase):
     def setUp(self):
@@ -1081,129 +1468,43 @@ class TestTaskHandler(TestCase):
             '2021-02-01T00:00:00+00:00')
         datetime_objects = DatesHandler.generate_month_dates(testing_date,
                                                             as_objects=True)
-        date_range = datetime_objects[0], datetime_objects[-1]
         
         self.task_handler = TaskHandler(db_service=DatabaseHandler)
 
-        # for test_get_intervalled_tasks_dicts()
-        self.intervalled_tasks_dicts = self.task_handler\
-            ._get_tasks_by_intervall(
-                datetime_objects=datetime_objects,
-                user=self.test_user
-        )
-        # for test_get_tasks_by_timerange_dicts()
-        self.monthly_tasks_dicts = self.task_handler\
-            ._get_tasks_by_month(date_range, user=self.test_user)
-        
-        # for test_add_remain_fields()
-        task_dicts = (deepcopy(self.monthly_tasks_dicts) +
-                      deepcopy(self.intervalled_tasks_dicts))
-        self.remain_fields = self.task_handler._add_remain_fields(task_dicts)
+        # for test_iter_tasklist_for_dates()
+        self.remain_fields = [
+            occurrence.as_dict() for occurrence
+            in self.task_handler.iter_tasklist_for_dates(
+                datetime_objects, user=self.test_user)
+        ]
 
-    def test_get_intervalled_tasks_dicts(self):
-        
-        expected_output = [
-            {'id': 136,
-            'init_date': datetime.datetime(
-                2021, 1, 1, 0, 0, tzinfo=datetime.timezone.utc),
-            'title': 'test task 5',
-            'description': 'with interval from previous month',
-            'interval': 'every_month',
-            'autoshift': False,
-            'date': datetime.datetime(
-                2021, 2, 1, 0, 0, tzinfo=datetime.timezone.utc)},
-            {'id': 133,
-            'init_date': datetime.datetime(
-                2021, 2, 20, 0, 0, tzinfo=datetime.timezone.utc),
-            'title': 'test task 2',
-            'description': 'task with interval value "_every_week"',
-            'interval': 'every_week',
-            'autoshift': False,
-            'date': datetime.datetime(
-                2021, 2, 27, 0, 0, tzinfo=datetime.timezone.utc)},
-            {'id': 136,
-            'init_date': datetime.datetime(
-                2021, 1, 1, 0, 0, tzinfo=datetime.timezone.utc),
-            'title': 'test task 5',
-            'description': 'with interval from previous month',
-            'interval': 'every_month',
-            'autoshift': False,
-            'date': datetime.datetime(
-                2021, 3, 1, 0, 0, tzinfo=datetime.timezone.utc)},
-            {'id': 133,
-            'init_date': datetime.datetime(
-                2021, 2, 20, 0, 0, tzinfo=datetime.timezone.utc),
-            'title': 'test task 2',
-            'description': 'task with interval value "_every_week"',
-            'interval': 'every_week',
-            'autoshift': False,
-            'date': datetime.datetime(
-                2021, 3, 6, 0, 0, tzinfo=datetime.timezone.utc)},
-            {'id': 133,
-            'init_date': datetime.datetime(
-                2021, 2, 20, 0, 0, tzinfo=datetime.timezone.utc),
-            'title': 'test task 2',
-            'description': 'task with interval value "_every_week"',
-            'interval': 'every_week',
-            'autoshift': False,
-            'date': datetime.datetime(
-                2021, 3, 13, 0, 0, tzinfo=datetime.timezone.utc)}
+    def test_iter_tasklist_by_separate_requests(self):
+        # the same list is made from the month pack and from the
+        # records retrieved by separate requests
+        class SeparateRequestsHandler:
+            get_intervalled_tasks = DatabaseHandler.get_intervalled_tasks
+            get_tasks_by_timerange = DatabaseHandler.get_tasks_by_timerange
+            get_additional_fields = DatabaseHandler.get_additional_fields
+
+        datetime_objects = DatesHandler.generate_month_dates(
+            '2021-02-01T00:00:00+00:00', as_objects=True)
+
+        with self.assertNumQueries(3):
+            from_month_pack = [
+                occurrence.as_dict() for occurrence
+                in self.task_handler.iter_tasklist_for_dates(
+                    datetime_objects, user=self.test_user)
             ]
-
-        # without id-s
-        self.intervalled_tasks_dicts = [
-            {k:v for k,v in dct.items() if k != 'id'}
-            for dct in self.intervalled_tasks_dicts
+        from_separate_requests = [
+            occurrence.as_dict() for occurrence
+            in TaskHandler(SeparateRequestsHandler).iter_tasklist_for_dates(
+                datetime_objects, user=self.test_user)
         ]
-        expected_output = [
-            {k:v for k,v in dct.items() if k != 'id'} 
-            for dct in expected_output
-        ]
-        self.assertEquals(expected_output, self.intervalled_tasks_dicts)
 
-    def test_get_tasks_by_timerange_dicts(self): 
-        self.maxDiff = None
-        expected_output = [
-            {'id': 132,
-            'init_date': datetime.datetime(
-                2021, 2, 21, 0, 0, tzinfo=datetime.timezone.utc),
-            'title': 'test task 1',
-            'description': 'bare task without interval and autoshift',
-            'interval': 'no',
-            'autoshift': False,
-            'date': datetime.datetime(
-                2021, 2, 21, 0, 0, tzinfo=datetime.timezone.utc)},
-            {'id': 133,
-            'init_date': datetime.datetime(
-                2021, 2, 20, 0, 0, tzinfo=datetime.timezone.utc),
-            'title': 'test task 2',
-            'description': 'task with interval value "_every_week"',
-            'interval': 'every_week',
-            'autoshift': False,
-            'date': datetime.datetime(
-                2021, 2, 20, 0, 0, tzinfo=datetime.timezone.utc)},
-            {'id': 134,
-            'init_date': datetime.datetime(
-                2021, 3, 2, 0, 0, tzinfo=datetime.timezone.utc),
-            'title': 'test task 4',
-            'description': 'task which is in next month',
-            'interval': 'no',
-            'autoshift': False,
-            'date': datetime.datetime(
-                2021, 3, 2, 0, 0, tzinfo=datetime.timezone.utc)}
-        ]
-        # without id-s
-        self.monthly_tasks_dicts = [
-            {k:v for k,v in dct.items() if k != 'id'}
-            for dct in self.monthly_tasks_dicts
-        ]
-        expected_output = [
-            {k:v for k,v in dct.items() if k != 'id'} 
-            for dct in expected_output
-        ]
-        self.assertEquals(expected_output, self.monthly_tasks_dicts)
+        self.assertEquals(len(from_month_pack), 8)
+        self.assertEquals(from_month_pack, from_separate_requests)
 
-    def test_add_remain_fields(self):
+    def test_iter_tasklist_for_dates(self):
         expected_output = [
             {'init_date':  datetime.datetime.fromisoformat(
                                 '2021-02-21T00:00:00+00:00'),
@@ -1328,7 +1629,46 @@ class TestTaskHandler(TestCase):
                 ]
         self.assertEquals(copy_ramain_fields, copy_expected_output)
   
-    def test_convert_dates_to_strings(self):
+    def test_index_additional_fields(self):
+        def utc(*args):
+            return datetime.datetime(*args, tzinfo=datetime.timezone.utc)
+
+        task_without_files = {'id': 1, 'title': 'without files'}
+        task_with_file = {'id': 2, 'title': 'with a file'}
+        file_ = {'id': 10, 'link': 'file/for/task2', 'related_task_id': 2}
+        additional_fields = {
+            'files': [file_],
+            'completions': [
+                {'id': 20, 'date_completed': utc(2021, 2, 27, 10, 30),
+                 'related_task_id': 2},
+                # the day after the date of the task
+                {'id': 21, 'date_completed': utc(2021, 2, 28),
+                 'related_task_id': 1},
+            ],
+        }
+        files_by_task, completions_by_task_and_date = \
+            self.task_handler._index_additional_fields(additional_fields)
+        self.assertEquals(files_by_task, {2: [file_]})
+        self.assertEquals(completions_by_task_and_date, {
+            (2, datetime.date(2021, 2, 27)): utc(2021, 2, 27, 10, 30),
+            (1, datetime.date(2021, 2, 28)): utc(2021, 2, 28),
+        })
+
+        occurrences = [
+            TaskOccurrence(task_without_files, utc(2021, 2, 27)),
+            TaskOccurrence(task_with_file, utc(2021, 2, 27)),
+            TaskOccurrence(task_with_file, utc(2021, 3, 6)),
+        ]
+        completed = list(self.task_handler._iter_completed_occurrences(
+            occurrences, additional_fields))
+        self.assertEquals(
+            [(occ.task['id'], occ.task['files'], occ.completion)
+             for occ in completed],
+            [(1, [], False),
+             (2, [file_], utc(2021, 2, 27, 10, 30)),
+             (2, [file_], False)])
+
+    def test_encode_dates_to_strings(self):
         expected_output = [
             {'init_date': '2021-02-21T00:00:00+00:00',
             'title': 'test task 1',
@@ -1409,13 +1749,1189 @@ class TestTaskHandler(TestCase):
             ],
             'completion': '2021-03-13T00:00:00+00:00'}
         ]
-        eventual = self.task_handler._convert_dates_to_strings(self.remain_fields)
+        eventual = json.loads(json.dumps(self.remain_fields,
+                                         cls=MonthPackEncoder))
         #  without id-s
         for lst in (eventual, expected_output):
             remove_ids(lst)
         self.assertEquals(eventual, expected_output)
 
 
+class TestMonthPackCache(TestCase):
+    def setUp(self):
+        MonthPackCache._cache().clear()
+        self.test_user = User.objects.create(
+            username="test_user",
+            email='test@user.com',
+            password='1234test',
+        )
+        self.task = Task.objects.create(
+            init_date=datetime.datetime.fromisoformat(
+                "2021-02-10T00:00:00+00:00"),
+            title='test task 1',
+            description='bare task without interval and autoshift',
+            user=self.test_user
+        )
+        self.cache_months(self.test_user)
+
+    def cache_months(self, user):
+        # January, February, March and May of 2021 are cached
+        version = ChangeLog.get_version(user.id)
+        for month in (1, 2, 3, 5):
+            MonthPackCache.set(user.id, version, 2021, month, [])
+
+    def cached_months(self, user=None) -> list:
+        user = user or self.test_user
+        version = ChangeLog.get_version(user.id)
+        return [month for month in (1, 2, 3, 5)
+                if MonthPackCache.get(user.id, version, 2021, month)
+                is not None]
+
+    def test_writes(self):
+        writes = [
+            lambda: DatabaseHandler.create_task_and_related({
+                'init_date': "2021-03-01T00:00:00+00:00",
+                'title': 'new task',
+                'description': '',
+                'interval': 'every_week',
+                'autoshift': False,
+            }, user=self.test_user),
+            lambda: DatabaseHandler.update_task_and_related({
+                'id': self.task.id,
+                'init_date': "2021-05-12T00:00:00+00:00",
+                'title': 'moved task',
+                'description': '',
+                'interval': 'no',
+                'autoshift': False,
+            }, user=self.test_user),
+            lambda: DatabaseHandler.check_uncheck_task({
+                'id': self.task.id,
+                'completion': "2021-05-12T12:00:00+00:00",
+                'date': "2021-05-12T00:00:00+00:00",
+            }),
+            lambda: DatabaseHandler.delete_task(self.task.id,
+                                                self.test_user),
+        ]
+        for write in writes:
+            self.assertEquals(self.cached_months(), [1, 2, 3, 5])
+            write()
+            # every write makes all the cached packs of the user outdated
+            self.assertEquals(self.cached_months(), [])
+            self.cache_months(self.test_user)
+
+    def test_other_user_is_not_affected(self):
+        other_user = User.objects.create(username="other_user",
+                                         email='other@user.com',
+                                         password='1234test')
+        DatabaseHandler.create_task_and_related({
+            'init_date': "2021-02-15T00:00:00+00:00",
+            'title': 'task of other user',
+            'description': '',
+            'interval': 'every_day',
+            'autoshift': False,
+        }, user=other_user)
+        self.assertEquals(self.cached_months(), [1, 2, 3, 5])
+
+    def test_write_while_pack_is_made(self):
+        self.client.force_login(self.test_user)
+        date = '2021-02-01T00:00:00.000+00:00'
+
+        def rename(title):
+            DatabaseHandler.update_tasks_and_related(
+                [{'id': self.task.id, 'title': title}], self.test_user)
+
+        get_month_pack = DatabaseHandler.get_month_pack
+        aget_month_pack = DatabaseHandler.aget_month_pack
+
+        # the tasks are retrieved before the write is committed
+        def get_month_pack_and_write(*args):
+            month_pack = get_month_pack(*args)
+            rename('renamed task')
+            return month_pack
+
+        async def aget_month_pack_and_write(*args):
+            month_pack = await aget_month_pack(*args)
+            await sync_to_async(rename)('renamed task')
+            return month_pack
+
+        for path in ('/getDatePack/', '/getDatePacks/'):
+            MonthPackCache._cache().clear()
+            rename('test task 1')
+            with mock.patch.object(
+                    DatabaseHandler, 'get_month_pack',
+                    side_effect=get_month_pack_and_write), \
+                    mock.patch.object(
+                        DatabaseHandler, 'aget_month_pack',
+                        side_effect=aget_month_pack_and_write):
+                response = self.client.get(path, {'date': date})
+                self.assertIn(b'test task 1',
+                              b''.join(response.streaming_content))
+            etag = response['ETag']
+
+            # the pack made before the write is not served after it, nor
+            # is its ETag taken for the one of the new version
+            response = self.client.get(path, {'date': date},
+                                       HTTP_IF_NONE_MATCH=etag)
+            self.assertEquals(response.status_code, 200)
+            self.assertIn(b'renamed task',
+                          b''.join(response.streaming_content))
+            response = self.client.get(path, {'date': date},
+                                       HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEquals(response.status_code, 304)
+
+
+class TestMonthPackStreamer(TestCase):
+    def test_iter_json(self):
+        dates = DatesHandler.month_grid('2021-02-01T00:00:00+00:00')
+        task_dicts = [
+            {'id': i,
+             'init_date': datetime.datetime(
+                 2021, 2, 1, 12, 30, tzinfo=datetime.timezone.utc),
+             'title': f'task "{i}" п',
+             'date': dates.dates[i % 42],
+             'files': [{'id': i, 'link': 'file', 'related_task_id': i}],
+             'completion': False}
+            for i in range(500)
+        ]
+        expected = json.dumps({
+            'dates': list(dates.isoformats),
+            'tasks': task_dicts
+        }, cls=MonthPackEncoder)
+
+        pieces = list(MonthPackStreamer.iter_json(dates.isoformats,
+                                                  iter(task_dicts)))
+        self.assertGreater(len(pieces), 1)
+        self.assertEquals(''.join(pieces), expected)
+
+        self.assertEquals(
+            ''.join(MonthPackStreamer.iter_json(dates.isoformats, [])),
+            json.dumps({'dates': list(dates.isoformats), 'tasks': []}))
+
+    def test_iter_json_occurrences(self):
+        dates = DatesHandler.month_grid('2021-02-01T00:00:00+00:00')
+        records = [
+            {'id': i,
+             'init_date': datetime.datetime(
+                 2021, 2, 1, 12, 30, tzinfo=datetime.timezone.utc),
+             'title': f'task "{i}" п',
+             'files': [{'id': i, 'link': 'file', 'related_task_id': i}]}
+            for i in range(10)
+        ]
+        records.append({})
+        occurrences = [
+            TaskOccurrence(record, date,
+                           completion=date if i % 3 == 0 else False)
+            for record in records
+            for i, date in enumerate(dates.dates)
+        ]
+        expected = json.dumps({
+            'dates': list(dates.isoformats),
+            'tasks': [occ.as_dict() for occ in occurrences]
+        }, cls=MonthPackEncoder)
+
+        self.assertEquals(
+            ''.join(MonthPackStreamer.iter_json(dates.isoformats,
+                                                iter(occurrences))),
+            expected)
+
+
+class TestChangeLog(TestCase):
+    def setUp(self):
+        self.test_user = User.objects.create(username="test_user")
+        self.task_dict = {
+            'init_date': '2021-02-20T12:00:00+00:00',
+            'title': 'test task',
+            'description': '',
+            'interval': 'no',
+            'autoshift': False,
+            'files': [{'link': 'http://a.com'}],
+        }
+
+    def test_create_and_update(self):
+        self.assertEquals(ChangeLog.get_version(self.test_user.id), 0)
+        [result] = DatabaseHandler.create_tasks_and_related(
+            [self.task_dict], self.test_user)
+        self.assertEquals(ChangeLog.get_version(self.test_user.id), 1)
+
+        changes = ChangeLog.get_changes(self.test_user.id, 0)
+        self.assertFalse(changes['reset'])
+        self.assertEquals([task['id'] for task in changes['tasks']],
+                          [result['id']])
+        [old_file] = changes['files']
+        self.assertEquals(old_file['link'], 'http://a.com')
+
+        DatabaseHandler.update_tasks_and_related(
+            [{'id': result['id'], 'title': 'changed',
+              'files': [{'link': 'http://b.com'}]}], self.test_user)
+        changes = ChangeLog.get_changes(self.test_user.id, 1)
+        self.assertEquals(changes['version'], 2)
+        self.assertEquals(changes['tasks'][0]['title'], 'changed')
+        self.assertEquals([file_['link'] for file_ in changes['files']],
+                          ['http://b.com'])
+        self.assertEquals(changes['deleted']['files'], [old_file['id']])
+
+        # nothing after the current version
+        changes = ChangeLog.get_changes(self.test_user.id, 2)
+        self.assertEquals(changes['tasks'], [])
+        self.assertEquals(changes['deleted']['files'], [])
+
+    def test_completions_and_delete(self):
+        DatabaseHandler.create_task_and_related(self.task_dict,
+                                                self.test_user)
+        task = Task.objects.get(user=self.test_user)
+        DatabaseHandler.check_uncheck_tasks(
+            [{'id': task.id, 'date': '2021-02-20T12:00:00+00:00',
+              'completion': '2021-02-20T13:00:00+00:00'},
+             {'id': task.id, 'date': '2021-02-21T12:00:00+00:00',
+              'completion': False}],
+            self.test_user)
+
+        changes = ChangeLog.get_changes(self.test_user.id, 1)
+        self.assertEquals(changes['tasks'], [])
+        self.assertEquals(
+            [(completion['related_task_id'], completion['day'])
+             for completion in changes['completions']],
+            [(task.id, datetime.date(2021, 2, 20))])
+        self.assertEquals(
+            changes['deleted']['completions'],
+            [{'related_task_id': task.id, 'day': datetime.date(2021, 2, 21)}])
+
+        DatabaseHandler.delete_task(task.id, self.test_user)
+        changes = ChangeLog.get_changes(self.test_user.id, 1)
+        self.assertEquals(changes['deleted']['tasks'], [task.id])
+        # the completions are gone with the task
+        self.assertEquals(changes['completions'], [])
+        self.assertEquals(changes['deleted']['completions'], [])
+
+    def test_reset(self):
+        DatabaseHandler.create_tasks_and_related(
+            [self.task_dict] * 3, self.test_user)
+        with self.settings(TASKMANAGER_MAX_CHANGES=2):
+            self.assertTrue(
+                ChangeLog.get_changes(self.test_user.id, 0)['reset'])
+        # an unknown version
+        self.assertTrue(ChangeLog.get_changes(self.test_user.id, 5)['reset'])
+
+    def test_prune(self):
+        [result] = DatabaseHandler.create_tasks_and_related(
+            [self.task_dict], self.test_user)
+        for title in ('first', 'second', 'third'):
+            DatabaseHandler.update_tasks_and_related(
+                [{'id': result['id'], 'title': title}], self.test_user)
+
+        self.assertEquals(ChangeLog.prune(self.test_user.id, keep=2), 2)
+        self.assertEquals(ChangeLog.prune(self.test_user.id, keep=2), 0)
+        self.assertTrue(ChangeLog.get_changes(self.test_user.id, 1)['reset'])
+        changes = ChangeLog.get_changes(self.test_user.id, 2)
+        self.assertFalse(changes['reset'])
+        self.assertEquals(changes['tasks'][0]['title'], 'third')
+
+        stdout = StringIO()
+        call_command('prune_changes', keep=1, stdout=stdout)
+        self.assertIn('1 entries deleted', stdout.getvalue())
+        self.assertEquals(
+            list(ChangeLogEntry.objects.values_list('version', flat=True)),
+            [4])
+        with self.assertRaises(CommandError):
+            call_command('prune_changes', user=['nobody'], stdout=stdout)
+
+    def test_shift_tasks(self):
+        task = Task.objects.create(
+            init_date=datetime.datetime.fromisoformat(
+                "2021-02-20T12:00:00+00:00"),
+            title='test task', autoshift=True, user=self.test_user)
+        DatabaseHandler.shift_tasks(datetime.datetime.fromisoformat(
+            "2021-02-25T12:00:00+00:00"))
+        changes = ChangeLog.get_changes(self.test_user.id, 0)
+        self.assertEquals([task_['id'] for task_ in changes['tasks']],
+                          [task.id])
+
+
+class TestRequestProfile(TestCase):
+    def test_stacks(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                self.settings(TASKMANAGER_PROFILE_DIR=directory,
+                              TASKMANAGER_PROFILE_INTERVAL=0.001,
+                              TASKMANAGER_PROFILE_STACKS_MAX_BYTES=0):
+            stacks = Path(directory) / RequestProfile.stacks_file
+            for _ in range(2):
+                profile = RequestProfile.start('month', 1)
+                # one request is profiled at a time
+                self.assertIsNone(RequestProfile.start('month', 2))
+                time.sleep(0.05)
+                profile.finish()
+
+            lines = stacks.read_text().splitlines()
+            self.assertTrue(lines)
+            for line in lines:
+                stack, count = line.rsplit(' ', 1)
+                self.assertTrue(stack.startswith('month;'))
+                self.assertIn('test_stacks (tests.py:', stack)
+                self.assertGreater(int(count), 0)
+            # the first stacks are moved aside by the second ones
+            self.assertTrue(Path(f'{stacks}.1').exists())
+            self.assertEquals(len(list(Path(directory).glob('*.prof'))), 2)
+
+
+class TestBenchmarkCommands(TestCase):
+    def test_seed_scale_data(self):
+        call_command('seed_scale_data', users=2, prefix='scale_test',
+                     one_off=3, interval=1, files=2, years=1,
+                     stdout=StringIO())
+        user = User.objects.get(username='scale_test1')
+        tasks = Task.objects.filter(user=user)
+        # one-off tasks and one task of each interval
+        self.assertEquals(tasks.count(), 3 + 5)
+        self.assertEquals(File.objects.filter(related_task__user=user)
+                          .count(), 2 * (3 + 5))
+        # every_day tasks of a year of history
+        self.assertGreater(Completion.objects
+                           .filter(related_task__user=user).count(), 100)
+
+        with self.assertRaises(CommandError):
+            call_command('seed_scale_data', prefix='scale_test',
+                         stdout=StringIO())
+        call_command('seed_scale_data', users=1, prefix='scale_test',
+                     one_off=1, interval=0, replace=True, stdout=StringIO())
+        self.assertEquals(
+            list(User.objects.filter(username__startswith='scale_test')
+                 .values_list('username', flat=True)),
+            ['scale_test0'])
+
+    def test_run_benchmarks(self):
+        call_command('seed_scale_data', prefix='scale_test', one_off=5,
+                     interval=1, years=1, stdout=StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            first = Path(directory) / 'first.json'
+            call_command('run_benchmarks', user='scale_test0', repeat=1,
+                         output=str(first), stdout=StringIO())
+            report = json.loads(first.read_text())
+            self.assertEquals(report['meta']['dataset']['tasks'], 10)
+            self.assertEquals(report['stages']['get_month_pack']['queries'],
+                              3)
+            self.assertIn('endpoint_getDatePack_cold', report['stages'])
+
+            second = Path(directory) / 'second.json'
+            stdout = StringIO()
+            call_command('run_benchmarks', user='scale_test0', repeat=1,
+                         output=str(second), compare=str(first),
+                         stdout=stdout)
+            self.assertIn('(x', stdout.getvalue())
+            self.assertIn('compared_with',
+                          json.loads(second.read_text()))
+
+        with self.assertRaises(CommandError):
+            call_command('run_benchmarks', user='nobody', stdout=StringIO())
+
+
+class TestViews(TestCase):
+    def setUp(self):
+        MonthPackCache._cache().clear()
+        self.test_user = User.objects.create(
+            username="test_user",
+            email='test@user.com',
+            password='1234test',
+        )
+        Task.objects.create(
+            init_date=datetime.datetime.fromisoformat(
+                "2021-02-20T00:00:00.000000+00:00"),
+            title='test task 2',
+            description='task with interval value "_every_week"',
+            interval='every_week',
+            user=self.test_user
+        )
+        self.client.force_login(self.test_user)
+
+    def test_change_date(self):
+        response = self.client.get(
+            '/getDatePack/', {'date': '2021-02-01T00:00:00.000+00:00'})
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response['Content-Type'], 'application/json')
+
+        month_pack = json.loads(b''.join(response.streaming_content))
+        self.assertEquals(
+            month_pack['dates'],
+            DatesHandler.generate_month_dates('2021-02-01T00:00:00+00:00'))
+        self.assertEquals(
+            [(task['date'], task['completion']) for task in month_pack['tasks']],
+            [('2021-02-20T00:00:00+00:00', False),
+             ('2021-02-27T00:00:00+00:00', False),
+             ('2021-03-06T00:00:00+00:00', False),
+             ('2021-03-13T00:00:00+00:00', False)])
+
+    def test_change_dates(self):
+        Task.objects.create(
+            init_date=datetime.datetime.fromisoformat(
+                "2021-03-30T00:00:00.000000+00:00"),
+            title='test task 3',
+            description='task in the days shared by March and April',
+            user=self.test_user
+        )
+        months = ['2021-01-01T00:00:00+00:00', '2021-02-01T00:00:00+00:00',
+                  '2021-03-01T00:00:00+00:00', '2021-04-01T00:00:00+00:00']
+        # February is cached, the other months are generated together
+        self.client.get('/getDatePack/', {'date': months[1]})
+
+        response = self.client.get(
+            '/getDatePacks/', {'date': months[1], 'after': 2})
+        self.assertEquals(response.status_code, 200)
+        packs = json.loads(b''.join(response.streaming_content))['packs']
+
+        MonthPackCache._cache().clear()
+        self.assertEquals(
+            packs,
+            [json.loads(b''.join(self.client.get(
+                '/getDatePack/', {'date': month}).streaming_content))
+             for month in months])
+        # shown on both the March and April pages
+        for pack in packs[2:]:
+            self.assertIn('test task 3',
+                          [task['title'] for task in pack['tasks']])
+
+    def test_change_date_not_modified(self):
+        params = {'date': '2021-02-01T00:00:00.000+00:00'}
+        etag = self.client.get('/getDatePack/', params)['ETag']
+
+        with mock.patch.object(views.task_service, 'iter_tasklist_for_dates',
+                               side_effect=AssertionError('generated')):
+            response = self.client.get('/getDatePack/', params,
+                                       HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 304)
+
+        # another user (e.g. in the same browser) at the same version
+        other_user = User.objects.create(username='other_user')
+        self.assertEquals(ChangeLog.get_version(other_user.id),
+                          ChangeLog.get_version(self.test_user.id))
+        self.client.force_login(other_user)
+        response = self.client.get('/getDatePack/', params,
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 200)
+        self.client.force_login(self.test_user)
+
+        # any change of the tasks gives a new validator
+        task = Task.objects.get(title='test task 2')
+        DatabaseHandler.check_uncheck_task({
+            'id': task.id,
+            'date': '2021-02-27T00:00:00+00:00',
+            'completion': '2021-02-27T10:00:00+00:00'})
+        response = self.client.get('/getDatePack/', params,
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 200)
+        self.assertNotEquals(response['ETag'], etag)
+        etag = response['ETag']
+
+        DatabaseHandler.delete_task(task.id, self.test_user)
+        response = self.client.get('/getDatePack/', params,
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 200)
+
+    def test_tasks_by_id_not_modified(self):
+        task = Task.objects.get(title='test task 2')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/tasks/{task.id}/')
+        self.assertIn('Last-Modified', response)
+        # read once for both the ETag and the Last-Modified
+        self.assertEquals(
+            len([query for query in queries.captured_queries
+                 if query['sql'].startswith('SELECT "taskmanager_task"'
+                                            '."updated_at"')]),
+            1)
+
+        response = self.client.get(f'/tasks/{task.id}/',
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEquals(response.status_code, 304)
+
+        etag = response['ETag']
+        DatabaseHandler.update_task_and_related(
+            {'id': task.id, 'init_date': '2021-02-20T00:00:00+00:00',
+             'title': 'changed', 'description': '', 'interval': 'every_week',
+             'autoshift': False},
+            self.test_user)
+        response = self.client.get(f'/tasks/{task.id}/',
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.json()['title'], 'changed')
+
+    def test_tasks_batch(self):
+        response = self.client.post(
+            '/tasks/batch/',
+            [{'init_date': '2021-02-10T00:00:00+00:00', 'title': 'new task'},
+             {'title': 'no date'}],
+            content_type='application/json')
+        self.assertEquals(response.status_code, 201)
+        results = response.json()['results']
+        self.assertEquals([list(result) for result in results],
+                          [['id'], ['errors']])
+
+        response = self.client.put(
+            '/tasks/batch/', [{'id': results[0]['id'], 'title': 'renamed'}],
+            content_type='application/json')
+        self.assertEquals(response.json()['results'],
+                          [{'id': results[0]['id']}])
+        self.assertEquals(Task.objects.get(id=results[0]['id']).title,
+                          'renamed')
+
+        response = self.client.post('/tasks/batch/', {'title': 'not a list'},
+                                    content_type='application/json')
+        self.assertEquals(response.status_code, 400)
+
+    def test_completions_batch(self):
+        task = Task.objects.get(title='test task 2')
+        response = self.client.put(
+            '/tasks/completions/',
+            [{'id': task.id, 'date': '2021-02-27T00:00:00+00:00',
+              'completion': '2021-02-27T10:00:00+00:00'}],
+            content_type='application/json')
+        self.assertEquals(response.status_code, 201)
+        self.assertEquals(response.json()['results'], [{'id': task.id}])
+        self.assertTrue(Completion.objects.filter(related_task=task).exists())
+
+    def test_change_date_shifts_tasks_lazily(self):
+        def create_overdue_task():
+            return Task.objects.create(
+                init_date=datetime.datetime.fromisoformat(
+                    "2021-02-10T10:00:00+00:00"),
+                title='overdue',
+                autoshift=True,
+                user=self.test_user)
+        params = {'date': '2021-02-01T00:00:00.000+00:00'}
+
+        shifted_task = create_overdue_task()
+        self.client.get('/getDatePack/', params)
+        shifted_task.refresh_from_db()
+        today, _ = DatesHandler.day_bounds(timezone.now())
+        self.assertEquals(shifted_task.init_date, today)
+
+        # only once a day
+        task = create_overdue_task()
+        with mock.patch.object(AutoshiftHandler, 'iter_batches',
+                               side_effect=AssertionError('shifted')):
+            self.client.get('/getDatePack/', params)
+        task.refresh_from_db()
+        self.assertEquals(task.init_date.isoformat(),
+                          '2021-02-10T10:00:00+00:00')
+
+        with override_settings(TASKMANAGER_LAZY_AUTOSHIFT=False):
+            MonthPackCache._cache().clear()
+            self.client.get('/getDatePack/', params)
+        task.refresh_from_db()
+        self.assertEquals(task.init_date.isoformat(),
+                          '2021-02-10T10:00:00+00:00')
+
+    def test_login_required(self):
+        self.client.logout()
+        for url in ('/getDatePack/?date=2021-02-01T00:00:00.000%2B00:00',
+                    '/tasks/', '/tasks/1/'):
+            response = self.client.get(url)
+            self.assertEquals(response.status_code, 302)
+            self.assertTrue(response['Location'].startswith(
+                settings.LOGIN_URL))
+
+    def test_token_authentication(self):
+        url = '/getDatePacks/?date=2021-02-01T00:00:00.000%2B00:00'
+        self.client.get(url)  # caches the month packs
+        with CaptureQueriesContext(connection) as session_queries:
+            self.client.get(url)
+        self.client.logout()
+        token = ApiToken.for_user(self.test_user)
+        # the session is not loaded (the user is cached, see
+        # accounts.backends.CachedModelBackend)
+        with CaptureQueriesContext(connection) as token_queries:
+            response = self.client.get(
+                url, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(len(token_queries), len(session_queries) - 1)
+        self.assertFalse(any('auth_user' in query['sql']
+                             for query in token_queries.captured_queries))
+
+        task = Task.objects.get(user=self.test_user)
+        response = self.client.get(
+            f'/tasks/{task.id}/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.json()['title'], 'test task 2')
+        self.assertNotIn('sessionid', response.cookies)
+
+        response = self.client.get(
+            f'/tasks/{task.id}/', HTTP_AUTHORIZATION=f'Bearer {token}x')
+        self.assertEquals(response.status_code, 401)
+
+        # the views outside of the API ignore the token
+        response = self.client.get(
+            '/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEquals(response.status_code, 302)
+
+    def test_token_authentication_expired(self):
+        self.client.logout()
+        token = ApiToken.for_user(self.test_user)
+        with self.settings(TASKMANAGER_API_TOKEN_MAX_AGE=-1):
+            response = self.client.get(
+                '/getDatePack/?date=2021-02-01T00:00:00.000%2B00:00',
+                HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEquals(response.status_code, 401)
+
+    def test_token_of_revoked_or_inactive_user(self):
+        self.client.logout()
+        url = '/getDatePack/?date=2021-02-01T00:00:00.000%2B00:00'
+        token = ApiToken.for_user(self.test_user)
+        response = self.client.post('/api/token/revoke/',
+                                    HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEquals(response.status_code, 204)
+        response = self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEquals(response.status_code, 401)
+
+        # the tokens issued after the revocation are valid
+        token = ApiToken.for_user(User.objects.get(id=self.test_user.id))
+        response = self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEquals(response.status_code, 200)
+
+        self.test_user.is_active = False
+        self.test_user.save()
+        response = self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEquals(response.status_code, 401)
+
+        self.test_user.delete()
+        response = self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEquals(response.status_code, 401)
+
+    def test_api_token(self):
+        self.test_user.set_password('1234test')
+        self.test_user.save()
+        response = self.client.post(
+            '/api/token/',
+            json.dumps({'username': 'test_user', 'password': '1234test'}),
+            content_type='application/json')
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(ApiToken.get_user(response.json()['token']),
+                          self.test_user)
+
+        response = self.client.post(
+            '/api/token/',
+            json.dumps({'username': 'test_user', 'password': 'wrong'}),
+            content_type='application/json')
+        self.assertEquals(response.status_code, 401)
+        response = self.client.post('/api/token/', 'x',
+                                    content_type='application/json')
+        self.assertEquals(response.status_code, 400)
+
+    def test_changes(self):
+        response = self.client.get('/changes/')
+        self.assertEquals(response.json(), {'version': 0, 'reset': True})
+
+        task = Task.objects.get(user=self.test_user)
+        DatabaseHandler.delete_task(task.id, self.test_user)
+        response = self.client.get('/changes/', {'since': 0})
+        self.assertEquals(response.status_code, 200)
+        changes = response.json()
+        self.assertEquals(changes['version'], 1)
+        self.assertEquals(changes['deleted']['tasks'], [task.id])
+
+        for since in ('one', -1):
+            response = self.client.get('/changes/', {'since': since})
+            self.assertEquals(response.status_code, 400)
+
+    @override_settings(TASKMANAGER_SERVER_TIMING=True)
+    def test_server_timing(self):
+        with self.assertLogs('taskmanager.timing', 'INFO') as logs:
+            response = self.client.get(
+                '/getDatePacks/', {'date': '2021-02-01T00:00:00.000+00:00'})
+            self.assertEquals(logs.output, [])
+            # the log line is written when the stream is sent
+            b''.join(response.streaming_content)
+
+        header = response['Server-Timing']
+        self.assertIn('db.get_month_pack;dur=', header)
+        self.assertIn('tasks.iter_tasklist_for_dates;dur=', header)
+        self.assertTrue(header.split(', ')[-1].startswith('total;dur='))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEquals(record['path'], '/getDatePacks/?date='
+                          '2021-02-01T00%3A00%3A00.000%2B00%3A00')
+        self.assertEquals(record['stages']['db.get_month_pack']['queries'], 3)
+        self.assertGreater(record['stages']['json.encode']['rows'], 0)
+
+        # the async views
+        with self.assertLogs('taskmanager.timing', 'INFO'):
+            response = self.client.get(
+                '/getDatePack/', {'date': '2021-06-01T00:00:00.000+00:00'})
+            b''.join(response.streaming_content)
+        self.assertIn('db.aget_month_pack;dur=', response['Server-Timing'])
+
+    def test_server_timing_disabled(self):
+        response = self.client.get(
+            '/getDatePack/', {'date': '2021-02-01T00:00:00.000+00:00'})
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(TASKMANAGER_SERVER_TIMING=True)
+    def test_debug_timings(self):
+        with self.assertLogs('taskmanager.timing', 'INFO'):
+            self.client.get('/tasks/1000/')
+        response = self.client.get('/debug/timings/')
+        self.assertEquals(response.status_code, 404)
+
+        self.test_user.is_staff = True
+        self.test_user.save()
+        with self.settings(DEBUG=True), \
+                self.assertLogs('taskmanager.timing', 'INFO'):
+            response = self.client.get('/debug/timings/')
+        self.assertEquals(response.status_code, 200)
+        self.assertContains(response, '/tasks/1000/')
+
+    def test_profiling(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                self.settings(TASKMANAGER_PROFILE_DIR=directory,
+                              TASKMANAGER_PROFILE_KEY='secret',
+                              TASKMANAGER_PROFILE_KEEP=2):
+            profiles = Path(directory)
+            response = self.client.get('/tasks/1000/')
+            self.assertFalse(response.has_header('X-Profile'))
+            response = self.client.get('/tasks/1000/',
+                                       HTTP_X_PROFILE_KEY='wrong')
+            self.assertFalse(response.has_header('X-Profile'))
+            self.assertEquals(list(profiles.iterdir()), [])
+
+            # the stream is profiled until it is finished
+            response = self.client.get(
+                '/getDatePack/', {'date': '2021-02-01T00:00:00.000+00:00'},
+                HTTP_X_PROFILE_KEY='secret')
+            self.assertEquals(list(profiles.glob('*.prof')), [])
+            b''.join(response.streaming_content)
+            dump = profiles / response['X-Profile']
+            self.assertTrue(dump.name.endswith(
+                f'-change_date-user{self.test_user.id}.prof'))
+            functions = [name for _, _, name in pstats.Stats(
+                str(dump)).stats]
+            self.assertIn('_chunked', functions)
+
+            # or until it is closed if it is never iterated
+            response = self.client.get(
+                '/getDatePack/', {'date': '2021-02-01T00:00:00.000+00:00'},
+                HTTP_X_PROFILE_KEY='secret')
+            response.close()
+            self.assertTrue((profiles / response['X-Profile']).exists())
+
+            # the views of the other apps are not profiled
+            response = self.client.get('/accounts/login/',
+                                       HTTP_X_PROFILE_KEY='secret')
+            self.assertFalse(response.has_header('X-Profile'))
+
+            # the sampled requests are profiled without telling the client
+            with self.settings(TASKMANAGER_PROFILE_SAMPLE_RATE=1):
+                for _ in range(2):
+                    response = self.client.get('/tasks/1000/')
+                    self.assertFalse(response.has_header('X-Profile'))
+            # the oldest dump is removed
+            self.assertEquals(len(list(profiles.glob('*.prof'))), 2)
+            self.assertFalse(dump.exists())
+
+    def test_change_dates_bad_request(self):
+        for params in ({'before': 'one'}, {'after': -1},
+                       {'after': settings.TASKMANAGER_MAX_ADJACENT_MONTHS + 1}):
+            response = self.client.get(
+                '/getDatePacks/',
+                {'date': '2021-02-01T00:00:00.000+00:00', **params})
+            self.assertEquals(response.status_code, 400)
+
+
+@override_settings(TASKMANAGER_MATERIALIZE_OCCURRENCES=True,
+                   TASKMANAGER_OCCURRENCE_HORIZON_DAYS=30)
+class TestOccurrences(TestCase):
+    def setUp(self):
+        self.test_user = User.objects.create(
+            username="test_user",
+            email='test@user.com',
+            password='1234test',
+        )
+        self.task_2 = Task.objects.create(
+            init_date=datetime.datetime.fromisoformat(
+                "2021-02-20T00:00:00.000000+00:00"),
+            title='test task 2',
+            description='task with interval value "_every_week"',
+            interval='every_week',
+            user=self.test_user
+        )
+        self.task_5 = Task.objects.create(
+            init_date=datetime.datetime.fromisoformat(
+                "2021-01-01T00:00:00.000000+00:00"),
+            title='test task 5',
+            description='with interval from previous month',
+            interval='every_month',
+            user=self.test_user
+        )
+        Completion.objects.create(
+            date_completed=datetime.datetime(
+                2021, 3, 1, 0, 0, tzinfo=datetime.timezone.utc),
+            related_task=self.task_5
+        )
+        self.datetime_objects = DatesHandler.generate_month_dates(
+            '2021-02-01T00:00:00+00:00', as_objects=True)
+        self.date_range = (self.datetime_objects[0],
+                           self.datetime_objects[-1])
+
+    def generated(self) -> list:
+        intervalled_tasks = DatabaseHandler.get_intervalled_tasks(
+            self.date_range, user=self.test_user)
+        return RepeatingTasksGenerator.generate(self.datetime_objects,
+                                                intervalled_tasks)
+
+    def test_get_occurrences(self):
+        occurrences = DatabaseHandler.get_occurrences(self.date_range,
+                                                      user=self.test_user)
+        self.assertEquals(occurrences, self.generated())
+        # stored ahead of the last date of the range
+        self.assertEquals(OccurrenceHandler.get_horizon(self.test_user.id),
+                          datetime.date(2021, 4, 13))
+
+    def test_stored_on_task_writes(self):
+        OccurrenceHandler.extend(self.test_user.id,
+                                 datetime.date(2021, 4, 13))
+
+        DatabaseHandler.create_task_and_related({
+            'init_date': "2021-02-25T00:00:00+00:00",
+            'title': 'new task',
+            'description': '',
+            'interval': 'every_day',
+            'autoshift': False,
+        }, user=self.test_user)
+        DatabaseHandler.update_task_and_related({
+            'id': self.task_2.id,
+            'init_date': "2021-02-21T00:00:00+00:00",
+            'title': 'test task 2',
+            'description': '',
+            'interval': 'every_week',
+            'autoshift': False,
+        }, user=self.test_user)
+
+        with self.assertNumQueries(2):
+            occurrences = DatabaseHandler.get_occurrences(
+                self.date_range, user=self.test_user)
+        self.assertEquals(occurrences, self.generated())
+
+    def test_extended_for_further_months(self):
+        OccurrenceHandler.extend(self.test_user.id,
+                                 datetime.date(2021, 3, 1))
+
+        month_pack = DatabaseHandler.get_month_pack(self.date_range,
+                                                    user=self.test_user)
+        self.assertEquals(month_pack['repetitions'], self.generated())
+        self.assertEquals(OccurrenceHandler.get_horizon(self.test_user.id),
+                          datetime.date(2021, 4, 13))
+
+    def test_not_stored_far_ahead(self):
+        datetime_objects = DatesHandler.generate_month_dates(
+            (timezone.now() + datetime.timedelta(days=90)).isoformat(),
+            as_objects=True)
+        date_range = (datetime_objects[0], datetime_objects[-1])
+        month_pack = DatabaseHandler.get_month_pack(date_range,
+                                                    user=self.test_user)
+        self.assertNotIn('repetitions', month_pack)
+        self.assertTrue(month_pack['intervalled_tasks'])
+        month_pack = async_to_sync(DatabaseHandler.aget_month_pack)(
+            date_range, user=self.test_user)
+        self.assertNotIn('repetitions', month_pack)
+        self.assertFalse(Occurrence.objects.exists())
+
+    def test_month_pack_of_stored(self):
+        # repeats on no date of the range
+        Task.objects.create(
+            init_date=datetime.datetime.fromisoformat(
+                "2020-06-15T00:00:00+00:00"),
+            title='test task 6',
+            interval='every_year',
+            user=self.test_user)
+        OccurrenceHandler.extend(self.test_user.id,
+                                 datetime.date(2021, 4, 13))
+
+        with CaptureQueriesContext(connection) as queries:
+            month_pack = DatabaseHandler.get_month_pack(self.date_range,
+                                                        user=self.test_user)
+        # the horizon, the tasks, the files, the completions and the
+        # repetitions
+        self.assertEquals(len(queries), 5)
+        self.assertEquals(month_pack['repetitions'], self.generated())
+        self.assertEquals(month_pack['intervalled_tasks'], [])
+        self.assertEquals(month_pack['completions'][0]['related_task_id'],
+                          self.task_5.id)
+        self.assertEquals(
+            month_pack,
+            async_to_sync(DatabaseHandler.aget_month_pack)(
+                self.date_range, user=self.test_user))
+
+    def test_iter_tasklist_for_dates(self):
+        OccurrenceHandler.extend(self.test_user.id,
+                                 datetime.date(2021, 4, 13))
+        task_handler = TaskHandler(db_service=DatabaseHandler)
+        stored = [occurrence.as_dict() for occurrence
+                  in task_handler.iter_tasklist_for_dates(
+                      self.datetime_objects, user=self.test_user)]
+        with self.settings(TASKMANAGER_MATERIALIZE_OCCURRENCES=False):
+            generated = [occurrence.as_dict() for occurrence
+                         in task_handler.iter_tasklist_for_dates(
+                             self.datetime_objects, user=self.test_user)]
+        self.assertEquals(stored, generated)
+
+    def test_rebuild_occurrences_command(self):
+        call_command('rebuild_occurrences', horizon=10, stdout=StringIO())
+        self.assertTrue(OccurrenceHorizon.objects
+                        .filter(user=self.test_user).exists())
+        self.assertTrue(Occurrence.objects.filter(task=self.task_2).exists())
+
+        horizon = OccurrenceHandler.get_horizon(self.test_user.id)
+        call_command('rebuild_occurrences', horizon=20, extend=True,
+                     stdout=StringIO())
+        self.assertEquals(OccurrenceHandler.get_horizon(self.test_user.id),
+                          horizon + datetime.timedelta(days=10))
+
+
+@override_settings(TASKMANAGER_CONCURRENT_QUERIES=True)
+class TestConcurrentQueries(TransactionTestCase):
+    """ The queries run in their own threads, so the data must be
+    committed to be seen by them.
+    """
+
+    def test_aget_month_pack(self):
+        test_user = User.objects.create(username="test_user")
+        task = Task.objects.create(
+            init_date=datetime.datetime.fromisoformat(
+                "2021-02-20T00:00:00+00:00"),
+            title='task with interval',
+            interval='every_week',
+            user=test_user)
+        File.objects.create(link='file', related_task=task)
+        Completion.objects.create(
+            date_completed=datetime.datetime.fromisoformat(
+                "2021-02-27T10:00:00+00:00"),
+            related_task=task)
+        date_range = (
+            datetime.datetime.fromisoformat("2021-02-01T00:00:00+00:00"),
+            datetime.datetime.fromisoformat("2021-03-14T00:00:00+00:00"),
+        )
+
+        month_pack = async_to_sync(DatabaseHandler.aget_month_pack)(
+            date_range, user=test_user)
+        self.assertEquals(
+            month_pack,
+            DatabaseHandler.get_month_pack(date_range, user=test_user))
+        self.assertEquals(len(month_pack['completions']), 1)
+
+
+class TestEventStream(TransactionTestCase):
+    """ The changes are published when the transactions are committed."""
+
+    def setUp(self):
+        self.test_user = User.objects.create(username="test_user")
+        self.task_dict = {
+            'init_date': '2021-02-20T12:00:00+00:00',
+            'title': 'test task',
+            'description': '',
+            'interval': 'no',
+            'autoshift': False,
+        }
+
+    def stream(self, headers: list, write=None, method='GET',
+               query_string=b'') -> list:
+        """ Opens the event stream with the `headers`, makes the `write`
+        (a sync function) and returns the messages sent by the stream.
+        """
+        scope = {'type': 'http', 'method': method, 'path': '/events/',
+                 'query_string': query_string, 'headers': headers}
+        sent = []
+
+        async def run():
+            disconnect = asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+
+            async def wait_for_events(count):
+                for _ in range(100):
+                    if stream.done() or sum(message.get('body', b'').startswith(b'event:')
+                           for message in sent) >= count:
+                        return
+                    await asyncio.sleep(0.01)
+
+            stream = asyncio.ensure_future(
+                events.EventStreamApp()(scope, receive, send))
+            await wait_for_events(1)
+            if write is not None:
+                await sync_to_async(write)()
+                await wait_for_events(2)
+            disconnect.set()
+            await stream
+
+        async_to_sync(run)()
+        return sent
+
+    def test_broker(self):
+        broker = InProcessBroker()
+
+        async def run():
+            subscription = broker.subscribe(self.test_user.id)
+            await sync_to_async(broker.publish, thread_sensitive=False)(
+                self.test_user.id, {'version': 1})
+            message = await asyncio.wait_for(subscription.get(), 1)
+            broker.unsubscribe(subscription)
+            return message
+
+        self.assertEquals(async_to_sync(run)(), {'version': 1})
+        self.assertEquals(broker._subscriptions, {})
+
+    def test_token_stream(self):
+        token = ApiToken.for_user(self.test_user)
+        sent = self.stream(
+            [(b'authorization', f'Bearer {token}'.encode())],
+            lambda: DatabaseHandler.create_task_and_related(
+                self.task_dict, self.test_user))
+
+        self.assertEquals(sent[0]['status'], 200)
+        self.assertEquals([message['body'] for message in sent[1:]],
+                          [b'event: tasks\ndata: {"version": 0}\n\n',
+                           b'event: tasks\ndata: {"version": 1}\n\n'])
+        self.assertEquals(get_broker()._subscriptions, {})
+
+    def test_ticket_stream(self):
+        token = ApiToken.for_user(self.test_user)
+        response = self.client.post('/api/events/ticket/',
+                                    HTTP_AUTHORIZATION=f'Bearer {token}')
+        ticket = response.json()['ticket']
+        self.assertNotIn(token, ticket)
+
+        query_string = f'ticket={ticket}'.encode()
+        sent = self.stream([], query_string=query_string)
+        self.assertEquals(sent[0]['status'], 200)
+        # a ticket is accepted once only
+        sent = self.stream([], query_string=query_string)
+        self.assertEquals(sent[0]['status'], 401)
+
+        ticket = StreamTicket.for_user(self.test_user)
+        with self.settings(TASKMANAGER_PUSH_TICKET_MAX_AGE=-1):
+            sent = self.stream([], query_string=f'ticket={ticket}'.encode())
+        self.assertEquals(sent[0]['status'], 401)
+
+    def test_head(self):
+        token = ApiToken.for_user(self.test_user)
+        sent = self.stream([(b'authorization', f'Bearer {token}'.encode())],
+                           method='HEAD')
+        self.assertEquals(sent[0]['status'], 200)
+        self.assertEquals(sent[1:], [{'type': 'http.response.body',
+                                      'body': b''}])
+        self.assertEquals(get_broker()._subscriptions, {})
+
+    def test_session_stream(self):
+        self.client.force_login(self.test_user)
+        sessionid = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        sent = self.stream(
+            [(b'cookie', f'{settings.SESSION_COOKIE_NAME}={sessionid}'
+              .encode())])
+        self.assertEquals(sent[0]['status'], 200)
+
+    def test_unauthorized(self):
+        for headers in ([], [(b'authorization', b'Bearer forged')]):
+            sent = self.stream(headers)
+            self.assertEquals(sent[0]['status'], 401)
+        # the API tokens are not taken from the URL
+        token = ApiToken.for_user(self.test_user)
+        sent = self.stream([], query_string=f'token={token}'.encode())
+        self.assertEquals(sent[0]['status'], 401)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'query plans of SQLite')
+class TestQueryPlans(TestCase):
+    """ The hot queries of DatabaseHandler use the dedicated indexes."""
+
+    def setUp(self):
+        self.test_user = User.objects.create(
+            username="test_user",
+            email='test@user.com',
+            password='1234test',
+        )
+        self.date_range = (
+            datetime.datetime.fromisoformat("2021-02-01T00:00:00+00:00"),
+            datetime.datetime.fromisoformat("2021-03-14T00:00:00+00:00"),
+        )
+
+    def explain(self, func) -> list:
+        """ Runs `func` and returns the (SQL, query plan) of every query
+        it makes.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                cursor.execute(f'EXPLAIN QUERY PLAN {query["sql"]}')
+                plans.append((query['sql'], ' '.join(
+                    str(row[-1]) for row in cursor.fetchall())))
+        return plans
+
+    def assertUsesIndex(self, func, table, index_name):
+        """ The queries of `func` reading `table` use the index."""
+        plans = [plan for sql, plan in self.explain(func)
+                 if f'FROM "{table}"' in sql]
+        self.assertTrue(plans)
+        for plan in plans:
+            self.assertIn(index_name, plan)
+
+    def test_month_pack(self):
+        task = Task.objects.create(init_date=self.date_range[0],
+                                   title='task', interval='every_day',
+                                   user=self.test_user)
+        File.objects.create(link='file', related_task=task)
+        Completion.objects.create(date_completed=self.date_range[0],
+                                  related_task=task)
+
+        def get_month_pack():
+            DatabaseHandler.get_month_pack(self.date_range, self.test_user)
+
+        self.assertUsesIndex(get_month_pack, 'taskmanager_task',
+                             'task_user_init_date_idx')
+        self.assertUsesIndex(get_month_pack, 'taskmanager_completion',
+                             'completion_task_date_idx')
+
+    def test_tasks_by_timerange(self):
+        self.assertUsesIndex(
+            lambda: DatabaseHandler.get_tasks_by_timerange(self.date_range,
+                                                           self.test_user),
+            'taskmanager_task', 'task_user_init_date_idx')
+
+    def test_intervalled_tasks(self):
+        self.assertUsesIndex(
+            lambda: DatabaseHandler.get_intervalled_tasks(self.date_range,
+                                                          self.test_user),
+            'taskmanager_task', 'task_user_interval_idx')
+
+    def test_shiftable_tasks(self):
+        Task.objects.create(init_date=self.date_range[0], title='task',
+                            autoshift=True, user=self.test_user)
+
+        def shift_tasks():
+            DatabaseHandler.shift_tasks(self.date_range[1])
+
+        # the batches are selected by the index (and then the tasks of a
+        # batch are checked again by their ids)
+        plans = [plan for sql, plan in self.explain(shift_tasks)
+                 if 'FROM "taskmanager_task"' in sql and
+                 '"taskmanager_task"."id" IN' not in sql]
+        self.assertTrue(plans)
+        for plan in plans:
+            self.assertIn('task_autoshift_idx', plan)
+        # the completions of the tasks in the NOT EXISTS subquery
+        self.assertUsesIndex(shift_tasks, 'taskmanager_task',
+                             'completion_task_date_idx')
+
+    def test_completions_of_day(self):
+        task = Task.objects.create(init_date=self.date_range[0],
+                                   title='task', user=self.test_user)
+        self.assertUsesIndex(
+            lambda: DatabaseHandler.check_uncheck_task({
+                'id': task.id,
+                'date': self.date_range[0].isoformat(),
+                'completion': False,
+            }),
+            'taskmanager_completion', 'completion_task_date_idx')
+
 
 def remove_ids(dicts_list: list) -> list:
     #Remove (recursively) keys with names 'id' and 'related_task_id'
@@ -4,7 +4,18 @@ from . import views
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('api/token/', views.api_token, name='api_token'),
+    path('api/token/revoke/', views.api_token_revoke,
+         name='api_token_revoke'),
+    path('api/events/ticket/', views.api_events_ticket,
+         name='api_events_ticket'),
     path('getDatePack/', views.change_date, name='change_date'),
+    path('getDatePacks/', views.change_dates, name='change_dates'),
     path('tasks/', views.tasks, name='tasks'),
+    path('tasks/batch/', views.tasks_batch, name='tasks_batch'),
+    path('tasks/completions/', views.completions_batch,
+         name='completions_batch'),
     path('tasks/<int:task_id>/', views.tasks_by_id, name='tasks_by_id'),
+    path('changes/', views.changes, name='changes'),
+    path('debug/timings/', views.debug_timings, name='debug_timings'),
 ]
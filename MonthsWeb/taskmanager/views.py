@@ -1,20 +1,105 @@
+import asyncio
+import functools
+import hashlib
 import json
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import authenticate
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
+from django.http import (Http404, HttpResponse, HttpResponseBadRequest,
+                         StreamingHttpResponse)
 from django.http.response import JsonResponse
 from django.shortcuts import render
 from django.utils.translation import get_language
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_POST
 
+from .decorators import (async_condition, async_login_required,
+                         token_auth_allowed)
 from .models import Task
+from .services import timingservice
+from .services.autoshiftservice import AutoshiftHandler
+from .services.cacheservice import MonthPackCache
+from .services.changelogservice import ChangeLog
 from .services.dbservice import DatabaseHandler
 from .services.dateservice import DatesHandler
+from .services.jsonservice import MonthPackStreamer
 from .services.taskservice import TaskHandler
+from .services.tokenservice import ApiToken, StreamTicket
 
 
 task_service = TaskHandler(db_service=DatabaseHandler)
 
 
+def _shift_tasks_lazily(view):
+    """ Decorator shifting the tasks of the user on the first request of
+    the day (see `AutoshiftHandler.shift_lazily()`) before the view and
+    its validators see them.
+    """
+    if asyncio.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if settings.TASKMANAGER_LAZY_AUTOSHIFT:
+                await sync_to_async(AutoshiftHandler.shift_lazily)(
+                    request.user.id)
+            return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if settings.TASKMANAGER_LAZY_AUTOSHIFT:
+            AutoshiftHandler.shift_lazily(request.user.id)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _tasks_version(request) -> int:
+    """ The version of the user's tasks (see `ChangeLog`), read once per
+    request: the ETag and the month packs of a response are of the same
+    version (see `MonthPackCache`).
+    """
+    if not hasattr(request, '_tasks_version'):
+        request._tasks_version = ChangeLog.get_version(request.user.id)
+    return request._tasks_version
+
+
+def _tasks_etag(request, *args, **kwargs):
+    """ ETag of the month packs: changes with the user, the requested
+    dates and the version of the user's tasks. Computed without
+    generating the tasks, so that unchanged packs are answered with 304.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    # the versions of different users may be the same, and a browser
+    # may keep the responses of one user for the next one
+    version = (f'{request.user.id}:{request.get_full_path()}:'
+               f'{_tasks_version(request)}')
+    return hashlib.md5(version.encode()).hexdigest()
+
+
+def _task_etag(request, task_id):
+    """ ETag of a task: changes with every change of the task."""
+    last_change = _task_last_modified(request, task_id)
+    if last_change is None:
+        return None
+    return hashlib.md5(f'{task_id}:{last_change}'.encode()).hexdigest()
+
+
+def _task_last_modified(request, task_id):
+    """ Time of the last change of a task (for GET requests only), read
+    once per request: both the ETag and the Last-Modified need it.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    if not hasattr(request, '_task_last_modified'):
+        request._task_last_modified = Task.objects\
+            .values_list('updated_at', flat=True)\
+            .filter(id=task_id, user=request.user)\
+            .first()
+    return request._task_last_modified
+
+
 @login_required
 def index(request):
     """ Index page and also the entry point for the js app. """
@@ -24,54 +109,260 @@ def index(request):
 
 
 @login_required
-def change_date(request):
+def debug_timings(request):
+    """ The stages of the latest requests (see `ServerTimingMiddleware`),
+    shown to the staff when DEBUG is on.
+    """
+    if not settings.DEBUG or not request.user.is_staff:
+        raise Http404
+    context = {
+        'enabled': settings.TASKMANAGER_SERVER_TIMING,
+        'records': timingservice.get_recent(),
+    }
+    return render(request, 'taskmanager/timings.html', context)
+
+
+@csrf_exempt
+@require_POST
+def api_token(request):
+    """ Issues a token for the JSON API (sent in the header
+    "Authorization: Bearer <token>" instead of the session cookie) to the
+    user whose credentials are submitted as a json object:
+    {"username": ..., "password": ...}.
+    """
+    try:
+        credentials = json.loads(request.body)
+        username = credentials['username']
+        password = credentials['password']
+    except (ValueError, TypeError, KeyError):
+        return HttpResponseBadRequest()
+
+    user = authenticate(request, username=username, password=password)
+    if user is None:
+        return HttpResponse(status=401)
+    return JsonResponse({
+        'token': ApiToken.for_user(user),
+        'expires_in': settings.TASKMANAGER_API_TOKEN_MAX_AGE,
+    })
+
+
+@token_auth_allowed
+@login_required
+@require_POST
+def api_token_revoke(request):
+    """ Revokes all the tokens of the user for the JSON API (the token of
+    the request too).
+    """
+    ApiToken.revoke(request.user)
+    return HttpResponse(status=204)
+
+
+@token_auth_allowed
+@login_required
+@require_POST
+def api_events_ticket(request):
+    """ Issues a ticket to open the event stream of the user's changes
+    (see `events.EventStreamApp`) as ?ticket=<ticket>.
+    """
+    return JsonResponse({
+        'ticket': StreamTicket.for_user(request.user),
+        'expires_in': settings.TASKMANAGER_PUSH_TICKET_MAX_AGE,
+    })
+
+
+@token_auth_allowed
+@async_login_required
+@_shift_tasks_lazily
+@async_condition(etag_func=_tasks_etag)
+async def change_date(request):
     """ Returns json with tasks and dates (as isoformat strings) for the
     date given in the get-request parameter. E.g.:
     "getDatePack/?date=2021-06-01T00%3A00%3A00.000%2B00%3A00"
     """
     date = request.GET['date']
 
-    dates_objects = DatesHandler.generate_month_dates(date, as_objects=True)
-    dates_strings = [dt.isoformat() for dt in dates_objects]
-    task_dicts = task_service.generate_tasklist_for_dates(dates_objects,
-                                                          user=request.user)
+    grid = DatesHandler.month_grid(date)
 
-    change_month_pack = {
-        'dates': dates_strings,
-        'tasks': task_dicts
-    }
+    # read before the tasks (see `MonthPackCache`)
+    version = await sync_to_async(_tasks_version)(request)
+    task_dicts = await sync_to_async(MonthPackCache.get)(
+        request.user.id, version, grid.year, grid.month)
+    if task_dicts is None:
+        # the queries are awaited, the tasks are made of their results
+        month_pack = await DatabaseHandler.aget_month_pack(
+            (grid.dates[0], grid.dates[-1]), request.user)
+        task_dicts = list(task_service.iter_tasklist_for_dates(
+            grid.dates, user=request.user, month_pack=month_pack))
+        await sync_to_async(MonthPackCache.set)(
+            request.user.id, version, grid.year, grid.month, task_dicts)
 
-    return JsonResponse(change_month_pack)
+    # {"dates": [...], "tasks": [...]} written piece by piece
+    return StreamingHttpResponse(
+        MonthPackStreamer.iter_json(grid.isoformats, task_dicts),
+        content_type='application/json')
 
 
+@token_auth_allowed
 @login_required
-def tasks(request):
+@_shift_tasks_lazily
+@condition(etag_func=_tasks_etag)
+def change_dates(request):
+    """ Returns json with the month packs (tasks and dates) of several
+    consecutive months: the month of the date given in the get-request
+    parameter and the `before` and `after` months adjacent to it (one of
+    each by default). E.g.:
+    "getDatePacks/?date=2021-06-01T00%3A00%3A00.000%2B00%3A00&after=2"
+    gives {"packs": [{"dates": [...], "tasks": [...]}, ...]} for May,
+    June, July and August.
+    """
+    date = request.GET['date']
+    try:
+        before = int(request.GET.get('before', 1))
+        after = int(request.GET.get('after', 1))
+    except ValueError:
+        return HttpResponseBadRequest()
+    max_adjacent = settings.TASKMANAGER_MAX_ADJACENT_MONTHS
+    if not (0 <= before <= max_adjacent and 0 <= after <= max_adjacent):
+        return HttpResponseBadRequest()
+
+    grids = DatesHandler.month_grids(date, before, after)
+
+    # read before the tasks (see `MonthPackCache`)
+    version = _tasks_version(request)
+    packs = [MonthPackCache.get(request.user.id, version, grid.year,
+                                grid.month)
+             for grid in grids]
+    # the months which are not cached are generated together
+    missing = [i for i, task_dicts in enumerate(packs) if task_dicts is None]
+    if missing:
+        generated = task_service.generate_tasklists_for_months(
+            grids[missing[0]:missing[-1] + 1], user=request.user)
+        for i in missing:
+            packs[i] = generated[i - missing[0]]
+            MonthPackCache.set(request.user.id, version, grids[i].year,
+                               grids[i].month, packs[i])
+
+    return StreamingHttpResponse(
+        MonthPackStreamer.iter_json_packs(
+            (grid.isoformats, task_dicts)
+            for grid, task_dicts in zip(grids, packs)),
+        content_type='application/json')
+
+
+@token_auth_allowed
+@async_login_required
+async def tasks(request):
     """ Endpoint for creating a task in the database. New task fields
     should be submitted via post request as json object. 
     """
     if request.method == 'POST':
         task_dict = json.loads(request.body)
-        DatabaseHandler.create_task_and_related(task_dict, request.user)
+        await sync_to_async(DatabaseHandler.create_task_and_related)(
+            task_dict, request.user)
         return HttpResponse(status=201)
     else:
         return HttpResponse(status=405)
 
 
+@token_auth_allowed
 @login_required
-def tasks_by_id(request, task_id):
+def tasks_batch(request):
+    """ Endpoint for creating (post request) or updating (put request)
+    many tasks at once. The tasks should be submitted as a json array of
+    task objects. Returns json with the result for each of them:
+    {"results": [{"id": <task id>} or {"errors": {...}}, ...]}.
+    """
+    if request.method not in ('POST', 'PUT'):
+        return HttpResponse(status=405)
+    try:
+        task_dicts = json.loads(request.body)
+    except ValueError:
+        return HttpResponseBadRequest()
+    if (not isinstance(task_dicts, list) or
+            len(task_dicts) > settings.TASKMANAGER_MAX_BATCH_SIZE):
+        return HttpResponseBadRequest()
+
+    if request.method == 'POST':
+        results = DatabaseHandler.create_tasks_and_related(task_dicts,
+                                                           request.user)
+    else:
+        results = DatabaseHandler.update_tasks_and_related(task_dicts,
+                                                           request.user)
+    return JsonResponse({'results': results}, status=201)
+
+
+@token_auth_allowed
+@login_required
+def completions_batch(request):
+    """ Endpoint for checking and unchecking many tasks at once. The
+    tasks should be submitted via put request as a json array of
+    objects like the ones for `tasks_by_id` with "checkUncheck" header:
+    [{"id": <task id>, "date": <ISOstring>,
+      "completion": <ISOstring or false>}, ...].
+    Returns json with the result for each of them (see `tasks_batch`).
+    """
+    if request.method != 'PUT':
+        return HttpResponse(status=405)
+    try:
+        task_dicts = json.loads(request.body)
+    except ValueError:
+        return HttpResponseBadRequest()
+    if (not isinstance(task_dicts, list) or
+            len(task_dicts) > settings.TASKMANAGER_MAX_BATCH_SIZE):
+        return HttpResponseBadRequest()
+
+    results = DatabaseHandler.check_uncheck_tasks(task_dicts, request.user)
+    return JsonResponse({'results': results}, status=201)
+
+
+@token_auth_allowed
+@login_required
+def changes(request):
+    """ Endpoint for getting the changes of the user's tasks, files and
+    completions made after the version given as ?since=<version> (see
+    `ChangeLog.get_changes()`). Without `since` only the current version
+    is returned (with "reset": true), which the client should ask for
+    before loading the month packs.
+    """
+    if request.method != 'GET':
+        return HttpResponse(status=405)
+
+    since = request.GET.get('since')
+    if since is None:
+        return JsonResponse({
+            'version': ChangeLog.get_version(request.user.id),
+            'reset': True,
+        })
+    try:
+        since = int(since)
+    except ValueError:
+        return HttpResponseBadRequest()
+    if since < 0:
+        return HttpResponseBadRequest()
+
+    return JsonResponse(ChangeLog.get_changes(request.user.id, since))
+
+
+@token_auth_allowed
+@async_login_required
+@async_condition(etag_func=_task_etag,
+                 last_modified_func=_task_last_modified)
+async def tasks_by_id(request, task_id):
     """ Endpoint for getting, deleting and updating a task in database.
     e.i: tasks/<int:task_id>/
     """
     if request.method == 'GET':
         try:
-            task = Task.objects.values().get(id=task_id, user=request.user)
+            task = await sync_to_async(Task.objects.values().get)(
+                id=task_id, user=request.user)
             return JsonResponse(task)
         except Task.DoesNotExist:
             return HttpResponse(status=404)
 
     elif request.method == 'DELETE':
         try:
-            DatabaseHandler.delete_task(task_id, user=request.user)
+            await sync_to_async(DatabaseHandler.delete_task)(
+                task_id, user=request.user)
             return HttpResponse(status=200)
         except Task.DoesNotExist:
             return HttpResponse(status=404)
@@ -79,9 +370,11 @@ def tasks_by_id(request, task_id):
     elif request.method == 'PUT':
         task_dict = json.loads(request.body)
         if 'checkUncheck' in request.headers.keys():
-            DatabaseHandler.check_uncheck_task(task_dict)
+            await sync_to_async(DatabaseHandler.check_uncheck_task)(
+                task_dict)
         else:
-            DatabaseHandler.update_task_and_related(task_dict, request.user)
+            await sync_to_async(DatabaseHandler.update_task_and_related)(
+                task_dict, request.user)
         return HttpResponse(status=201)
 
     else: